@@ -2,7 +2,7 @@
 
 """Handles the entire flow of data both to and from MMM
 
-The controller is meant to be ran directly to execute one of three different
+The controller is meant to be ran directly to execute one of five different
 MMM runs.  The different run types the controller supports are:
 * Basic Run: MMM is ran once using data obtained from TRANSP.  Various profile
   plot PDFs are created, and all used data is saved to CSVs.  This run is
@@ -15,16 +15,35 @@ MMM runs.  The different run types the controller supports are:
 * Control Scan: Values of a specified control are adjusted using a range of
   scan factors, in similar fashion to a variable scan.  Valid controls to
   scan must be members of the InputControls class.
+* Threshold Scan: A variable scan where options.threshold_var is set.  Instead
+  of running MMM for each factor, the scan factor where threshold_var crosses
+  options.threshold_value is found at each radial point by bracketing with the
+  scan range and then bisecting each bracket, and the thresholds are saved to
+  a single CSV (see the adaptive module).  The scan range only needs to be
+  fine enough to bracket the first crossing of each point.
+* Refined Scan: A variable or control scan where options.refine_vars is set.
+  The scan range is the finest grid of factors that may be ran, and factors
+  are only ran where the values of refine_vars change quickly (see the
+  adaptive module).  Refined scans are saved in the same way as other scans.
+* Multidimensional Scan: Several variables and controls are adjusted at once,
+  using every combination of their scan factors (or a Latin hypercube sample
+  of options.scan_samples points).  Scanned variables are listed as a tuple
+  of names, which is paired with a tuple of scan ranges.  Every point is saved
+  to a single store per save type with one axis per scanned variable (see
+  the multiscan module).
 
 When conducting either a variable or control scan, values of all input,
 additional, and output variables are saved to CSV for each factor in the scan
 range.  Factor files contain variable data as functions of rmin (or rho),
 where each file corresponds to a different scan factor value (noted by the
-filename). After the scan is completed, this saved data is then reshaped and
-saved again into new rho files, which contain values of each variable type at
-a specified point of rho.  Rho files contain variable data as function of the
+filename). As factors of the scan complete, this saved data is also reshaped
+and saved into rho files (see reshaper.StreamingReshaper), which contain
+values of each variable type at a specified point of rho.  Rho files contain variable data as function of the
 scanned variable at each point of rho, where each file corresponds to a
-different rho value (noted by the filename).
+different rho value (noted by the filename).  When options.scan_store is
+enabled, all factors are instead saved to a single binary store per save
+type, and rho data is read directly from the stores, so neither factor files
+nor rho files are written (see the scanstore module).
 
 A new scan number is created each time a new run is executed.  This means that
 new data generated by MMM will never overwrite previously generated data. The
@@ -36,10 +55,19 @@ In terms of plot generation, the controller only produces plots of base profiles
 rho files should be generated by directly running the various modules
 provided in the plotting directory.
 
+When several scans are queued, variables are only initialized and the MMM
+driver is only ran once for each batch of scans that share the same base data
+(see the scanplanner module).  The base data is then saved to the scan folder
+of each scan of the batch.
+
 Example Usage:
 * See commands listed at the bottom of this file
 """
 
+# Standard Packages
+import copy
+import shutil
+
 # 3rd Party Packages
 import numpy as np
 
@@ -48,11 +76,13 @@ import settings
 import modules.controls
 import modules.constants
 import modules.options
+import modules.adaptive as adaptive
 import modules.calculations as calculations
-import modules.adjustments as adjustments
 import modules.datahelper as datahelper
 import modules.mmm as mmm
-import modules.reshaper as reshaper
+import modules.multiscan as multiscan
+import modules.scanplanner as scanplanner
+import modules.scanner as scanner
 import modules.utils as utils
 import plotting.modules.profiles as profiles
 from modules.enums import ShotType, ScanType, ProfileType
@@ -64,15 +94,18 @@ def _execute_variable_scan(mmm_vars, controls):
     varied over a specified range and are then sent to the MMM driver for
     each value of the range
 
-    Create a copy of mmm_vars as modified_vars to keep variables that are
-    modified over the course of the scan separate from base MMM input
-    variables.  For each factor of the scan_range, we modify the value of the
-    specified var_to_scan, and then adjust any dependent variables. The MMM
-    driver is ran each time var_to_scan is adjusted, and all input and output
+    For each factor of the scan_range, a copy of mmm_vars is created where the
+    value of the specified var_to_scan is modified, and any dependent
+    variables are adjusted.  This keeps variables that are modified over the
+    course of the scan separate from base MMM input variables.  The MMM driver
+    is ran each time var_to_scan is adjusted, and all input and output
     variable data is saved to a subfolder named after var_to_scan.
-    Afterwards, the saved CSV data is reshaped into data dependent on the
-    scanned parameter, and is saved to another set of CSV within a new
-    subfolder labeled rho.
+    As each factor completes, its data is also reshaped into data dependent
+    on the scanned parameter, and is saved to another set of CSV within a
+    new subfolder labeled rho.
+
+    Scan factors are executed in parallel by the scanner module, using the
+    number of worker processes specified in settings.
 
     Parameter scan PDFs are not produced here, and the output data is intended
     to be plotted by a separate process after the scan is complete.
@@ -82,18 +115,8 @@ def _execute_variable_scan(mmm_vars, controls):
     * controls (InputControls): Specifies input control values in the MMM input file
     '''
 
-    runid = mmm_vars.options.runid
-    scan_num = mmm_vars.options.scan_num
     scan_range = mmm_vars.options.scan_range
-    var_to_scan = mmm_vars.options.var_to_scan
-
-    for i, scan_factor in enumerate(scan_range):
-        print(f'{runid}.{scan_num} {var_to_scan} scan: {i + 1} / {len(scan_range)}')
-        adjusted_vars = adjustments.adjust_scanned_variable(mmm_vars, scan_factor)
-        adjusted_vars.save(scan_factor)
-        output_vars = mmm.run_wrapper(adjusted_vars, controls)
-        calculations.calculate_output_variables(mmm_vars, output_vars, controls)
-        output_vars.save(scan_factor)
+    scanner.execute_scan(mmm_vars, controls, scanner.run_variable_factor, scan_range)
 
 
 def _execute_control_scan(mmm_vars, controls):
@@ -110,28 +133,62 @@ def _execute_control_scan(mmm_vars, controls):
     * controls (InputControls): Specifies input control values in the MMM input file
     '''
 
-    # Create a reference to control being scanned in InputControls. Modifying
-    # scanned_control values will modify its corresponding values in
-    # adjusted_controls
-
-    runid = mmm_vars.options.runid
-    scan_num = mmm_vars.options.scan_num
     scan_range = mmm_vars.options.scan_range
-    var_to_scan = mmm_vars.options.var_to_scan
+    scanner.execute_scan(mmm_vars, controls, scanner.run_control_factor, scan_range)
+
 
-    adjusted_controls = datahelper.deepcopy_data(controls)
-    scanned_control = adjusted_controls.get_scanned_control()
-    base_control = controls.get_scanned_control()
+def _execute_threshold_scan(mmm_vars, controls):
+    '''
+    Executes a threshold scan, where the scan factor of an input variable at
+    which options.threshold_var crosses options.threshold_value is found at
+    each radial point
+
+    Each radial point is ran at its own scan factor, and points that still
+    need to be evaluated are ran together, so that each step of bracketing
+    and bisection only needs a few runs of MMM (see the adaptive module).
+    Thresholds are saved to a single CSV in the scan folder.
+
+    Parameters:
+    * mmm_vars (InputVariables): Contains all variables needed to write MMM input file
+    * controls (InputControls): Specifies input control values in the MMM input file
+    '''
+
+    thresholds = adaptive.find_thresholds(mmm_vars, controls)
+    adaptive.save_thresholds(mmm_vars.options, thresholds)
+
+
+def _execute_refined_scan(mmm_vars, controls):
+    '''
+    Executes a variable or control scan that only runs the factors of the
+    scan range needed to resolve the changes of options.refine_vars
+
+    Factors are ran in steps, starting from a coarse subset of the scan range
+    and then adding factors between adjacent factors where refine_vars change
+    the most (see the adaptive module).  Saved data only contains the factors
+    that were ran, and options.scan_range is set to these factors.
+
+    Parameters:
+    * mmm_vars (InputVariables): Contains all variables needed to write MMM input file
+    * controls (InputControls): Specifies input control values in the MMM input file
+    '''
 
-    for i, scan_factor in enumerate(scan_range):
-        print(f'{runid}.{scan_num} {var_to_scan} scan: {i + 1} / {len(scan_range)}')
-        scanned_control.values = scan_factor * base_control.values
-        adjusted_controls.mtm_kyrhos_loops.values = int(controls.mtm_kyrhos_loops.values * scan_factor/scan_range[0])
-        mmm_vars.save(scan_factor)
-        adjusted_controls.save(scan_factor)
-        output_vars = mmm.run_wrapper(mmm_vars, adjusted_controls)
-        calculations.calculate_output_variables(mmm_vars, output_vars, controls)
-        output_vars.save(scan_factor)
+    adaptive.refine_scan(mmm_vars, controls)
+
+
+def _execute_multidimensional_scan(mmm_vars, controls):
+    '''
+    Executes a multidimensional scan, where the values of several input
+    variables and controls are varied at once
+
+    Each point of the scan is ran in parallel by the scanner module, and is
+    saved to the stores of the scan (see the multiscan module).
+
+    Parameters:
+    * mmm_vars (InputVariables): Contains all variables needed to write MMM input file
+    * controls (InputControls): Specifies input control values in the MMM input file
+    '''
+
+    multiscan.execute_scan(mmm_vars, controls)
 
 
 def _execute_time_scan(mmm_vars, controls):
@@ -152,18 +209,8 @@ def _execute_time_scan(mmm_vars, controls):
     # Save options again to save the computed time ranges
     mmm_vars.options.save()
 
-    scan_range_idxs = mmm_vars.options.scan_range_idxs
-    var_to_scan = mmm_vars.options.var_to_scan
-
-    for i, time_idx in enumerate(scan_range_idxs):
-        print(f'{options.runid}.{options.scan_num} {var_to_scan} scan: {i + 1} / {len(scan_range_idxs)}')
-        options.time_idx = time_idx
-        options.time_str = options.scan_range[i]
-        time_scan_str = f'{float(options.time_str):{modules.constants.SCAN_FACTOR_FMT}}'
-        mmm_vars.save(time_scan_str)
-        output_vars = mmm.run_wrapper(mmm_vars, controls)
-        calculations.calculate_output_variables(mmm_vars, output_vars, controls)
-        output_vars.save(time_scan_str)
+    scan_idxs = range(len(mmm_vars.options.scan_range_idxs))
+    scanner.execute_scan(mmm_vars, controls, scanner.run_time_factor, scan_idxs)
 
 
 def main(scanned_vars, controls):
@@ -175,10 +222,16 @@ def main(scanned_vars, controls):
     corresponding plot PDFs are created.  The MMM driver is then ran once,
     and then an optional variable scan can be ran afterwards.
 
+    Queued scans are split into batches of scans that share the same base
+    data (see scanplanner.plan_scans).  Input variables are initialized and
+    the MMM driver is ran once per batch, and the base data is saved to the
+    scan folder of every scan of the batch.  Profile PDFs are only plotted
+    for the first scan of each batch, and are copied to the other scans.
+
     Parameters:
     * scanned_vars (Dict): Dictionary of variables being scanned
-        - keys (str | None): The variable being scanned
-        - values (np.ndarray | None): The range of factors to scan over
+        - keys (str | tuple[str] | None): The variable being scanned (or the variables of a multidimensional scan)
+        - values (np.ndarray | tuple[np.ndarray] | None): The range of factors to scan over (for each variable)
     * controls (InputControls): Specifies input control values in the MMM input file
     '''
 
@@ -186,40 +239,68 @@ def main(scanned_vars, controls):
     options = controls.options  # Creates a reference
 
     # TODO: Add validation for all items in scanned_vars
-    for adjustment_name, scan_range in scanned_vars.items():
-        options.scan_num = utils.get_scan_num(options.runid)
-        options.set(adjustment_name=adjustment_name, scan_range=scan_range)
-
-        print(f'\nRunning MMM Controller for {options.runid}, scan {options.scan_num}...')
-
-        utils.init_output_dirs(options)
-
-        mmm_vars, cdf_vars, __ = datahelper.initialize_variables(options)
-        output_vars = mmm.run_wrapper(mmm_vars, controls)
-        calculations.calculate_output_variables(mmm_vars, output_vars, controls)
-
-        options.save()
-        controls.save()
-        mmm_vars.save()
-        output_vars.save()
-
-        if settings.MAKE_PROFILE_PDFS:
-            profiles.plot_profiles(ProfileType.INPUT, mmm_vars)
-            profiles.plot_profiles(ProfileType.ADDITIONAL, mmm_vars)
-            profiles.plot_profiles(ProfileType.COMPARED, mmm_vars, cdf_vars)
-            profiles.plot_profiles(ProfileType.OUTPUT, output_vars)
-
-        # Variable and control scans
-        if options.scan_type.value:
-            if options.scan_type is ScanType.VARIABLE:
-                _execute_variable_scan(mmm_vars, controls)
-            elif options.scan_type is ScanType.CONTROL:
-                _execute_control_scan(mmm_vars, controls)
-            elif options.scan_type is ScanType.TIME:
-                _execute_time_scan(mmm_vars, controls)
-
-            reshaper.create_rho_files(options)
-            print(f'\nScan complete: {options.runid}, scan {options.scan_num}, {options.var_to_scan}\n')
+    for batch in scanplanner.plan_scans(options, scanned_vars):
+        base_scan_num = None
+        batch_options = options
+        for adjustment_name, scan_range in batch:
+            # Each scan has its own options, so that options modified by a scan are not used by the next scan
+            scan_options = copy.copy(batch_options)
+            scan_options.scan_num = utils.get_scan_num(options.runid)
+            scanplanner.set_scan(scan_options, adjustment_name, scan_range)
+
+            print(f'\nRunning MMM Controller for {scan_options.runid}, scan {scan_options.scan_num}...')
+
+            utils.init_output_dirs(scan_options)
+
+            # The base data of the batch is only initialized and ran for its first scan
+            if base_scan_num is None:
+                base_vars, cdf_vars, __ = datahelper.initialize_variables(scan_options)
+                base_controls = datahelper.deepcopy_data(controls)
+                base_controls.options = scan_options
+                base_output_vars = mmm.run_wrapper(base_vars, base_controls)
+                calculations.calculate_output_variables(base_vars, base_output_vars, base_controls)
+                batch_options = copy.copy(scan_options)  # Keeps the measurement time set by initialize_variables
+
+            mmm_vars, output_vars, scan_controls = scanplanner.copy_base_data(
+                scan_options, base_vars, base_output_vars, base_controls,
+            )
+
+            scan_options.save()
+            scan_controls.save()
+            mmm_vars.save()
+            output_vars.save()
+
+            if settings.MAKE_PROFILE_PDFS:
+                if base_scan_num is None:
+                    profiles.plot_profiles(ProfileType.INPUT, mmm_vars)
+                    profiles.plot_profiles(ProfileType.ADDITIONAL, mmm_vars)
+                    profiles.plot_profiles(ProfileType.COMPARED, mmm_vars, cdf_vars)
+                    profiles.plot_profiles(ProfileType.OUTPUT, output_vars)
+                else:
+                    base_path = utils.get_scan_num_path(scan_options.runid, base_scan_num)
+                    for pdf_file in utils.get_files_in_dir(base_path, '*.pdf', show_warning=False):
+                        shutil.copy(pdf_file, utils.get_scan_num_path(scan_options.runid, scan_options.scan_num))
+
+            # Variable and control scans
+            if scan_options.scan_type.value:
+                if scan_options.refine_vars and scan_options.scan_type in [ScanType.VARIABLE, ScanType.CONTROL]:
+                    _execute_refined_scan(mmm_vars, scan_controls)
+                elif scan_options.scan_type is ScanType.VARIABLE:
+                    _execute_variable_scan(mmm_vars, scan_controls)
+                elif scan_options.scan_type is ScanType.CONTROL:
+                    _execute_control_scan(mmm_vars, scan_controls)
+                elif scan_options.scan_type is ScanType.TIME:
+                    _execute_time_scan(mmm_vars, scan_controls)
+                elif scan_options.scan_type is ScanType.THRESHOLD:
+                    _execute_threshold_scan(mmm_vars, scan_controls)
+                elif scan_options.scan_type is ScanType.MULTIDIMENSIONAL:
+                    _execute_multidimensional_scan(mmm_vars, scan_controls)
+
+                scan_name = scan_options.var_to_scan or ' x '.join(scan_options.scan_axes)
+                print(f'\nScan complete: {scan_options.runid}, scan {scan_options.scan_num}, {scan_name}\n')
+
+            if base_scan_num is None:
+                base_scan_num = scan_options.scan_num
 
 
 # Run this file directly to plot variable profiles and run the MMM driver
@@ -306,6 +387,18 @@ if __name__ == '__main__':
     # gte threshold
     # scanned_vars['gte'] = np.arange(start=0.00, stop=201 + 1e-6, step=0.5)
 
+    # gne threshold scan (options.threshold_var = 'gmaETGM')
+    # scanned_vars['gne'] = np.arange(start=0.00, stop=201 + 1e-6, step=10)
+
+    # refined scan (options.refine_vars = ['xteETGM', 'gmaMTM'])
+    # scanned_vars['gte'] = np.arange(start=0.05, stop=6 + 1e-6, step=0.01)
+
+    # multidimensional scans (options.scan_samples = None for every combination of factors)
+    # scanned_vars[('gte', 'gne')] = (np.arange(start=0.1, stop=4 + 1e-6, step=0.1),
+    #                                 np.arange(start=0.1, stop=4 + 1e-6, step=0.1))
+    # scanned_vars[('etgm_kyrhos_min', 'betaeunit')] = (np.arange(start=1, stop=40 + 1e-6, step=1),
+    #                                                   np.arange(start=0.05, stop=3 + 1e-6, step=0.05))
+
     # scanned_vars['mtm_kyrhos'] = np.arange(start=0.02, stop=32 + 1e-6, step=0.02)
 
     # scanned_vars['etgm_kxoky_mult'] = np.arange(start=0, stop=1 + 1e-6, step=0.02)
@@ -322,6 +415,14 @@ if __name__ == '__main__':
     * input_points is the number of points to use when making the MMM input file
     * Set input_points = None to match the number of points used in the CDF
     * apply_smoothing enables smoothing of all variables that have a smooth value set in the Variables class
+    * single_time_slice only extracts and calculates variables at input_time (opt-in; saved data then has one time)
+    * scan_store saves scans to a single binary store per save type instead of factor and rho CSVs (opt-in)
+    * threshold_var makes variable scans find where threshold_var crosses threshold_value (None for variable scans)
+    * threshold_tolerance is the width of the scan factor bracket that each threshold is found within
+    * refine_vars makes scans only run the factors of scan_range needed to resolve refine_vars (None for all)
+    * refine_tolerance is the largest change of refine_vars between factors, relative to their range
+    * refine_max_factors is the maximum number of factors ran by refined scans (None for no limit)
+    * scan_samples is the number of Latin hypercube samples of multidimensional scans (None for all combinations)
     '''
     options = modules.options.Options(
         runid=runid,
@@ -336,6 +437,15 @@ if __name__ == '__main__':
         use_gtethreshold=0,
         use_etgm_btor=0,
         normalize_time_range=1,
+        single_time_slice=0,
+        scan_store=0,
+        threshold_var=None,
+        threshold_value=0,
+        threshold_tolerance=0.1,
+        refine_vars=None,
+        refine_tolerance=0.05,
+        refine_max_factors=None,
+        scan_samples=None,
     )
 
     '''
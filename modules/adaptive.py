@@ -0,0 +1,437 @@
+"""Adaptive scans, which choose the scan factors to run from the results of previous runs
+
+Threshold Scans:
+A threshold scan finds the scan factor of var_to_scan where the output
+variable options.threshold_var crosses options.threshold_value, separately
+at each radial point.  Finding these factors with a variable scan needs a
+fine scan range over every factor that any point might cross at (such as
+400 factors for a gne threshold), even though each point only needs the
+factors near its own crossing.
+
+MMM calculates each radial point independently, other than using the major
+radius of the first point as the major radius of the magnetic axis (see
+mmm.run_wrapper_packed).  A single run of MMM can therefore evaluate every
+radial point at its own scan factor, by taking the input values of each
+point from the adjusted variables of the factor that the point needs (see
+adjustments.adjust_scanned_variables).  Points that need the same factor
+share the same adjusted variables, so variables are only adjusted once for
+each distinct factor.  The first and last points of a profile are added to
+each run, so that each run has the same magnetic axis and boundary as a run
+of a full profile.
+
+Steps:
+* Bracketing: Each point is evaluated at every factor of options.scan_range,
+  which only needs to be fine enough to separate multiple crossings.  The
+  first pair of consecutive factors where threshold_var crosses the
+  threshold value brackets the threshold of each point, and points without
+  a crossing have no threshold (nan).
+* Bisection: Each point is evaluated at the midpoint of its bracket, and the
+  half of the bracket that still contains the crossing is kept.  Every point
+  that still needs bisection is evaluated in the same run of MMM, until no
+  bracket is wider than options.threshold_tolerance.
+* The threshold factor of each point is linearly interpolated within its
+  final bracket, and the threshold value of var_to_scan is the adjusted
+  value of var_to_scan at that factor.
+
+Each point is then evaluated len(scan_range) + log2(bracket width /
+tolerance) times, compared with once for every factor of a fine variable
+scan.  The points of each step are split into concurrent runs of MMM using
+up to settings.SCAN_WORKERS runs at once.
+
+Refined Scans:
+A refined scan is a variable or control scan where options.scan_range is the
+finest grid of factors that may be ran, and only the factors needed to
+resolve the changes of options.refine_vars are ran.  Factors of uniform scan
+ranges are mostly spent where outputs are flat, while sharp transitions are
+still under-resolved.
+
+Steps:
+* About _INITIAL_FACTORS evenly spaced factors of the grid are ran.
+* The change of each refine variable between adjacent ran factors is the
+  largest change at any radial point, relative to the range of the variable
+  over the whole scan.  Where the change of any refine variable is larger
+  than options.refine_tolerance, the grid factor midway between the two
+  factors is ran next.  All new factors of a step are ran together by the
+  scanner module, so each step uses every worker.
+* Steps repeat until no change is larger than the tolerance, adjacent
+  factors are neighbors on the grid, or options.refine_max_factors factors
+  have been ran (factors with the largest changes are ran first).
+
+Factors are saved to the same stores or factor and rho files by every step,
+so refined scans are saved in the normal layout of a scan.  When the scan
+completes, options.scan_range is set to the factors that were ran, and
+factors that were not ran are removed from the scan stores.
+
+Example Usage:
+    # Threshold scan
+    options.threshold_var = 'gmaETGM'
+    options.threshold_value = 1e4
+    thresholds = adaptive.find_thresholds(mmm_vars, controls)
+    adaptive.save_thresholds(options, thresholds)
+
+    # Load saved thresholds (maps rho, rmin, factor, and var_to_scan to arrays)
+    thresholds = adaptive.load_thresholds(options)
+
+    # Refined scan
+    options.scan_range = np.arange(0.05, 6 + 1e-6, 0.01)
+    options.refine_vars = ['xteETGM', 'gmaMTM']
+    adaptive.refine_scan(mmm_vars, controls)
+"""
+
+# Standard Packages
+import sys; sys.path.insert(0, '../')
+import copy
+import asyncio
+import logging
+
+# 3rd Party Packages
+import numpy as np
+
+# Local Packages
+import settings
+import modules.mmm as mmm
+import modules.utils as utils
+import modules.scanner as scanner
+import modules.mmmworker as mmmworker
+import modules.reshaper as reshaper
+import modules.csvreader as csvreader
+import modules.scanstore as scanstore
+import modules.datahelper as datahelper
+import modules.adjustments as adjustments
+import modules.calculations as calculations
+from modules.enums import SaveType, ScanType
+
+
+_log = logging.getLogger(__name__)
+
+# Minimum number of points evaluated by each concurrent run of MMM
+_MIN_POINTS_PER_RUN = 32
+
+# Minimum number of points in a run of MMM (see Options.input_points)
+_MIN_RUN_POINTS = 5
+
+# Number of evenly spaced factors of the grid that refined scans start with
+_INITIAL_FACTORS = 9
+
+
+def find_thresholds(mmm_vars, controls):
+    '''
+    Finds the scan factor where options.threshold_var crosses options.threshold_value at each radial point
+
+    Parameters:
+    * mmm_vars (InputVariables): Contains all base variables needed to write the MMM input file
+    * controls (InputControls): Specifies input control values in the MMM input file
+
+    Returns:
+    * (dict): Maps rho, rmin, factor, and var_to_scan to their values at each radial point (nan without a threshold)
+
+    Raises:
+    * ValueError: If scan_range has fewer than two factors, or threshold_tolerance is not positive
+    '''
+
+    options = mmm_vars.options
+    factors = np.unique(np.asarray(options.scan_range, dtype=float))
+    tolerance = options.threshold_tolerance
+    threshold_value = options.threshold_value
+
+    if factors.size < 2:
+        raise ValueError('Threshold scans need at least two factors in scan_range')
+    if not tolerance > 0:
+        raise ValueError(f'threshold_tolerance must be positive, not {tolerance}')
+
+    num_points = mmm_vars.rmin.values.shape[0]
+    point_idxs = np.arange(num_points)
+
+    # Bracketing: every point at every factor of the scan range
+    values = _evaluate(mmm_vars, controls, np.tile(point_idxs, factors.size), np.repeat(factors, num_points))
+    values = values.reshape(factors.size, num_points)
+    is_above = values >= threshold_value
+    is_crossed = is_above[1:] != is_above[:-1]
+    has_threshold = is_crossed.any(axis=0)
+    bracket_idxs = np.argmax(is_crossed, axis=0)  # First crossing of each point
+
+    lo, hi = factors[bracket_idxs], factors[bracket_idxs + 1]
+    lo_values, hi_values = values[bracket_idxs, point_idxs], values[bracket_idxs + 1, point_idxs]
+    num_evaluations = values.size
+
+    # Bisection: every point with a bracket wider than the tolerance at its midpoint
+    needs_bisection = has_threshold & (hi - lo > tolerance)
+    while needs_bisection.any():
+        idxs = np.flatnonzero(needs_bisection)
+        mid = (lo[idxs] + hi[idxs]) / 2
+        mid_values = _evaluate(mmm_vars, controls, idxs, mid)
+        num_evaluations += idxs.size
+
+        # Keep the half of each bracket that still contains the crossing
+        is_lo_side = (mid_values >= threshold_value) == (lo_values[idxs] >= threshold_value)
+        lo[idxs[is_lo_side]], lo_values[idxs[is_lo_side]] = mid[is_lo_side], mid_values[is_lo_side]
+        hi[idxs[~is_lo_side]], hi_values[idxs[~is_lo_side]] = mid[~is_lo_side], mid_values[~is_lo_side]
+
+        needs_bisection = has_threshold & (hi - lo > tolerance)
+
+    # Linear interpolation within each final bracket (or its midpoint when values are not finite)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weights = (threshold_value - lo_values) / (hi_values - lo_values)
+    weights = np.where(np.isfinite(weights), np.clip(weights, 0, 1), 0.5)
+    threshold_factors = np.where(has_threshold, lo + weights * (hi - lo), np.nan)
+
+    scanned_values = np.full(num_points, np.nan)
+    if has_threshold.any():
+        idxs = np.flatnonzero(has_threshold)
+        unique_factors, factor_idxs = np.unique(threshold_factors[idxs], return_inverse=True)
+        batch_vars = adjustments.adjust_scanned_variables(mmm_vars, unique_factors)
+        scanned_values[idxs] = getattr(batch_vars, options.var_to_scan).values[idxs, factor_idxs]
+
+    print(
+        f'{options.runid}.{options.scan_num} {options.var_to_scan} threshold scan: found {has_threshold.sum()} '
+        f'of {num_points} thresholds using {num_evaluations} point evaluations '
+        f'({num_evaluations / num_points:.1f} per point)'
+    )
+
+    t = options.time_idx
+    return {
+        'rho': mmm_vars.rho.values[:, t],
+        'rmin': mmm_vars.rmin.values[:, t],
+        'factor': threshold_factors,
+        options.var_to_scan: scanned_values,
+    }
+
+
+def save_thresholds(options, thresholds):
+    '''
+    Saves the thresholds found by a threshold scan to a CSV
+
+    Parameters:
+    * options (Options): Object containing user options
+    * thresholds (dict): Maps names to values at each radial point (see find_thresholds)
+    '''
+
+    file_path = utils.get_threshold_path(options.runid, options.scan_num, options.var_to_scan)
+    data = np.column_stack(list(thresholds.values()))
+    np.savetxt(file_path, data, header=','.join(thresholds), fmt='%.6e', delimiter=',')
+
+    _log.info(f'\n\tSaved: {file_path}\n')
+
+
+def load_thresholds(options):
+    '''
+    Loads the thresholds saved by a threshold scan
+
+    Parameters:
+    * options (Options): Object containing user options
+
+    Returns:
+    * (dict): Maps rho, rmin, factor, and var_to_scan to their values at each radial point
+    '''
+
+    file_path = utils.get_threshold_path(options.runid, options.scan_num, options.var_to_scan)
+    var_names, values = csvreader.read_csv(file_path)
+
+    return {var_name: values[:, i] for i, var_name in enumerate(var_names)}
+
+
+def refine_scan(mmm_vars, controls):
+    '''
+    Executes a variable or control scan, only running the factors of scan_range needed to resolve refine_vars
+
+    Parameters:
+    * mmm_vars (InputVariables): Contains all base variables needed to write the MMM input file
+    * controls (InputControls): Specifies input control values in the MMM input file
+
+    Raises:
+    * ValueError: If the scan is not a variable or control scan, or refine_tolerance is not positive
+    '''
+
+    options = mmm_vars.options
+    if options.scan_type is ScanType.VARIABLE:
+        run_factor = scanner.run_variable_factor
+    elif options.scan_type is ScanType.CONTROL:
+        run_factor = scanner.run_control_factor
+    else:
+        raise ValueError(f'Refined scans must be variable or control scans, not {options.scan_type.name} scans')
+
+    if not options.refine_tolerance > 0:
+        raise ValueError(f'refine_tolerance must be positive, not {options.refine_tolerance}')
+
+    # Factors are refined in increasing order of the grid
+    options.scan_range = np.unique(options.scan_range)
+    factors = options.scan_range
+    max_factors = options.refine_max_factors or factors.size
+
+    rho_reshaper = None
+    if options.scan_store:
+        scanner.create_scan_stores(mmm_vars, controls)
+    else:
+        rho_reshaper = reshaper.StreamingReshaper(options)
+
+    is_ran = np.zeros(factors.size, dtype=bool)
+    num_initial = min(_INITIAL_FACTORS, factors.size, max_factors)
+    new_idxs = np.unique(np.linspace(0, factors.size - 1, num_initial).round().astype(int))
+    while new_idxs.size:
+        scanner.run_factors(mmm_vars, controls, run_factor, factors[new_idxs], rho_reshaper)
+        is_ran[new_idxs] = True
+        new_idxs = _get_refined_idxs(options, is_ran, max_factors - is_ran.sum())
+
+    print(f'{options.runid}.{options.scan_num} {options.var_to_scan} refined scan: ran {is_ran.sum()} '
+          f'of {factors.size} factors')
+
+    # The scan now only contains the factors that were ran
+    options.scan_range = factors[is_ran]
+    options.save()
+    for save_type in SaveType:
+        if scanstore.has_store(options, save_type):
+            scanstore.remove_unsaved_factors(options, save_type)
+
+
+def _get_refined_idxs(options, is_ran, max_new_factors):
+    '''
+    Gets the grid indices of the factors to run next in a refined scan
+
+    Parameters:
+    * options (Options): Object containing user options
+    * is_ran (np.ndarray[bool]): True for each factor of scan_range that has been ran
+    * max_new_factors (int): The maximum number of factors to return
+
+    Returns:
+    * (np.ndarray[int]): Indices of the factors of scan_range to run next, which may be empty
+    '''
+
+    ran_idxs = np.flatnonzero(is_ran)
+    changes = np.zeros(ran_idxs.size - 1)
+    for var_name in options.refine_vars:
+        values = datahelper.get_scan_values(options, var_name)[1]
+        if values.shape[0] != ran_idxs.size:
+            values = values[is_ran]  # Scan stores also contain factors that have not been ran
+
+        finite_values = values[np.isfinite(values)]
+        value_range = np.ptp(finite_values) if finite_values.size else 0
+        if value_range > 0:
+            var_changes = np.abs(np.diff(values, axis=0)) / value_range
+            changes = np.fmax(changes, np.nanmax(var_changes, axis=1, initial=0))  # nan changes are ignored
+
+    # Intervals that need refinement, with the largest changes first
+    interval_idxs = np.flatnonzero((changes > options.refine_tolerance) & (np.diff(ran_idxs) > 1))
+    interval_idxs = interval_idxs[np.argsort(-changes[interval_idxs], kind='stable')][:max(max_new_factors, 0)]
+
+    return np.sort((ran_idxs[interval_idxs] + ran_idxs[interval_idxs + 1]) // 2)
+
+
+def _evaluate(mmm_vars, controls, point_idxs, scan_factors):
+    '''
+    Evaluates options.threshold_var at radial points, where each point is adjusted by its own scan factor
+
+    Parameters:
+    * mmm_vars (InputVariables): Contains all base variables needed to write the MMM input file
+    * controls (InputControls): Specifies input control values in the MMM input file
+    * point_idxs (np.ndarray[int]): The index of each radial point to evaluate
+    * scan_factors (np.ndarray[float]): The scan factor of each point
+
+    Returns:
+    * (np.ndarray): Values of threshold_var at each point
+
+    Raises:
+    * ValueError: If threshold_var is not produced by MMM or by output calculations
+    '''
+
+    threshold_var = mmm_vars.options.threshold_var
+    unique_factors, factor_idxs = np.unique(scan_factors, return_inverse=True)
+    batch_vars = adjustments.adjust_scanned_variables(mmm_vars, unique_factors)
+
+    # Points can only be ran together when they share the major radius of the magnetic axis
+    packing_keys = batch_vars.rmaj.values[0, factor_idxs]
+    runs = []
+    for packing_key in np.unique(packing_keys):
+        group_idxs = np.flatnonzero(packing_keys == packing_key)
+        num_runs = scanner.get_worker_count(int(np.ceil(group_idxs.size / _MIN_POINTS_PER_RUN)))
+        runs += np.array_split(group_idxs, num_runs)
+
+    jobs = [_get_point_job(batch_vars, controls, point_idxs[idxs], factor_idxs[idxs]) for idxs in runs]
+
+    values = np.empty(point_idxs.size)
+    for idxs, (point_vars, point_controls), output_vars in zip(runs, jobs, _run_jobs(jobs)):
+        calculations.calculate_output_variables(point_vars, output_vars, point_controls)
+        output_values = getattr(output_vars, threshold_var).values
+        if not isinstance(output_values, np.ndarray) or output_values.ndim == 0:
+            raise ValueError(f'{threshold_var} was not produced by MMM (check that its model is enabled)')
+        values[idxs] = output_values[1:idxs.size + 1]  # The first point is the added magnetic axis
+
+    return values
+
+
+def _get_point_job(batch_vars, controls, point_idxs, factor_idxs):
+    '''
+    Gets the input variables and controls of a run of MMM of radial points, each at its own scan factor
+
+    The first point of the first factor (the magnetic axis) is added before
+    the points, and the last point of the first factor (the boundary) is
+    added after the points, and is repeated so that the run has at least
+    _MIN_RUN_POINTS points.  Variables that do not have a value at each
+    radial point (such as x) are not used by MMM, and are kept unchanged.
+
+    Parameters:
+    * batch_vars (InputVariables): Adjusted variables of each scan factor (see adjustments.adjust_scanned_variables)
+    * controls (InputControls): Specifies input control values in the MMM input file
+    * point_idxs (np.ndarray[int]): The index of each radial point to run
+    * factor_idxs (np.ndarray[int]): The index of the factor of each point in batch_vars
+
+    Returns:
+    * point_vars (InputVariables): Variables of each point of the run, with options.time_idx = 0
+    * point_controls (InputControls): Controls of the run
+    '''
+
+    num_points = batch_vars.rmin.values.shape[0]
+    boundary_idx = num_points - 1
+    num_boundary_points = max(_MIN_RUN_POINTS - point_idxs.size - 1, 1)
+    row_idxs = np.concatenate(([0], point_idxs, [boundary_idx] * num_boundary_points))
+    col_idxs = np.concatenate(([factor_idxs[0]], factor_idxs, [factor_idxs[0]] * num_boundary_points))
+
+    # Shallow copies are used, since the values of every variable are replaced
+    point_vars = copy.copy(batch_vars)
+    point_vars.options = copy.copy(batch_vars.options)
+    point_vars.options.time_idx = 0
+    point_vars.options.input_points = row_idxs.size
+
+    for var_name in batch_vars.get_variables():
+        values = getattr(batch_vars, var_name).values
+        if isinstance(values, np.ndarray) and values.ndim == 2 and values.shape[0] == num_points:
+            point_var = copy.copy(getattr(batch_vars, var_name))
+            point_var.values = values[row_idxs, col_idxs][:, np.newaxis]
+            setattr(point_vars, var_name, point_var)
+
+    # The number of input points is written to the input file from controls
+    point_controls = copy.copy(controls)
+    point_controls.input_points = copy.copy(controls.input_points)
+    point_controls.input_points.values = row_idxs.size
+
+    return point_vars, point_controls
+
+
+def _run_jobs(jobs):
+    '''
+    Runs MMM for each job, running jobs concurrently when there is more than one
+
+    Jobs are ran by a pool of resident MMM wrapper processes when
+    settings.MMM_PERSISTENT_WORKERS is enabled (see the mmmworker module).
+
+    Parameters:
+    * jobs (list[tuple]): Pairs of (InputVariables, InputControls) objects to run
+
+    Returns:
+    * (list[OutputVariables]): Output variables of each job, in order
+    '''
+
+    if len(jobs) == 1:
+        return [mmm.run_wrapper(*jobs[0])]
+
+    if settings.MMM_PERSISTENT_WORKERS and not settings.MMM_BINARY_IO:
+        options = jobs[0][0].options
+        with mmmworker.MMMWorkerPool(options, num_workers=scanner.get_worker_count(len(jobs))) as pool:
+            return list(pool.run_many(jobs))
+
+    async def run_all():
+        output_vars_list = [None] * len(jobs)
+        async for i, output_vars in mmm.run_wrapper_jobs(jobs, max_concurrent=scanner.get_worker_count(len(jobs))):
+            output_vars_list[i] = output_vars
+        return output_vars_list
+
+    return asyncio.run(run_all())
@@ -9,8 +9,8 @@ Variable Classifications:
   but not on values of additional variables.
 * Additional variable: A variable that is not needed for MMM input nor input
   calculations. Additional variables can depend on both base and gradient
-  values, so they are always recalculated when an adjustment to any variable
-  type is made.
+  values, so they are recalculated when an adjustment to any variable they
+  depend on is made.
 
 Adjustment Methodology:
 * Our goal is to keep adjustments to variables as physical as possible, within
@@ -33,15 +33,17 @@ Adjustment Methodology:
     for MMM, so they are always adjusted indirectly by adjusting the base or
     gradient variables that determine the value of the additional variable.
 
-* Our recalculation process aims to find a balance between computational
-  performance and minimizing human error.  For example, if we were to adjust
-  the value of the electron temperature (te), then all base variables would
-  still be recalculated, even though there are no base variables that depend
-  on the value of te.  This approach eliminates the need for the user to
-  correctly determine the dependencies of each variable being adjusted.
-  However, we would not to recalculate gradient values if the adjustment to
-  te is linear, as the value of the electron temperature gradient will remain
-  constant, by definition of normalized gradients.
+* Only the variables that depend on the adjusted variables are recalculated,
+  using the dependency graph of calculations (see
+  calculations.calculate_changed_variables).  For example, if we were to
+  adjust the value of the electron temperature (te), then no base variables
+  would be recalculated, since there are no base variables that depend on
+  the value of te.  Dependencies are found from the calculations
+  themselves, so the user does not need to determine the dependencies of
+  each variable being adjusted.  However, we would not recalculate gradient
+  values if the adjustment to te is linear, as the value of the electron
+  temperature gradient will remain constant, by definition of normalized
+  gradients.
 * When adjusting a derived quantity, adjustments are made directly to the
   variables that determine that derived quantity.  When multiple variables
   need to be adjusted in this manner, each variable is adjusted
@@ -61,10 +63,12 @@ Adjustment Methodology:
 
 Example Usage:
 * new_vars = adjust_scanned_variable(original_vars, 'tau', 2.5)
+* batch_vars = adjust_scanned_variables(original_vars, options.scan_range)
 """
 
 # Standard Packages
 import sys; sys.path.insert(0, '../')
+import copy
 from math import log10
 
 # 3rd Party Packages
@@ -78,20 +82,26 @@ from modules.enums import SaveType
 
 EQUALITY_ERROR_TOLERANCE = 1e-8
 SCAN_FACTOR_TOLERANCE = 1e-4
+MAX_ADJUSTMENT_ATTEMPTS = 10
 PRINT_FMT_STR = '>7.2f'
 
 
 def _print_factors(scan_factor, adjusted_factor):
-    '''Prints the scan factor and adjusted factor'''
-    print(f'{scan_factor:{PRINT_FMT_STR}}', f'{adjusted_factor:{PRINT_FMT_STR}}')
+    '''Prints the scan factor and adjusted factor (or each pair of factors of a batch)'''
+    for factors in zip(np.atleast_1d(scan_factor), np.atleast_1d(adjusted_factor)):
+        print(*[f'{factor:{PRINT_FMT_STR}}' for factor in factors])
 
 
 def _get_nonzero_idx(values):
     '''
     Gets the indices of a nonzero value from values at the previously specified measurement time
 
+    When values has more than one column (such as when adjusting a batch of
+    scan factors), the index of the first row that is nonzero in every
+    column is found.
+
     Parameters:
-    * values (np.ndarray): A one-dimensional array of variable data
+    * values (np.ndarray): A one-dimensional or two-dimensional array of variable data
 
     Returns:
     * nonzero_values[0] (int): The index along the radial dimension of first nonzero variable value
@@ -100,7 +110,7 @@ def _get_nonzero_idx(values):
     * ValueError: If there are no nonzero values
     '''
 
-    nonzero_values = np.where(values != 0)[0]
+    nonzero_values = np.where(np.all(values.reshape(values.shape[0], -1) != 0, axis=1))[0]
     if not len(nonzero_values):
         raise ValueError('Cannot adjust variable that is equal to 0 at all radial points')
 
@@ -112,10 +122,10 @@ def _check_adjusted_factor(scan_factor, base_var, adjusted_var, t):
     Checks that the adjusted factor equals scan_factor, within an allowable tolerance
 
     Parameters:
-    * scan_factor (float): The intended factor that a variable was adjusted by
+    * scan_factor (float | np.ndarray): The intended factor that a variable was adjusted by
     * base_var (Variable): The unmodified variable object
     * adjusted_var (Variable): The adjusted variable object
-    * t (int): The time index
+    * t (int | slice): The time index
 
     Raises:
     * ValueError: If the adjusted factor does not equal the scan factor within allowable tolerance
@@ -123,7 +133,7 @@ def _check_adjusted_factor(scan_factor, base_var, adjusted_var, t):
 
     r = _get_nonzero_idx(base_var.values[:, t])
     adjusted_factor = adjusted_var.values[r, t] / base_var.values[r, t]
-    if abs(adjusted_factor / scan_factor - 1) > SCAN_FACTOR_TOLERANCE:
+    if np.any(np.absolute(adjusted_factor / scan_factor - 1) > SCAN_FACTOR_TOLERANCE):
         fmt_length = abs(int(log10(SCAN_FACTOR_TOLERANCE)))
         raise ValueError(
             f'Scanned variable did not change within the allowable tolerance level\n'
@@ -153,9 +163,9 @@ def _check_equality(base_var, adjusted_var, t):
     * ValueError: If the two variables are not equal within allowable tolerance
     '''
 
-    r = _get_nonzero_idx(base_var.values)
+    r = _get_nonzero_idx(base_var.values[:, t])
     variable_error = np.absolute(adjusted_var.values[r, t] / base_var.values[r, t] - 1)
-    if variable_error > EQUALITY_ERROR_TOLERANCE:
+    if np.any(variable_error > EQUALITY_ERROR_TOLERANCE):
         fmt_length = abs(int(log10(EQUALITY_ERROR_TOLERANCE)))
         raise ValueError(
             f'{base_var.name} did not remain constant\n'
@@ -186,8 +196,7 @@ def _adjust_ne(mmm_vars, scan_factor):
     adjusted_vars.nd.values *= scan_factor
     adjusted_vars.nf.values *= scan_factor
 
-    calculations.calculate_base_variables(adjusted_vars)
-    calculations.calculate_additional_variables(adjusted_vars)
+    calculations.calculate_changed_variables(adjusted_vars, ['ne', 'nz', 'nd', 'nf'])
 
     # Check that nh increased by the scan_factor
     _check_adjusted_factor(scan_factor, mmm_vars.nh, adjusted_vars.nh, t)
@@ -195,63 +204,114 @@ def _adjust_ne(mmm_vars, scan_factor):
     return adjusted_vars
 
 
-def _adjust_nuei_alphaconst(mmm_vars, scan_factor):
+def _solve_nuei_adjustment(mmm_vars, adjusted_vars, scan_factor, nuei_exponent, set_adjustment):
     '''
-    Adjusts the Collision Frequency
+    Finds the adjustment total that adjusts nuei by the scan factor, for every scan factor at once
 
-    nuei is adjusted indirectly by adjusting the values of ne and te. The
-    final value of the adjustment total is obtained by running a loop until
-    nuei is adjusted by the target scan factor. As part of this scan, we also
-    require that alphamhd remain constant as nuei is adjusted, so additional
-    adjustments are made to ti and density variables afterwards.
+    A secant iteration is made on the logarithm of the adjustment total,
+    where the function being solved is the logarithm of the ratio of the
+    adjusted nuei to its target value.  The first step uses the slope given
+    by the formula for nuei (nuei ~ adjustment_total**(1 / nuei_exponent),
+    ignoring the change in loge), and later steps use the secant slope of
+    the two previous attempts.  When adjusting a batch of scan factors, each
+    factor keeps its adjustment total as soon as it has converged, so that
+    every factor is solved at the same time with a single calculation of
+    loge and nuei per attempt.
 
     Parameters:
     * mmm_vars (InputVariables): Contains unmodified variables
-    * scan_factor (float): The factor to modify nuei by
+    * adjusted_vars (InputVariables): Variables to adjust
+    * scan_factor (float | np.ndarray): The factor to modify nuei by
+    * nuei_exponent (float): The approximate exponent of the adjustment total for scaling nuei
+    * set_adjustment (callable): Sets adjusted values from the values of mmm_vars and an adjustment total
 
     Returns:
-    * adjusted_vars (InputVariables): Adjusted variables needed to write MMM input file
+    * adjustment_total (np.ndarray): The adjustment total of each scan factor
+    * attempts (np.ndarray): The number of attempts needed for each scan factor to converge
 
     Raises:
-    * ValueError: If the total adjustment could not be found in the specified max attempts
+    * ValueError: If the adjustment total of any scan factor could not be found in the maximum attempts
     '''
 
-    max_adjustment_attempts = 10
     t = mmm_vars.options.time_idx
     r = _get_nonzero_idx(mmm_vars.nuei.values[:, t])
+    base_nuei = mmm_vars.nuei.values[r, t]
+    scan_factor = np.asarray(scan_factor, dtype=float)
 
-    adjusted_vars = datahelper.deepcopy_data(mmm_vars)
-    adjustment_total = scan_factor**(-2 / 5)  # based on the formula for nuei
-    adjustment_step = adjustment_total
+    # Logarithm of the adjustment total (x) and of the nuei error (f), before any adjustment
+    x_prev = np.zeros_like(scan_factor)
+    f_prev = -np.log(scan_factor)
+    slope = np.full_like(scan_factor, 1 / nuei_exponent)
+    x = x_prev - f_prev / slope
 
-    # Make adjustments to ne and te until the adjustment_total is found The
-    # adjustment finding loop typically finds the target within 6 attempts
-    # for a tolerance of 1e-4
+    attempts = np.zeros(scan_factor.shape, dtype=int)
+    converged = np.zeros(scan_factor.shape, dtype=bool)
 
-    for i in range(max_adjustment_attempts):
+    for i in range(MAX_ADJUSTMENT_ATTEMPTS):
 
-        adjusted_vars.ne.values /= adjustment_step
-        adjusted_vars.te.values *= adjustment_step
+        set_adjustment(np.exp(x))
 
         # loge must be recalculated to properly recalculate nuei
         calculations.loge(adjusted_vars)
         calculations.nuei(adjusted_vars)
 
-        # Check if the current_factor is within our allowable tolerance for the scan_factor
-        current_factor = adjusted_vars.nuei.values[r, t] / mmm_vars.nuei.values[r, t]
-        if abs(current_factor / scan_factor - 1) < SCAN_FACTOR_TOLERANCE:
-            if __name__ == '__main__':  # For testing purposes
-                print(i + 1, end=' ')
+        current_factor = adjusted_vars.nuei.values[r, t] / base_nuei
+        attempts[~converged] = i + 1
+        converged = np.absolute(current_factor / scan_factor - 1) < SCAN_FACTOR_TOLERANCE
+        if converged.all():
             break
 
-        if i + 1 == max_adjustment_attempts:
-            print(i + 1, end=' ')
-            _print_factors(scan_factor, adjustment_total)
-            raise ValueError(f'nuei factor could not be found after {i + 1} attempts')
+        # Secant step for factors that have not converged, keeping the previous slope if the secant is undefined
+        f = np.log(current_factor / scan_factor)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            secant_slope = (f - f_prev) / (x - x_prev)
+        slope = np.where(np.isfinite(secant_slope) & (secant_slope != 0), secant_slope, slope)
+        x_prev, f_prev = x, f
+        x = np.where(converged, x, x - f / slope)
+
+    else:
+        _print_factors(scan_factor[~converged], np.exp(x)[~converged])
+        raise ValueError(
+            f'nuei factor could not be found after {MAX_ADJUSTMENT_ATTEMPTS} attempts\n'
+            f'    scan factors:     {scan_factor[~converged]}\n'
+            f'    adjusted factors: {np.atleast_1d(current_factor)[np.atleast_1d(~converged)]}\n'
+        )
+
+    return np.exp(x), attempts
+
+
+def _adjust_nuei_alphaconst(mmm_vars, scan_factor):
+    '''
+    Adjusts the Collision Frequency
+
+    nuei is adjusted indirectly by adjusting the values of ne and te. The
+    final value of the adjustment total is found by a secant iteration until
+    nuei is adjusted by the target scan factor. As part of this scan, we also
+    require that alphamhd remain constant as nuei is adjusted, so additional
+    adjustments are made to ti and density variables afterwards.
+
+    Parameters:
+    * mmm_vars (InputVariables): Contains unmodified variables
+    * scan_factor (float): The factor to modify nuei by
+
+    Returns:
+    * adjusted_vars (InputVariables): Adjusted variables needed to write MMM input file
+
+    Raises:
+    * ValueError: If the total adjustment could not be found in the specified max attempts
+    '''
+
+    t = mmm_vars.options.time_idx
+    adjusted_vars = datahelper.deepcopy_data(mmm_vars)
+
+    def set_adjustment(adjustment_total):
+        adjusted_vars.ne.values = mmm_vars.ne.values / adjustment_total
+        adjusted_vars.te.values = mmm_vars.te.values * adjustment_total
 
-        # Make an adjustment_step based on the difference in the current_factor and scan_factor
-        adjustment_step = 1 + (current_factor - scan_factor) / (2 * scan_factor)
-        adjustment_total *= adjustment_step
+    # nuei ~ adjustment_total**(-5 / 2), based on the formula for nuei
+    adjustment_total, attempts = _solve_nuei_adjustment(mmm_vars, adjusted_vars, scan_factor, -2 / 5, set_adjustment)
+    if __name__ == '__main__':  # For testing purposes
+        print(*np.atleast_1d(attempts), end=' ')
 
     # Additional adjustments to keep alphamhd constant
     adjusted_vars.ti.values *= adjustment_total
@@ -259,8 +319,7 @@ def _adjust_nuei_alphaconst(mmm_vars, scan_factor):
     adjusted_vars.nd.values /= adjustment_total
     adjusted_vars.nf.values /= adjustment_total
 
-    calculations.calculate_base_variables(adjusted_vars)
-    calculations.calculate_additional_variables(adjusted_vars)
+    calculations.calculate_changed_variables(adjusted_vars, ['ne', 'te', 'ti', 'nz', 'nd', 'nf'])
 
     _check_adjusted_factor(scan_factor, mmm_vars.nuei, adjusted_vars.nuei, t)
     _check_equality(mmm_vars.alphamhd, adjusted_vars.alphamhd, t)
@@ -273,7 +332,7 @@ def _adjust_nuei_lareunitconst(mmm_vars, scan_factor):
     Adjusts the Collision Frequency
 
     nuei is adjusted indirectly by adjusting the value te. The final value of
-    the adjustment total is obtained by running a loop until nuei is adjusted
+    the adjustment total is found by a secant iteration until nuei is adjusted
     by the target scan factor. As part of this scan, the Electron Gyroradius
     (unit) will be held constant by ensuring that te / bunit**2 is constant.
 
@@ -288,48 +347,22 @@ def _adjust_nuei_lareunitconst(mmm_vars, scan_factor):
     * ValueError: If the total adjustment could not be found in the specified max attempts
     '''
 
-    max_adjustment_attempts = 10
     t = mmm_vars.options.time_idx
-    r = _get_nonzero_idx(mmm_vars.nuei.values[:, t])
-
     adjusted_vars = datahelper.deepcopy_data(mmm_vars)
-    adjustment_total = scan_factor**(-2 / 3)  # based on the formula for nuei
-    adjustment_step = adjustment_total
 
-    # Make adjustments to ne and te until the adjustment_total is found The
-    # adjustment finding loop typically finds the target within 6 attempts
-    # for a tolerance of 1e-4
+    def set_adjustment(adjustment_total):
+        adjusted_vars.te.values = mmm_vars.te.values * adjustment_total
 
-    for i in range(max_adjustment_attempts):
-
-        adjusted_vars.te.values *= adjustment_step
-
-        # loge must be recalculated to properly recalculate nuei
-        calculations.loge(adjusted_vars)
-        calculations.nuei(adjusted_vars)
-
-        # Check if the current_factor is within our allowable tolerance for the scan_factor
-        current_factor = adjusted_vars.nuei.values[r, t] / mmm_vars.nuei.values[r, t]
-        if abs(current_factor / scan_factor - 1) < SCAN_FACTOR_TOLERANCE:
-            if __name__ == '__main__':  # For testing purposes
-                print(i + 1, end=' ')
-            break
-
-        if i + 1 == max_adjustment_attempts:
-            print(i + 1, end=' ')
-            _print_factors(scan_factor, adjustment_total)
-            raise ValueError(f'nuei factor could not be found after {i + 1} attempts')
-
-        # Make an adjustment_step based on the difference in the current_factor and scan_factor
-        adjustment_step = 1 + (current_factor - scan_factor) / (2 * scan_factor)
-        adjustment_total *= adjustment_step
+    # nuei ~ adjustment_total**(-3 / 2), based on the formula for nuei
+    adjustment_total, attempts = _solve_nuei_adjustment(mmm_vars, adjusted_vars, scan_factor, -2 / 3, set_adjustment)
+    if __name__ == '__main__':  # For testing purposes
+        print(*np.atleast_1d(attempts), end=' ')
 
     # Additional adjustments to electron gyroradius (unit) constant
     adjusted_vars.ti.values *= adjustment_total
     adjusted_vars.bftor.values *= adjustment_total**(1 / 2)
 
-    calculations.calculate_base_variables(adjusted_vars)
-    calculations.calculate_additional_variables(adjusted_vars)
+    calculations.calculate_changed_variables(adjusted_vars, ['te', 'ti', 'bftor'])
 
     _check_adjusted_factor(scan_factor, mmm_vars.nuei, adjusted_vars.nuei, t)
     _check_equality(mmm_vars.alphamhdunit, adjusted_vars.alphamhdunit, t)
@@ -358,8 +391,7 @@ def _adjust_tau(mmm_vars, scan_factor):
     adjusted_vars.te.values *= adjustment_total
     adjusted_vars.ti.values /= adjustment_total
 
-    calculations.calculate_base_variables(adjusted_vars)
-    calculations.calculate_additional_variables(adjusted_vars)
+    calculations.calculate_changed_variables(adjusted_vars, ['te', 'ti'])
 
     _check_adjusted_factor(scan_factor, mmm_vars.tau, adjusted_vars.tau, t)
 
@@ -395,9 +427,7 @@ def _adjust_zeff(mmm_vars, scan_factor):
     adjusted_vars.nz.values *= scan_factor
     adjusted_vars.ne.values += adjusted_vars.zimp.values * (adjusted_vars.nz.values - mmm_vars.nz.values)
 
-    calculations.calculate_base_variables(adjusted_vars)
-    calculations.calculate_gradient_variables(adjusted_vars)  # needed as ne change was nonlinear
-    calculations.calculate_additional_variables(adjusted_vars)
+    calculations.calculate_changed_variables(adjusted_vars, ['nz', 'ne'], gradients=True)
 
     if __name__ == '__main__':  # For testing purposes
         r = _get_nonzero_idx(mmm_vars.zeff.values)
@@ -439,7 +469,7 @@ def _adjust_etae(mmm_vars, scan_factor):
     adjusted_vars.gte.values *= scan_factor
     adjusted_vars.gne.values *= scan_factor
 
-    calculations.calculate_additional_variables(adjusted_vars)
+    calculations.calculate_changed_variables(adjusted_vars, ['gte', 'gne'])
 
     # _check_adjusted_factor(scan_factor, mmm_vars.etae, adjusted_vars.etae, t)
 
@@ -464,7 +494,7 @@ def _adjust_shear(mmm_vars, scan_factor):
     adjusted_vars = datahelper.deepcopy_data(mmm_vars)
     adjusted_vars.gq.values *= scan_factor
 
-    calculations.calculate_additional_variables(adjusted_vars)
+    calculations.calculate_changed_variables(adjusted_vars, ['gq'])
 
     _check_adjusted_factor(scan_factor, mmm_vars.shear, adjusted_vars.shear, t)
 
@@ -490,8 +520,7 @@ def _adjust_btor(mmm_vars, scan_factor):
     adjusted_vars = datahelper.deepcopy_data(mmm_vars)
     adjusted_vars.bzxr.values *= scan_factor
 
-    calculations.calculate_base_variables(adjusted_vars)
-    calculations.calculate_additional_variables(adjusted_vars)
+    calculations.calculate_changed_variables(adjusted_vars, ['bzxr'])
 
     _check_adjusted_factor(scan_factor, mmm_vars.btor, adjusted_vars.btor, t)
 
@@ -516,8 +545,7 @@ def _adjust_bunit(mmm_vars, scan_factor):
     adjusted_vars = datahelper.deepcopy_data(mmm_vars)
     adjusted_vars.bftor.values *= scan_factor
 
-    calculations.calculate_base_variables(adjusted_vars)
-    calculations.calculate_additional_variables(adjusted_vars)
+    calculations.calculate_changed_variables(adjusted_vars, ['bftor'])
 
     _check_adjusted_factor(scan_factor, mmm_vars.bunit, adjusted_vars.bunit, t)
 
@@ -557,8 +585,8 @@ def _adjust_betae(mmm_vars, scan_factor):
     adjusted_vars.gne.values /= scan_factor
     adjusted_vars.gni.values /= scan_factor
 
-    calculations.calculate_base_variables(adjusted_vars)
-    calculations.calculate_additional_variables(adjusted_vars)
+    changed_vars = ['ne', 'te', 'bzxr', 'nd', 'nz', 'nf', 'ti', 'gte', 'gti', 'gne', 'gni']
+    calculations.calculate_changed_variables(adjusted_vars, changed_vars)
 
     _check_adjusted_factor(scan_factor, mmm_vars.betae, adjusted_vars.betae, t)
     _check_equality(mmm_vars.alphamhd, adjusted_vars.alphamhd, t)
@@ -592,8 +620,7 @@ def _adjust_betaeunit(mmm_vars, scan_factor):
     adjusted_vars.nz.values *= adjustment_total
     adjusted_vars.nf.values *= adjustment_total
 
-    calculations.calculate_base_variables(adjusted_vars)
-    calculations.calculate_additional_variables(adjusted_vars)
+    calculations.calculate_changed_variables(adjusted_vars, ['ne', 'te', 'bftor', 'nd', 'nz', 'nf'])
 
     _check_adjusted_factor(scan_factor, mmm_vars.betaeunit, adjusted_vars.betaeunit, t)
 
@@ -634,8 +661,8 @@ def _adjust_betaeunit_alphaconst(mmm_vars, scan_factor):
     adjusted_vars.gne.values /= scan_factor
     adjusted_vars.gni.values /= scan_factor
 
-    calculations.calculate_base_variables(adjusted_vars)
-    calculations.calculate_additional_variables(adjusted_vars)
+    changed_vars = ['ne', 'te', 'bftor', 'nd', 'nz', 'nf', 'ti', 'gte', 'gti', 'gne', 'gni']
+    calculations.calculate_changed_variables(adjusted_vars, changed_vars)
 
     _check_adjusted_factor(scan_factor, mmm_vars.betaeunit, adjusted_vars.betaeunit, t)
     _check_equality(mmm_vars.alphamhdunit, adjusted_vars.alphamhdunit, t)
@@ -665,7 +692,7 @@ def _adjust_gne_alphaconst(mmm_vars, scan_factor):
     adjusted_vars.gne.values *= scan_factor
     adjusted_vars.gni.values += (1 - scan_factor) * mmm_vars.tau.values * mmm_vars.gne.values
 
-    calculations.calculate_additional_variables(adjusted_vars)
+    calculations.calculate_changed_variables(adjusted_vars, ['gne', 'gni'])
 
     _check_adjusted_factor(scan_factor, mmm_vars.gne, adjusted_vars.gne, t)
     _check_equality(mmm_vars.alphamhdunit, adjusted_vars.alphamhdunit, t)
@@ -684,9 +711,12 @@ def adjust_scanned_variable(mmm_vars, scan_factor):
     either case, adjustments are made using a deepcopy of the base variable,
     so that adjustments do not unintentionally alter base variable values.
 
+    The scan factor may also be an array of factors when mmm_vars is a batch
+    of variables (see adjust_scanned_variables).
+
     Parameters:
     * mmm_vars (InputVariables): Contains all variables needed to write MMM input file
-    * scan_factor (float): The factor to modify var_to_scan by
+    * scan_factor (float | np.ndarray): The factor to modify var_to_scan by
 
     Returns:
     * adjusted_vars (InputVariables): Adjusted variables needed to write MMM input file
@@ -748,16 +778,101 @@ def adjust_scanned_variable(mmm_vars, scan_factor):
         scanned_var = getattr(adjusted_vars, var_to_scan)
         scanned_var.values = scan_factor * base_var.values
 
-        if var_to_scan in ['gte', 'gti', 'gne', 'gnh', 'gni', 'gnz', 'gvpar', 'gvpol', 'gvtor']:
-            calculations.calculate_additional_variables(adjusted_vars)
-
-        else:
-            calculations.calculate_base_variables(adjusted_vars)
-            calculations.calculate_additional_variables(adjusted_vars)
+        calculations.calculate_changed_variables(adjusted_vars, [var_to_scan])
 
     return adjusted_vars
 
 
+def adjust_scanned_variables(mmm_vars, scan_factors=None):
+    '''
+    Adjusts the variable being scanned for every factor of a scan at once
+
+    The values of every variable at the measurement time are repeated once
+    for each scan factor, forming a batch of variables where column i of
+    each variable belongs to scan_factors[i].  The batch is then adjusted
+    by the array of scan factors, which broadcasts through every adjustment
+    and calculation, so only a single copy of the variables is made
+    regardless of the number of scan factors.  Use get_stacked_values or
+    get_factor_variables to get the adjusted values of each factor.
+
+    Parameters:
+    * mmm_vars (InputVariables): Contains all variables needed to write MMM input file
+    * scan_factors (np.ndarray): The factors to modify var_to_scan by (optional; default is options.scan_range)
+
+    Returns:
+    * batch_vars (InputVariables): Adjusted variables of each scan factor, with options.time_idx = slice(None)
+    '''
+
+    if scan_factors is None:
+        scan_factors = mmm_vars.options.scan_range
+
+    scan_factors = np.asarray(scan_factors, dtype=float)
+    t = mmm_vars.options.time_idx
+
+    # Shallow copies are used, since the values of every variable are replaced
+    batch_vars = copy.copy(mmm_vars)
+    batch_vars.options = copy.copy(mmm_vars.options)
+    batch_vars.options.time_idx = slice(None)
+
+    for var_name in mmm_vars.get_variables():
+        batch_var = copy.copy(getattr(mmm_vars, var_name))
+        if isinstance(batch_var.values, np.ndarray) and batch_var.values.ndim == 2:
+            batch_var.values = np.repeat(batch_var.values[:, t:t + 1], scan_factors.size, axis=1)
+        setattr(batch_vars, var_name, batch_var)
+
+    return adjust_scanned_variable(batch_vars, scan_factors)
+
+
+def get_stacked_values(batch_vars, var_name):
+    '''
+    Gets the values of a variable of each factor of a batch of adjusted variables
+
+    Parameters:
+    * batch_vars (InputVariables): Adjusted variables of each scan factor (see adjust_scanned_variables)
+    * var_name (str): The name of the variable
+
+    Returns:
+    * (np.ndarray): Values of the variable, with shape (factors, radial points, 1)
+    '''
+
+    return getattr(batch_vars, var_name).values.T[:, :, np.newaxis]
+
+
+def get_factor_variables(batch_vars):
+    '''
+    Splits a batch of adjusted variables into the adjusted variables of each scan factor
+
+    The variables of each factor only contain the values of the measurement
+    time, and share a copy of options with time_idx = 0.  Values are views
+    into the values of the batch, so no values are copied.
+
+    Parameters:
+    * batch_vars (InputVariables): Adjusted variables of each scan factor (see adjust_scanned_variables)
+
+    Returns:
+    * (list[InputVariables]): Adjusted variables of each scan factor, in order
+    '''
+
+    options = copy.copy(batch_vars.options)
+    options.time_idx = 0
+
+    var_names = batch_vars.get_variables()
+    num_factors = batch_vars.rmin.values.shape[1]
+
+    factor_vars_list = []
+    for i in range(num_factors):
+        factor_vars = copy.copy(batch_vars)
+        factor_vars.options = options
+        for var_name in var_names:
+            factor_var = copy.copy(getattr(batch_vars, var_name))
+            if isinstance(factor_var.values, np.ndarray) and factor_var.values.ndim == 2:
+                factor_var.values = factor_var.values[:, i:i + 1]
+            setattr(factor_vars, var_name, factor_var)
+        factor_vars_list.append(factor_vars)
+
+    return factor_vars_list
+
+
 if __name__ == '__main__':  # For Testing Purposes
     from modules.options import Options
 
@@ -28,6 +28,7 @@ TODO:
 """
 
 # Standard Packages
+import re
 import sys
 import inspect
 import functools
@@ -43,6 +44,28 @@ import modules.datahelper as datahelper
 
 _gradients = set()  # Stores the names of calculated gradient variables
 
+# Gradient variables, mapped to the variable they are the gradient of and the sign of drmin used
+_gradient_definitions = {
+    'gq': ('q', 1),
+    'gbunit': ('bunit', 1),
+    'gbtor': ('btor', 1),
+    'gne': ('ne', -1),
+    'gnh': ('nh', -1),
+    'gni': ('ni', -1),
+    'gnz': ('nz', -1),
+    'gte': ('te', -1),
+    'gti': ('ti', -1),
+    'gvpar': ('vpar', -1),
+    'gvpol': ('vpol', -1),
+    'gvtor': ('vtor', -1),
+}
+
+# Variables read by every gradient calculation, in addition to the variable the gradient is taken of
+_gradient_dependencies = ('rmaj', 'rmin', 'x', 'xb')
+
+# Matches the names of variables whose values are read by a calculation
+_dependency_pattern = re.compile(r'calc_vars\.(\w+)\.values')
+
 
 def gradient(gvar_name, var_name, drmin, calc_vars):
     '''
@@ -1047,45 +1070,41 @@ def calculate_output_variables(calc_vars, output_vars, controls):
         omgnormMTM(calc_vars, output_vars)
 
 
+# Base variables that are calculated (calculation order is found from dependencies)
+_base_calculations = [
+    'nh', 'ni', 'ni2', 'ahyd', 'aimass', 'zeff', 'btor', 'rhochi', 'bunit', 'vpar',
+]
+
+# Additional variables that are calculated (calculation order is found from dependencies)
+_additional_calculations = [
+    'bunit_btor', 'tau', 'tauh', 'eps', 'p', 'beta', 'betae', 'betaeunit', 'csound', 'csound_a', 'loge',
+    'nuei', 'nuei2', 'vthe', 'vthi', 'wtransit', 'wbounce', 'nuste', 'nusti', 'gyrfe', 'gyrfeunit', 'gyrfi',
+    'gyrfiunit', 'lare', 'lareunit', 'rhosunit', 'gmax', 'gmaxunit', 'shear', 'shat', 'shat_gxi',
+    'shat_gxi_q', 'alphamhd', 'alphamhdunit', 'betaepunit', 'xetgm_const', 'etae', 'etai', 'epsilonne',
+    'curlh', 'curoh', 'xke', 'xki',
+]
+
+# Functions of all calculated base and additional variables
+_calculations = {var_name: globals()[var_name] for var_name in _base_calculations + _additional_calculations}
+
+
 def calculate_base_variables(calc_vars):
     '''
     Calculates base variables
 
     Since the input parameter calc_vars is a reference, no return value for
     calculations are needed. Base calculations do not depend on any gradient
-    variables or additional variables.
+    variables or additional variables.  The order of calculations is found
+    from their dependencies (see get_calculation_order).
 
     Parameters:
     * calc_vars (InputVariables): Object containing variable data
     '''
 
-    # Each use of the following calculate_variable functions are passing in
-    # the local function of the variable to be calculated, which shares the
-    # same name as the variable it calculates. Note that calculation order
-    # matters here.
-
-    # nh0(calc_vars)
-    nh(calc_vars)
-    ni(calc_vars)
-    ni2(calc_vars)
-    ahyd(calc_vars)
-    aimass(calc_vars)
-    zeff(calc_vars)
-    btor(calc_vars)
-    rhochi(calc_vars)
-    bunit(calc_vars)
-    vpar(calc_vars)
-
-    # Calculations for testing
-    # bpol(calc_vars)
-    # e_r_grp(calc_vars)
-    # e_r_phi(calc_vars)
-    # e_r_tht(calc_vars)
-    # wexbs(calc_vars)
-    # gxi(calc_vars)
+    for var_name in get_calculation_order()[0]:
+        _calculations[var_name](calc_vars)
 
-    if hasattr(calc_vars.options, 'use_etgm_btor') and calc_vars.options.use_etgm_btor:
-        calc_vars.bunit.values = calc_vars.btor.values
+    _apply_base_options(calc_vars)
 
 
 def calculate_gradient_variables(calc_vars):
@@ -1100,26 +1119,187 @@ def calculate_gradient_variables(calc_vars):
     * calc_vars (InputVariables): Object containing variable data
     '''
 
-    # Each use of the following calculate_variable functions are passing in
-    # the local function of the variable to be calculated, which shares the
-    # same name as the variable it calculates. Additionally, the sign on
-    # drmin (differential rmin) sets the sign of the gradient equation
+    drmin = np.diff(calc_vars.rmin.values, axis=0)
+    for gvar_name in _gradient_definitions:
+        _calculate_gradient(gvar_name, drmin, calc_vars)
+
+    _apply_gradient_options(calc_vars)
+
+
+def calculate_additional_variables(calc_vars):
+    '''
+    Calculates additional variables
 
+    Since the input parameter calc_vars is a reference, no return value for
+    calculations are needed.  Additional variables are not used for
+    constructing the MMM input file, and often mirror calculations made
+    within MMM so that their values may be plotted.  The order of
+    calculations is found from their dependencies (see get_calculation_order).
+
+    Parameters:
+    * calc_vars (InputVariables): Object containing variable data
+    '''
+
+    for var_name in get_calculation_order()[2]:
+        _calculations[var_name](calc_vars)
+
+
+def calculate_changed_variables(calc_vars, changed_vars, gradients=False):
+    '''
+    Recalculates only the variables that depend on a set of changed variables
+
+    Every base, gradient, and additional variable that depends on any of the
+    changed variables (directly, or through other calculated variables) is
+    recalculated in dependency order, and all other variables are left
+    unchanged.  The changed variables themselves are never recalculated, so
+    adjusted values of calculated variables are kept.  The result is the same
+    as calling calculate_base_variables and calculate_additional_variables
+    (and calculate_gradient_variables in between, when gradients is True),
+    but the cost is proportional to the number of variables that changed.
+
+    Parameters:
+    * calc_vars (InputVariables): Object containing variable data
+    * changed_vars (list[str]): Names of the variables whose values were changed
+    * gradients (bool): Also recalculate gradients of changed variables (optional)
+
+    Returns:
+    * (list[str]): Names of the recalculated variables, in the order they were calculated
+    '''
+
+    dependent_vars = get_dependent_variables(changed_vars, gradients)
     drmin = np.diff(calc_vars.rmin.values, axis=0)
-    # Positive drmin
-    gradient('gq', 'q', drmin, calc_vars)
-    gradient('gbunit', 'bunit', drmin, calc_vars)
-    gradient('gbtor', 'btor', drmin, calc_vars)
-    # Negative drmin
-    gradient('gne', 'ne', -drmin, calc_vars)
-    gradient('gnh', 'nh', -drmin, calc_vars)
-    gradient('gni', 'ni', -drmin, calc_vars)
-    gradient('gnz', 'nz', -drmin, calc_vars)
-    gradient('gte', 'te', -drmin, calc_vars)
-    gradient('gti', 'ti', -drmin, calc_vars)
-    gradient('gvpar', 'vpar', -drmin, calc_vars)
-    gradient('gvpol', 'vpol', -drmin, calc_vars)
-    gradient('gvtor', 'vtor', -drmin, calc_vars)
+
+    for var_name in dependent_vars:
+        if var_name in _gradient_definitions:
+            _calculate_gradient(var_name, drmin, calc_vars)
+        else:
+            _calculations[var_name](calc_vars)
+
+        # Options that override calculated values are applied as soon as the
+        # overridden variable is calculated, so that dependents use the override
+        if var_name == 'bunit':
+            _apply_base_options(calc_vars)
+        elif var_name in _gradient_definitions:
+            _apply_gradient_options(calc_vars)
+
+    return dependent_vars
+
+
+def get_dependent_variables(changed_vars, gradients=False):
+    '''
+    Gets the calculated variables that depend on a set of changed variables
+
+    Parameters:
+    * changed_vars (list[str]): Names of the variables whose values were changed
+    * gradients (bool): Include gradient variables (optional)
+
+    Returns:
+    * (list[str]): Names of all dependent variables, in the order they need to be calculated
+    '''
+
+    dependencies = get_dependency_graph()
+    changed_vars = set(changed_vars)
+    affected_vars = set(changed_vars)
+
+    dependent_vars = []
+    for var_name in sum(get_calculation_order(), []):
+        if var_name in changed_vars or (not gradients and var_name in _gradient_definitions):
+            continue
+        if not affected_vars.isdisjoint(dependencies[var_name]):
+            affected_vars.add(var_name)
+            dependent_vars.append(var_name)
+
+    return dependent_vars
+
+
+@functools.lru_cache(maxsize=None)
+def get_dependency_graph():
+    '''
+    Gets the variables that each calculated variable depends on
+
+    Dependencies of each calculation are found from the variables it reads
+    from calc_vars in its source code.  The override of the use_etgm_btor
+    option (gbunit = gbtor) is also included as a dependency, so that
+    recalculations are correct regardless of the options used.  Variables
+    read in any other way (such as through getattr or helper functions) are
+    not found, and must be added here (tests/scantest.py checks the graph
+    against a full recalculation).
+
+    Returns:
+    * (dict[str, frozenset[str]]): Maps each calculated variable name to the names of its dependencies
+    '''
+
+    dependencies = {}
+    for var_name, func in _calculations.items():
+        source = inspect.getsource(inspect.unwrap(func))
+        dependencies[var_name] = frozenset(_dependency_pattern.findall(source)) - {var_name}
+
+    for gvar_name, (var_name, __) in _gradient_definitions.items():
+        dependencies[gvar_name] = frozenset((var_name,) + _gradient_dependencies)
+
+    dependencies['gbunit'] |= {'gbtor'}
+
+    return dependencies
+
+
+@functools.lru_cache(maxsize=None)
+def get_calculation_order():
+    '''
+    Gets the order that base, gradient, and additional variables need to be calculated in
+
+    Variables are sorted so that each variable is calculated after all of the
+    variables it depends on.  Whenever the order of two variables does not
+    matter, they are kept in the order they are listed in.
+
+    Returns:
+    * (tuple[list[str]]): Names of base variables, gradient variables, and additional variables, in order
+
+    Raises:
+    * ValueError: If calculations have circular dependencies, or a base variable depends on a later variable
+    '''
+
+    dependencies = get_dependency_graph()
+    listed_vars = _base_calculations + list(_gradient_definitions) + _additional_calculations
+
+    ordered_vars = []
+    remaining_vars = list(listed_vars)
+    while remaining_vars:
+        for var_name in remaining_vars:
+            if dependencies[var_name].isdisjoint(remaining_vars):
+                break
+        else:
+            raise ValueError(f'Circular dependencies found between calculations: {", ".join(remaining_vars)}')
+        ordered_vars.append(var_name)
+        remaining_vars.remove(var_name)
+
+    num_base, num_gradients = len(_base_calculations), len(_gradient_definitions)
+    calculation_order = (
+        ordered_vars[:num_base],
+        ordered_vars[num_base:num_base + num_gradients],
+        ordered_vars[num_base + num_gradients:],
+    )
+
+    if set(calculation_order[0]) != set(_base_calculations) or \
+            set(calculation_order[1]) != set(_gradient_definitions):
+        raise ValueError('Base variables must not depend on gradient or additional variables')
+
+    return calculation_order
+
+
+def _calculate_gradient(gvar_name, drmin, calc_vars):
+    '''Calculates (str): the gradient variable gvar_name using (np.ndarray): drmin'''
+    var_name, sign = _gradient_definitions[gvar_name]
+    gradient(gvar_name, var_name, sign * drmin, calc_vars)
+
+
+def _apply_base_options(calc_vars):
+    '''Overrides calculated base variables as specified by options'''
+    if hasattr(calc_vars.options, 'use_etgm_btor') and calc_vars.options.use_etgm_btor:
+        calc_vars.bunit.values = calc_vars.btor.values
+
+
+def _apply_gradient_options(calc_vars):
+    '''Overrides calculated gradient variables as specified by options'''
 
     if hasattr(calc_vars.options, 'use_gnezero') and calc_vars.options.use_gnezero:
         calc_vars.gne.values[:, :] = 1e-12
@@ -1147,71 +1327,6 @@ def calculate_gradient_variables(calc_vars):
         calc_vars.gbunit.values = calc_vars.gbtor.values
 
 
-def calculate_additional_variables(calc_vars):
-    '''
-    Calculates additional variables
-
-    Since the input parameter calc_vars is a reference, no return value for
-    calculations are needed.  Additional variables are not used for
-    constructing the MMM input file, and often mirror calculations made
-    within MMM so that their values may be plotted.
-
-    Parameters:
-    * calc_vars (InputVariables): Object containing variable data
-    '''
-
-    # Each use of the following calculate_variable functions are passing in
-    # the local function of the variable to be calculated, which shares the
-    # same name as the variable it calculates. Note that calculation order
-    # matters here.
-
-    bunit_btor(calc_vars)
-    tau(calc_vars)
-    tauh(calc_vars)
-    eps(calc_vars)
-    p(calc_vars)
-    beta(calc_vars)
-    betae(calc_vars)
-    betaeunit(calc_vars)
-    csound(calc_vars)
-    csound_a(calc_vars)
-    loge(calc_vars)
-    nuei(calc_vars)
-    nuei2(calc_vars)
-    vthe(calc_vars)
-    vthi(calc_vars)
-    wtransit(calc_vars)
-    wbounce(calc_vars)
-    nuste(calc_vars)
-    nusti(calc_vars)
-    gyrfe(calc_vars)
-    gyrfeunit(calc_vars)
-    gyrfi(calc_vars)
-    gyrfiunit(calc_vars)
-    lare(calc_vars)
-    lareunit(calc_vars)
-    rhosunit(calc_vars)
-    gmax(calc_vars)
-    gmaxunit(calc_vars)
-    shear(calc_vars)
-    shat(calc_vars)
-    shat_gxi(calc_vars)
-    shat_gxi_q(calc_vars)
-    alphamhd(calc_vars)
-    alphamhdunit(calc_vars)
-    betaepunit(calc_vars)
-    xetgm_const(calc_vars)
-    etae(calc_vars)
-    etai(calc_vars)
-    epsilonne(calc_vars)
-    curlh(calc_vars)
-    curoh(calc_vars)
-    xke(calc_vars)
-    xki(calc_vars)
-
-    # betanorm(calc_vars)
-
-
 def calculate_new_variables(cdf_vars):
     '''
     Calculates new variables needed for MMM and data display
@@ -0,0 +1,233 @@
+"""Caches variables extracted and converted from CDFs on disk
+
+Initializing variables from a CDF requires reading every CDF variable,
+converting units, interpolating each variable onto the boundary grid and the
+input points, and then calculating all new variables.  The result of this
+process only depends on the CDF itself, the Options values that are used
+during initialization, and the code that does the initialization, so the
+variables are cached after they are first initialized and reused afterwards.
+
+The cache key is a hash of the path, size, and modification time of the CDF,
+the size and modification time of each module that is used to initialize
+variables, and the values of each option in _KEY_OPTIONS, so a changed CDF or
+a code change never reuses old variables.  Entries of a runid that were made
+from a different CDF or different code are removed when a new entry of the
+runid is saved.  Values of each variable are stored in a .npz file, and all
+other members of each variable are stored in a pickle file that is written
+last, so that a cache entry is only used once it is complete.
+
+Example Usage:
+    cache_key = cdfcache.get_key(options)
+    cached_vars = cdfcache.load_variables(cache_key, options)
+    if cached_vars is None:
+        mmm_vars, cdf_vars, raw_cdf_vars = initialize_variables(options)
+        cdfcache.save_variables(cache_key, options, mmm_vars, cdf_vars, raw_cdf_vars)
+"""
+
+# Standard Packages
+import sys; sys.path.insert(0, '../')
+import os
+import pickle
+import hashlib
+import logging
+import importlib
+import threading
+
+# 3rd Party Packages
+import numpy as np
+
+# Local Packages
+import modules.utils as utils
+import modules.variables as variables
+
+
+_log = logging.getLogger(__name__)
+
+# Increase when the contents of cache entries change, so that old entries are not used
+_CACHE_VERSION = 2
+
+# Options that change the values of initialized variables
+_KEY_OPTIONS = [
+    'runid', 'shot_type', 'input_points', 'apply_smoothing', 'ignore_exceptions', 'temperature_profiles',
+    'use_gnezero', 'use_gtezero', 'use_gneabs', 'use_gnethreshold', 'use_gtethreshold', 'use_etgm_btor',
+    'single_time_slice',
+]
+
+# Modules whose code is used to initialize variables (imported by name, since datahelper imports this module)
+_SOURCE_MODULES = [
+    'modules.variables', 'modules.cdfreader', 'modules.conversions', 'modules.calculations',
+    'modules.interpolation', 'modules.datahelper', 'modules.options', 'modules.constants',
+]
+
+# Names of the cached variables objects, in the order returned by load_variables
+_VARS_NAMES = ['mmm_vars', 'cdf_vars', 'raw_cdf_vars']
+
+
+def get_key(options):
+    '''
+    Gets the cache key of the variables initialized from a CDF
+
+    This needs to be called before variables are initialized, since
+    initialization may change the values of options (such as input_points).
+
+    Parameters:
+    * options (Options): Contains user specified options
+
+    Returns:
+    * (str): Hashes identifying the CDF and code used, and the options used, separated by a space
+
+    Raises:
+    * FileNotFoundError: If the CDF cannot be found
+    '''
+
+    source_key = _get_source_key(options)
+    options_lines = [f'{name}:{getattr(options, name)}' for name in _KEY_OPTIONS]
+    if options.single_time_slice:
+        # Values of a single time slice also depend on the measurement time and scan type
+        options_lines += [f'input_time:{options.input_time}', f'scan_type:{options.scan_type}']
+    options_key = hashlib.sha256('\n'.join(options_lines).encode()).hexdigest()
+
+    return f'{source_key} {options_key}'
+
+
+def load_variables(cache_key, options):
+    '''
+    Loads cached variables, and sets the options that are set when variables are initialized
+
+    Parameters:
+    * cache_key (str): The cache key of the variables (see get_key)
+    * options (Options): Contains user specified options
+
+    Returns:
+    * (tuple[InputVariables] | None): mmm_vars, cdf_vars, raw_cdf_vars, or None if the variables are not cached
+    '''
+
+    values_path, members_path = _get_file_paths(options.runid, cache_key)
+
+    try:
+        with open(members_path, 'rb') as f:
+            cached_members = pickle.load(f)
+        with np.load(values_path) as data:
+            cached_values = {name: data[name] for name in data.files}
+    except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+        # The variables are not cached, or the cache entry was removed or is incomplete
+        return None
+
+    vars_objects = []
+    for vars_name in _VARS_NAMES:
+        input_vars = variables.InputVariables(options)
+        for var_name, members in cached_members['variables'][vars_name].items():
+            var = getattr(input_vars, var_name)
+            var.set_members(members)
+            if f'{vars_name}/{var_name}' in cached_values:
+                var.values = cached_values[f'{vars_name}/{var_name}']
+        vars_objects.append(input_vars)
+
+    options.input_points = cached_members['input_points']
+    options.set_measurement_time(vars_objects[-1].time.values)
+
+    _log.info(f'\n\tLoaded cached CDF variables: {values_path}\n')
+
+    return tuple(vars_objects)
+
+
+def save_variables(cache_key, options, mmm_vars, cdf_vars, raw_cdf_vars):
+    '''
+    Saves initialized variables to the cache, and removes entries of the runid made from a different CDF or code
+
+    Parameters:
+    * cache_key (str): The cache key of the variables (see get_key)
+    * options (Options): Contains user specified options
+    * mmm_vars (InputVariables): All calculated variables
+    * cdf_vars (InputVariables): All interpolated CDF variables
+    * raw_cdf_vars (InputVariables): All unedited CDF variables
+    '''
+
+    os.makedirs(utils.get_cdf_cache_path(), exist_ok=True)  # Safe when called concurrently
+
+    cached_members = {'input_points': options.input_points, 'variables': {}}
+    cached_values = {}
+    for vars_name, input_vars in zip(_VARS_NAMES, (mmm_vars, cdf_vars, raw_cdf_vars)):
+        cached_members['variables'][vars_name] = {}
+        for var_name in input_vars.get_variables():
+            members = getattr(input_vars, var_name).get_members()
+            values = members.pop('_values')
+            if values is not None:
+                cached_values[f'{vars_name}/{var_name}'] = values
+            cached_members['variables'][vars_name][var_name] = members
+
+    _remove_old_entries(options.runid, cache_key)
+
+    values_path, members_path = _get_file_paths(options.runid, cache_key)
+    tmp_suffix = f'.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(f'{values_path}{tmp_suffix}', 'wb') as f:
+        np.savez(f, **cached_values)
+    os.replace(f'{values_path}{tmp_suffix}', values_path)
+    with open(f'{members_path}{tmp_suffix}', 'wb') as f:
+        pickle.dump(cached_members, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f'{members_path}{tmp_suffix}', members_path)
+
+    _log.info(f'\n\tSaved cached CDF variables: {values_path}\n')
+
+
+def clear_cache(runid=None):
+    '''
+    Removes cached variables
+
+    Parameters:
+    * runid (str): The runid to remove cached variables of (optional; all runids when None)
+    '''
+
+    cache_path = utils.get_cdf_cache_path()
+    if runid is None:
+        utils.remove_directory(cache_path)
+        return
+
+    for file_path in utils.get_files_in_dir(cache_path, f'{runid} *', show_warning=False):
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass  # Already removed by another process
+
+
+def _get_source_key(options):
+    '''
+    Gets the part of the cache key that identifies the CDF and the code that initializes variables
+
+    Parameters:
+    * options (Options): Contains user specified options
+
+    Returns:
+    * (str): The first 16 hexadecimal digits of a SHA-256 hash
+
+    Raises:
+    * FileNotFoundError: If the CDF cannot be found
+    '''
+
+    cdf_path = utils.get_cdf_path(options.runid, options.shot_type)
+    cdf_stat = os.stat(cdf_path)
+
+    key_lines = [str(_CACHE_VERSION), f'{os.path.abspath(cdf_path)}:{cdf_stat.st_size}:{cdf_stat.st_mtime_ns}']
+    for module_name in _SOURCE_MODULES:
+        module = importlib.import_module(module_name)
+        module_stat = os.stat(module.__file__)
+        key_lines.append(f'{module.__name__}:{module_stat.st_size}:{module_stat.st_mtime_ns}')
+
+    return hashlib.sha256('\n'.join(key_lines).encode()).hexdigest()[:16]
+
+
+def _remove_old_entries(runid, cache_key):
+    '''Removes entries of the runid that were made from a different CDF or different code'''
+    source_key = cache_key.split()[0]
+    for file_path in utils.get_files_in_dir(utils.get_cdf_cache_path(), f'{runid} *', show_warning=False):
+        if os.path.basename(file_path).split()[1] != source_key:
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass  # Already removed by another process
+
+
+def _get_file_paths(runid, cache_key):
+    '''Returns (tuple[str]): the paths of the values file and the members file of a cache entry'''
+    file_path = f'{utils.get_cdf_cache_path()}\\{runid} {cache_key}'
+    return f'{file_path}.npz', f'{file_path}.pickle'
@@ -5,8 +5,16 @@ and NSTX TRANSP discharge types, and may not work for other types of
 discharges.  The CDF's must be saved in the "cdfs" folder of the top level
 directory in order for this module to find them.
 
+Values of variables can optionally be loaded lazily, where each variable only
+reads its values from the CDF when its values are first accessed, and values
+can be restricted to a window of time indices.  This reduces both load time
+and memory use when only a few variables or time values of a large CDF are
+needed.  Opened CDFs are kept open for lazy loading, and can be closed using
+close_datasets.
+
 Example Usage:
 * cdf_vars = extract_data('120968A02.CDF')
+* cdf_vars = extract_data(options, lazy=True, time_window=slice(10, 20))
 * print_variables('120968A02.CDF')
 * print_dimensions('120968A02.CDF')
 """
@@ -28,13 +36,23 @@ import modules.utils as utils
 _log = logging.getLogger(__name__)
 
 
-def extract_data(options, print_warnings=False):
+# CDFs opened by this module, and their modification times, keyed by their file paths
+_datasets = {}
+
+
+def extract_data(options, print_warnings=False, lazy=False, time_window=None):
     '''
     Extracts variable data from a CDF and stores it in a variables object
 
+    When a time window is used, every time dependent variable (including time
+    itself) only contains values within the window, so the measurement time
+    index set in options is an index within the window.
+
     Parameters:
     * options (Options): Object containing user options
     * print_warnings (bool): Prints warning messages
+    * lazy (bool): Defer reading values of each variable until its values are first accessed (optional)
+    * time_window (int | slice): Index or slice of time indices to read values of (optional)
 
     Returns:
     * cdf_vars (InputVariables): Object containing extracted variable data from the CDF
@@ -50,7 +68,9 @@ def extract_data(options, print_warnings=False):
             f'\n\tPath: {cdf_file}'
         )
 
-    cdf = Dataset(cdf_file)
+    cdf = _get_dataset(cdf_file)
+    if isinstance(time_window, (int, np.integer)):
+        time_window = slice(time_window, time_window + 1)  # Keep the time dimension
 
     # Runid from CDF should match input runid, else CDF file might be named incorrectly
     if options.runid != cdf.Runid.strip() and options.runid != 'TEST':
@@ -63,15 +83,15 @@ def extract_data(options, print_warnings=False):
     for var_name in cdf_vars_to_get:
         var = getattr(cdf_vars, var_name)
         if var.cdfvar in cdf.variables:
-            # Transpose to put the values in the format needed for calculations: (X, T)
-            values = np.array(cdf.variables[var.cdfvar][:].T)
-
-            # Not all variable values in the CDF are arrays
-            var.values = values[:] if values.size > 1 else values
+            values_loader = _CdfValuesLoader(cdf_file, var.cdfvar, time_window)
+            if lazy:
+                var.set_loader(values_loader)
+            else:
+                var.values = values_loader()
             var.units = (cdf.variables[var.cdfvar].units).strip()
             var.desc = (cdf.variables[var.cdfvar].long_name).strip()
 
-            # Store variable dimensions in reverse order, since we transposed the values above
+            # Store variable dimensions in reverse order, since values are transposed when loaded
             cdf_dimensions = cdf.variables[var.cdfvar].get_dims()
             var.dimensions = [dim.name for dim in cdf_dimensions]
             var.dimensions.reverse()
@@ -84,6 +104,55 @@ def extract_data(options, print_warnings=False):
     return cdf_vars
 
 
+def close_datasets():
+    '''Closes all CDFs opened by this module'''
+    for cdf, __ in _datasets.values():
+        cdf.close()
+    _datasets.clear()
+
+
+class _CdfValuesLoader:
+    '''
+    Reads the values of a single variable from a CDF
+
+    Loaders only store the path of the CDF, so that they can be copied and
+    pickled along with the variables that use them.
+
+    Members:
+    * cdf_file (str): The path of the CDF
+    * cdfvar (str): The name of the variable in the CDF
+    * time_window (slice): Time indices to read values of, or None to read all values
+    '''
+
+    def __init__(self, cdf_file, cdfvar, time_window=None):
+        self.cdf_file = cdf_file
+        self.cdfvar = cdfvar
+        self.time_window = time_window
+
+    def __call__(self):
+        '''Returns (np.ndarray): The values of the variable, in the format needed for calculations: (X, T)'''
+        cdf_var = _get_dataset(self.cdf_file).variables[self.cdfvar]
+
+        is_time_dependent = cdf_var.ndim > 0 and cdf_var.get_dims()[0].name.startswith('TIME')
+        if self.time_window is not None and is_time_dependent:
+            values = np.array(cdf_var[self.time_window].T)
+        else:
+            values = np.array(cdf_var[:].T)
+
+        # Not all variable values in the CDF are arrays
+        return values[:] if values.size > 1 else values
+
+
+def _get_dataset(cdf_file):
+    '''Returns (Dataset): The opened CDF, which is opened again if the CDF has changed since it was opened'''
+    mtime = os.stat(cdf_file).st_mtime_ns
+    if cdf_file in _datasets and _datasets[cdf_file][1] != mtime:
+        _datasets.pop(cdf_file)[0].close()
+    if cdf_file not in _datasets:
+        _datasets[cdf_file] = (Dataset(cdf_file), mtime)
+    return _datasets[cdf_file][0]
+
+
 def print_variables(runid):
     '''
     Print names, descriptions, units, and dimensions of all variables in the CDF
@@ -55,6 +55,9 @@ import numpy as np
 
 # Local Packages
 import modules.utils as utils
+import modules.scanstore as scanstore
+import modules.csvreader as csvreader
+import modules.outputsink as outputsink
 import modules.constants as constants
 from modules.enums import SaveType
 
@@ -160,10 +163,13 @@ class InputControls:
         '''Verifies that certain control values are correct and fixes them if needed'''
         ...
 
-    def get_mmm_header(self):
+    def get_mmm_header(self, binary_io=False):
         '''
         Gets the header for the MMM input file
 
+        Parameters:
+        * binary_io (bool): Tell the MMM wrapper to read and write variables using binary files (Optional)
+
         Raises:
         * TypeError: If input_points.values is None
         * TypeError: If input_points.values is of type np.ndarray
@@ -180,6 +186,7 @@ class InputControls:
             '&testmmm_input_control\n'
             f'   npoints = {self.input_points.get_input_line()}'
             f'   input_kind = 1\n'
+            f'{"   binary_io = 1" + chr(10) if binary_io else ""}'
             '/\n'
             '&testmmm_input_1stkind\n'
             '\n'
@@ -282,16 +289,41 @@ class InputControls:
         for kvp in kvps:
             print(kvp)
 
+    def get_data_as_array(self):
+        '''
+        Gets the values of all controls in array format
+
+        Returns:
+        * data (np.ndarray): The values of each control, with shape (1, controls)
+        * header (str): The string of control names corresponding to data in the array
+        '''
+
+        keys = self.get_keys()
+        data = np.array([[float(getattr(self, key).values) for key in keys]])
+        return data, ','.join(keys)
+
     def save(self, scan_factor=None):
         '''
         Saves InputControls data to CSV
 
-        If scan_factor is specified, then var_to_scan must also be specified
+        If scan_factor is specified, then var_to_scan must also be specified.
+        Controls of a scan factor are saved to the scan store instead when the
+        scan has one (see scanstore).  The CSV is written in the background when
+        an OutputSink is active (see outputsink).
 
         Parameters:
         * scan_factor (float): The value of the scan factor (Optional)
+
+        Returns:
+        * (dict): Maps SaveType.CONTROLS to the saved data and header (see get_data_as_array)
         '''
 
+        saved_data = {SaveType.CONTROLS: self.get_data_as_array()}
+
+        if scan_factor and scanstore.has_store(self.options, SaveType.CONTROLS):
+            scanstore.save_factor(self.options, SaveType.CONTROLS, scan_factor, *saved_data[SaveType.CONTROLS])
+            return saved_data
+
         runid = self.options.runid
         scan_num = self.options.scan_num
         var_to_scan = self.options.var_to_scan
@@ -306,25 +338,29 @@ class InputControls:
             file_name = f'{save_dir}\\{SaveType.CONTROLS.name.capitalize()}.csv'
 
         control_data = self.get_key_values_pairs()
-
-        with open(file_name, 'w') as f:
-            for data in control_data:
-                f.write(f'{data}\n')
+        outputsink.write_text(file_name, ''.join(f'{data}\n' for data in control_data))
 
         _log.info(f'\n\tSaved: {file_name}\n')
 
+        return saved_data
+
     def load_from_csv(self, scan_factor=None, use_rho=False):
         '''
         Loads Controls data from a CSV into the current Controls object
 
         If either parameter use_rho or scan_factor are specified, then
-        var_to_scan must also be specified.
+        var_to_scan must also be specified.  Controls of control scans saved to
+        a scan store are loaded from the store instead (see load_from_store).
 
         Parameters:
         * scan_factor (float): The scan_factor, if doing a variable scan (optional)
         * use_rho (bool): True if the CSV to load is in the rho folder (optional)
         '''
 
+        if (scan_factor is not None or use_rho) and scanstore.has_store(self.options, SaveType.CONTROLS):
+            self.load_from_store(scan_factor, use_rho)
+            return
+
         runid = self.options.runid
         scan_num = self.options.scan_num
         var_to_scan = self.options.var_to_scan
@@ -355,6 +391,20 @@ class InputControls:
             else:
                 self._load_from_simple_csv(control_files[0])
 
+    def load_from_store(self, scan_factor=None, use_rho=False):
+        '''
+        Loads Controls data of a control scan from the scan store (see scanstore)
+
+        Parameters:
+        * scan_factor (float): The scan_factor to load (optional)
+        * use_rho (bool): Loads values of every scan factor when True, in the same way as the rho folder CSV (optional)
+        '''
+
+        var_names, values = scanstore.load_controls(self.options, None if use_rho else scan_factor)
+        for name, value in zip(var_names, values.T):
+            if hasattr(self, name):
+                getattr(self, name).values = value if use_rho else float(value)
+
     def _load_from_simple_csv(self, file_name):
         '''
         Loads a simple CSV where each line is a single (key, value) pair
@@ -377,11 +427,10 @@ class InputControls:
         * file_name (str): The name and path of the file to open
         '''
 
-        data_array = np.genfromtxt(file_name, delimiter=',', dtype=float, names=True)
-        control_names = data_array.dtype.names
-        for name in control_names:
+        control_names, values = csvreader.read_csv(file_name)
+        for i, name in enumerate(control_names):
             if hasattr(self, name):
-                getattr(self, name).values = data_array[name]
+                getattr(self, name).values = values[:, i]
 
 
 class Control:
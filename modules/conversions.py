@@ -24,14 +24,18 @@ example, if variable A was interpolated onto a larger grid first and then
 calculated, and variable B was calculated first and then interpolated onto a
 larger grid, comparing the values of A and B will show a difference greater
 than that attributed to floating point errors.
+
+Variables that share the same radial grid are interpolated together in a
+single step using the interpolation module, which is much faster than
+interpolating each variable separately.
 """
 
 # 3rd Party Packages
 import numpy as np
-from scipy.interpolate import interp1d
 
 # Local Packages
 import modules.datahelper as datahelper
+import modules.interpolation as interpolation
 
 
 class _XValues:
@@ -153,15 +157,30 @@ def _interp_to_boundarygrid(input_var, xvals):
 
     # Interpolate/Extrapolate variable from X or XB to XBO
     elif xdim in ['X', 'XB']:
-        set_interp = interp1d(getattr(xvals, xdim.lower()), input_var.values,
-                              kind='cubic', fill_value="extrapolate", axis=0)
-        input_var.set(values=set_interp(xvals.xbo))
-        input_var.set_xdim('XBO')
+        _interp_all_to_boundarygrid([input_var], xvals)
 
     else:
         raise NotImplementedError(f'Unsupported interpolation xdim {xdim} for variable {input_var.name}')
 
 
+def _interp_all_to_boundarygrid(input_vars_list, xvals):
+    '''
+    Interpolates variables defined on X or XB to XBO, where variables on the same grid are interpolated together
+
+    Parameters:
+    * input_vars_list (list[Variable]): Variables with an xdim of X or XB
+    * xvals (_XValues): Cached x-dimension values needed for the interpolation process
+    '''
+
+    for xdim in ['X', 'XB']:
+        grid_vars = [input_var for input_var in input_vars_list if input_var.get_xdim() == xdim]
+        grid_values = [input_var.values for input_var in grid_vars]
+        new_values = interpolation.interp_stacked(getattr(xvals, xdim.lower()), grid_values, xvals.xbo)
+        for input_var, values in zip(grid_vars, new_values):
+            input_var.set(values=values)
+            input_var.set_xdim('XBO')
+
+
 def _interp_to_input_points(input_vars):
     '''
     Interpolates from XB to a grid of size determined by input points
@@ -195,14 +214,27 @@ def _interp_to_input_points(input_vars):
             full_var_list.remove(var)
 
         # Interpolate variables onto grid specified by input_points
+        interp_vars = []
         for var in full_var_list:
-            mmm_var = getattr(mmm_vars, var)
-            if mmm_var.values is None:
+            # Values are replaced by interpolation, so shared values are read without copying them
+            values = getattr(mmm_vars, var).get_read_only_values()
+            if values is None:
                 raise ValueError(f'Trying to interpolate variable {var} with values equal to None')
 
-            if isinstance(mmm_var.values, np.ndarray) and mmm_var.values.size > 1:
-                set_interp = interp1d(xb, mmm_var.values, kind='cubic', fill_value="extrapolate", axis=0)
-                mmm_var.set(values=set_interp(xb_new))
+            if isinstance(values, np.ndarray) and values.size > 1:
+                interp_vars.append(var)
+
+        # Variables of the same shape as xb are interpolated together, and stored in a single array
+        interp_values = {var: getattr(mmm_vars, var).get_read_only_values() for var in interp_vars}
+        stored_vars = [var for var in interp_vars if interp_values[var].shape == mmm_vars.xb.values.shape]
+        other_vars = [var for var in interp_vars if var not in stored_vars]
+
+        stored_values = np.stack([interp_values[var] for var in stored_vars])
+        mmm_vars.set_backing_store(stored_vars, interpolation.get_weights(xb, xb_new) @ stored_values)
+
+        new_values = interpolation.interp_stacked(xb, [interp_values[var] for var in other_vars], xb_new)
+        for var, values in zip(other_vars, new_values):
+            getattr(mmm_vars, var).set(values=values)
 
     return mmm_vars
 
@@ -238,11 +270,17 @@ def _initial_conversion(cdf_vars):
     # Get list of CDF variables to convert to the format needed for MMM
     # Independent variables listed below don't need to be converted
     cdf_var_list = cdf_vars.get_cdf_variables()
+    grid_vars = []  # Variables on X or XB, which are interpolated together afterwards
     for var_name in cdf_var_list:
         input_var = getattr(input_vars, var_name)
         convert_units(input_var)
         if input_var.values is not None and var_name not in ['time', 'x', 'xb']:
-            _interp_to_boundarygrid(input_var, xvals)
+            if input_var.get_xdim() in ['X', 'XB']:
+                grid_vars.append(input_var)
+            else:
+                _interp_to_boundarygrid(input_var, xvals)
+
+    _interp_all_to_boundarygrid(grid_vars, xvals)
 
     # Use TEPRO, TIPRO in place of TE, TI
     if input_vars.options.temperature_profiles:
@@ -275,14 +313,13 @@ def convert_variables(cdf_vars):
 
     full_var_list = mmm_vars.get_nonzero_variables()
     # Apply smoothing, then verify minimum values (fixes errors due to interpolation)
-    for var_name in full_var_list:
-        mmm_var = getattr(mmm_vars, var_name)
-        if mmm_vars.options.apply_smoothing:
-            mmm_var.apply_smoothing()
+    if mmm_vars.options.apply_smoothing:
+        mmm_vars.apply_smoothing(full_var_list)
 
+    for var_name in full_var_list:
         # Since interpolation can create multiple expected nonphysical values,
         # no exceptions are raised for fixing these issues
-        mmm_var.set_minvalue(ignore_exceptions=True)
+        getattr(mmm_vars, var_name).set_minvalue(ignore_exceptions=True)
 
     mmm_vars.set_x_values()
     mmm_vars.set_radius_values()
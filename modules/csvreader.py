@@ -0,0 +1,190 @@
+"""Reads CSVs of variable data, with an optional binary cache of each CSV
+
+Every CSV of variable data saved by this package (as well as the MMM output
+CSV) has a single header line of variable names, which may be preceded by a
+comment character, followed by rows of numeric values.  Reading these files
+using np.genfromtxt(names=True) is slow, since every value is parsed in
+Python; the plotting scripts read hundreds of these files.  The header is
+instead parsed once, and all values are read at once using np.loadtxt.
+
+When settings.USE_CSV_CACHE is enabled, the values of each CSV read from a
+file path are also saved to a binary .npy file in a __cache__ folder next to
+the CSV, which is read instead of the values of the CSV afterwards (only the
+header line of the CSV is still read).  Cached files are named using the size
+and modification time of their CSV, so a CSV that has been rewritten (such as
+rho files that are updated while a scan runs) is never read from an old
+cached file.  Cached files are written to a temporary file
+and then renamed, so concurrent reads never see a partially written file.
+Files that are only read once (such as the output of each MMM run) should be
+read using use_cache=False, so that no cached file is written for them.
+
+Example Usage:
+    var_names, values = csvreader.read_csv(file_path)
+    rmin = values[:, var_names.index('rmin')]
+"""
+
+# Standard Packages
+import sys; sys.path.insert(0, '../')
+import os
+import logging
+import threading
+
+# 3rd Party Packages
+import numpy as np
+
+# Local Packages
+import settings
+import modules.utils as utils
+
+
+_log = logging.getLogger(__name__)
+
+# Name of the folder of cached CSVs, which is created in the folder of each cached CSV
+_CACHE_DIR = '__cache__'
+
+
+def read_csv(file_path, use_cache=None):
+    '''
+    Reads the variable names and values of a CSV
+
+    Parameters:
+    * file_path (str | file): The path of the CSV to read, or a file-like object
+    * use_cache (bool): Read and save cached values of the CSV (optional; default is settings.USE_CSV_CACHE)
+
+    Returns:
+    * var_names (tuple[str]): The name of each variable in the CSV
+    * values (np.ndarray): Values of each variable, with shape (row, variable)
+
+    Raises:
+    * ValueError: If the number of values in a row does not match the number of variable names
+    '''
+
+    if use_cache is None:
+        use_cache = settings.USE_CSV_CACHE
+
+    if not isinstance(file_path, str):
+        return _parse_csv(file_path)
+
+    if not use_cache:
+        with open(file_path) as f:
+            return _parse_csv(f)
+
+    file_stat = os.stat(file_path)
+    cache_dir, cache_name = _get_cache_location(file_path)
+    cache_path = f'{cache_dir}\\{cache_name}.{file_stat.st_size}-{file_stat.st_mtime_ns}.npy'
+
+    with open(file_path) as f:
+        var_names = _parse_header(f)
+        try:
+            values = np.load(cache_path)
+        except (OSError, ValueError):
+            pass  # The CSV is not cached, or was removed or is incomplete
+        else:
+            if values.ndim == 2 and values.shape[1] == len(var_names):
+                return var_names, values
+
+        values = _parse_values(f, var_names)
+
+    _save_cache(cache_dir, cache_name, cache_path, values)
+
+    return var_names, values
+
+
+def clear_cache(dir_path):
+    '''
+    Removes cached CSVs of a folder
+
+    Parameters:
+    * dir_path (str): The folder of the cached CSVs
+    '''
+
+    utils.remove_directory(f'{dir_path}\\{_CACHE_DIR}')
+
+
+def _parse_csv(f):
+    '''
+    Parses the header and values of an open CSV
+
+    The first line of the CSV contains the variable names, and all following
+    lines that start with a comment character are skipped.
+
+    Parameters:
+    * f (file): The open CSV
+
+    Returns:
+    * var_names (tuple[str]): The name of each variable in the CSV
+    * values (np.ndarray): Values of each variable, with shape (row, variable)
+
+    Raises:
+    * ValueError: If the number of values in a row does not match the number of variable names
+    '''
+
+    var_names = _parse_header(f)
+    return var_names, _parse_values(f, var_names)
+
+
+def _parse_header(f):
+    '''Returns (tuple[str]): the variable names of the first line of an open CSV, which may start with #'''
+    header = f.readline().strip().lstrip('#')
+    return tuple(name.strip() for name in header.split(',')) if header else ()
+
+
+def _parse_values(f, var_names):
+    '''
+    Parses the values of an open CSV, after its header has been read
+
+    Parameters:
+    * f (file): The open CSV
+    * var_names (tuple[str]): The name of each variable in the CSV
+
+    Returns:
+    * (np.ndarray): Values of each variable, with shape (row, variable)
+
+    Raises:
+    * ValueError: If the number of values in a row does not match the number of variable names
+    '''
+
+    text = f.read()
+    if not text.strip():
+        return np.empty((0, len(var_names)))
+
+    values = np.loadtxt(text.splitlines(), delimiter=',', comments='#', ndmin=2)
+    if values.shape[1] != len(var_names):
+        raise ValueError(f'CSV has {values.shape[1]} values per row, but {len(var_names)} variable names')
+
+    return values
+
+
+def _get_cache_location(file_path):
+    '''Returns (tuple[str, str]): the folder of cached files of the CSV, and the file name of the CSV'''
+    sep_idx = max(file_path.rfind('\\'), file_path.rfind('/'))
+    return f'{file_path[:sep_idx]}\\{_CACHE_DIR}', file_path[sep_idx + 1:]
+
+
+def _save_cache(cache_dir, cache_name, cache_path, values):
+    '''
+    Saves the values of a CSV to its cached file, and removes cached files of older versions of the CSV
+
+    Values are not cached when the folder cannot be written to.
+
+    Parameters:
+    * cache_dir (str): The folder of cached files of the CSV
+    * cache_name (str): The file name of the CSV
+    * cache_path (str): The path of the cached file
+    * values (np.ndarray): Values of each variable, with shape (row, variable)
+    '''
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)  # Safe when called concurrently
+        for old_path in utils.get_files_in_dir(cache_dir, f'{cache_name}.*.npy', show_warning=False):
+            try:
+                os.remove(old_path)
+            except FileNotFoundError:
+                pass  # Already removed by another process
+
+        tmp_path = f'{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(values, dtype='<f8'))
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        _log.warning(f'\n\tUnable to cache CSV values: {cache_path}\n\t{e}\n')
@@ -10,12 +10,19 @@ Example Usage:
 
 from copy import deepcopy
 
+import numpy as np
+
+import settings
 import modules.variables as variables
 import modules.controls as controls
 import modules.calculations as calculations
 import modules.conversions as conversions
 import modules.cdfreader as cdfreader
+import modules.cdfcache as cdfcache
+import modules.csvreader as csvreader
+import modules.scanstore as scanstore
 import modules.utils as utils
+import modules.constants as constants
 from modules.enums import SaveType, ScanType
 
 
@@ -24,6 +31,15 @@ def initialize_variables(options):
     Initializes all input variables needed to run the MMM Driver and plot
     variable profiles
 
+    Initialized variables are loaded from the CDF cache when possible, when
+    settings.USE_CDF_CACHE is enabled (see the cdfcache module).
+
+    When options.single_time_slice is enabled, only values at the measurement
+    time are extracted from the CDF, so that all conversions and calculations
+    are done on a single time column.  No calculation depends on values at
+    other times, so variables at the measurement time are identical to those
+    calculated using every time value.
+
     Parameters:
     * options (Options): Contains user specified options
 
@@ -33,31 +49,71 @@ def initialize_variables(options):
     * raw_cdf_vars (InputVariables): All unedited CDF variables
     '''
 
-    raw_cdf_vars = cdfreader.extract_data(options)
+    if settings.USE_CDF_CACHE:
+        cache_key = cdfcache.get_key(options)
+        cached_vars = cdfcache.load_variables(cache_key, options)
+        if cached_vars is not None:
+            return cached_vars
+
+    raw_cdf_vars = cdfreader.extract_data(options, time_window=_get_time_window(options))
     cdf_vars = conversions.convert_variables(raw_cdf_vars)
     mmm_vars = calculations.calculate_new_variables(cdf_vars)
 
+    if settings.USE_CDF_CACHE:
+        cdfcache.save_variables(cache_key, options, mmm_vars, cdf_vars, raw_cdf_vars)
+
     return mmm_vars, cdf_vars, raw_cdf_vars
 
 
+def uses_all_times(options):
+    '''Returns (bool): True if variables are initialized using the values of every time slice of the CDF'''
+    return not options.single_time_slice or options.scan_type == ScanType.TIME or options.input_time is None
+
+
+def _get_time_window(options):
+    '''
+    Gets the time index to extract values of, when only a single time slice is needed
+
+    Parameters:
+    * options (Options): Contains user specified options
+
+    Returns:
+    * (int | None): The index of the measurement time in the CDF, or None if all times are needed
+    '''
+
+    if uses_all_times(options):
+        return None
+
+    # Values are loaded lazily, so only the time values are read to find the measurement time
+    cdfreader.extract_data(options, lazy=True)
+
+    return options.time_idx
+
+
 def deepcopy_data(obj):
     '''
-    Creates a deepcopy of the given object and reference between their
+    Creates a copy of the given object and reference between their
     options
 
-    A deepcopy is needed to avoid creating a reference between two object
+    A copy is needed to avoid creating a reference between two object
     classes.  However, we do want to create a reference between the options
     stored in each class, so that only one options object exists between all
-    copied objects.
+    copied objects.  Variables objects are copied using copy-on-write, so
+    the values of each variable are only copied once they are modified in
+    either object (see Variables.copy_on_write).  All other objects are deep
+    copied.
 
     Parameters:
-    * obj (InputControls | InputVariables | OutputVariables): The obj to deepcopy
+    * obj (InputControls | InputVariables | OutputVariables): The obj to copy
 
     Returns
-    * new_obj (InputControls | InputVariables | OutputVariables): deepcopy of obj
+    * new_obj (InputControls | InputVariables | OutputVariables): copy of obj
     '''
 
-    new_obj = deepcopy(obj)
+    if isinstance(obj, variables.Variables):
+        new_obj = obj.copy_on_write()
+    else:
+        new_obj = deepcopy(obj)
     new_obj.options = obj.options
 
     return new_obj
@@ -70,7 +126,9 @@ def get_all_rho_data(options):
 
     Data is loaded from CSVs stored in the rho folder of the runid, scan_num,
     and var_to_scan, which are supplied via the options parameter. A list of
-    rho values for the scan is created from the filenames of the CSVs.
+    rho values for the scan is created from the filenames of the CSVs.  When
+    the scan was saved to a scan store, values of each rho are instead views
+    of the store (see scanstore), and no rho files are read.
 
     Parameters:
     * options (Options): Object containing user options
@@ -82,27 +140,105 @@ def get_all_rho_data(options):
     '''
 
     input_vars_dict, output_vars_dict = {}, {}
-    rho_values = utils.get_rho_strings(options, SaveType.OUTPUT)
+    use_store = scanstore.has_store(options, SaveType.OUTPUT)
+    if use_store:
+        rho_values = scanstore.get_rho_strings(options, SaveType.OUTPUT)
+    else:
+        rho_values = utils.get_rho_strings(options, SaveType.OUTPUT)
 
     # Stores InputVariables and OutputVariables data objects for each rho_value
     for rho in rho_values:
         input_vars = variables.InputVariables(options)
         output_vars = variables.OutputVariables(options)
 
-        input_vars.load_from_csv(SaveType.INPUT, rho_value=rho)
-        input_vars.load_from_csv(SaveType.ADDITIONAL, rho_value=rho)
-        output_vars.load_from_csv(SaveType.OUTPUT, rho_value=rho)
+        for vars_obj, save_type in _get_saved_types(input_vars, output_vars):
+            if use_store:
+                vars_obj.load_from_store(save_type, rho_value=rho)
+            else:
+                vars_obj.load_from_csv(save_type, rho_value=rho)
 
         input_vars_dict[rho] = input_vars
         output_vars_dict[rho] = output_vars
 
     # Get control_file from rho folder (there's at most one control file, as controls are independent of rho values)
     input_controls = controls.InputControls(options)
-    input_controls.load_from_csv(use_rho=True)
+    if scanstore.has_store(options, SaveType.CONTROLS):
+        input_controls.load_from_store(use_rho=True)
+    else:
+        input_controls.load_from_csv(use_rho=True)
 
     return input_vars_dict, output_vars_dict, input_controls
 
 
+def get_scan_values(options, var_name):
+    '''
+    Gets the values of a single variable at every scan factor and rho value of a scan
+
+    This is used to plot large scans (such as in contour plots) without
+    creating InputVariables and OutputVariables objects for every rho value.
+    When the scan was saved to a scan store, values are a memory-mapped view of
+    the store (see scanstore), so only the values that are used are read from
+    disk.  Otherwise, the column of the variable is taken from each rho file
+    (see csvreader).
+
+    Parameters:
+    * options (Options): Object containing user options
+    * var_name (str): The name of the variable
+
+    Returns:
+    * rho_values (np.ndarray): The rho value of each column of values, in increasing order
+    * values (np.ndarray): Read-only values of the variable, with shape (factor, rho)
+
+    Raises:
+    * ValueError: If the variable was not saved in the scan
+    '''
+
+    # Output variables are checked first, since rmin is saved with every save type
+    for save_type in (SaveType.OUTPUT, SaveType.INPUT, SaveType.ADDITIONAL):
+        if scanstore.has_store(options, save_type):
+            if var_name in scanstore.get_var_names(options, save_type):
+                rho_values = np.array(scanstore.get_rho_strings(options, save_type), dtype=float)
+                return rho_values, scanstore.load_variable(options, save_type, var_name)
+        else:
+            scan_values = _load_rho_csv_values(options, save_type, var_name)
+            if scan_values is not None:
+                return scan_values
+
+    raise ValueError(f'{var_name} was not saved in scan {options.scan_num} of {options.runid}')
+
+
+def _load_rho_csv_values(options, save_type, var_name):
+    '''
+    Loads the values of a single variable from each rho file of save_type
+
+    Parameters:
+    * options (Options): Object containing user options
+    * save_type (SaveType): The save type of the rho files
+    * var_name (str): The name of the variable
+
+    Returns:
+    * (tuple[np.ndarray, np.ndarray] | None): rho values and values with shape (factor, rho), or None if the
+      variable is not in the rho files
+    '''
+
+    rho_files = utils.get_rho_files(options, save_type)
+    if not rho_files:
+        return None
+
+    var_names, __ = csvreader.read_csv(rho_files[0])
+    if var_name not in var_names:
+        return None
+
+    rho_strs = [file.split(f'rho{constants.RHO_VALUE_SEPARATOR}')[1].split('.csv')[0] for file in rho_files]
+    rho_idxs = np.argsort(np.array(rho_strs, dtype=float))
+    column_idx = var_names.index(var_name)
+
+    values = np.column_stack([csvreader.read_csv(rho_files[i])[1][:, column_idx] for i in rho_idxs])
+    values.flags.writeable = False
+
+    return np.array(rho_strs, dtype=float)[rho_idxs], values
+
+
 def get_data_objects(options, scan_factor=None, rho_value=None):
     '''
     Get InputVariables, OutputVariables, and InputControls data objects
@@ -122,9 +258,9 @@ def get_data_objects(options, scan_factor=None, rho_value=None):
     output_vars = variables.OutputVariables(options)
     input_controls = controls.InputControls(options)
 
-    input_vars.load_from_csv(SaveType.INPUT, scan_factor, rho_value)
-    input_vars.load_from_csv(SaveType.ADDITIONAL, scan_factor, rho_value)
-    output_vars.load_from_csv(SaveType.OUTPUT, scan_factor, rho_value)
+    # Factors and rho values of scans saved to a scan store are loaded from the store (see scanstore)
+    for vars_obj, save_type in _get_saved_types(input_vars, output_vars):
+        vars_obj.load_from_csv(save_type, scan_factor, rho_value)
 
     use_rho = True if rho_value is not None else False
     input_controls.load_from_csv(scan_factor=scan_factor, use_rho=use_rho)
@@ -132,16 +268,25 @@ def get_data_objects(options, scan_factor=None, rho_value=None):
     return input_vars, output_vars, input_controls
 
 
-def get_scan_type(var_to_scan):
+def _get_saved_types(input_vars, output_vars):
+    '''Returns (list[tuple]): each variables object paired with each save type of its saved data'''
+    return [(input_vars, SaveType.INPUT), (input_vars, SaveType.ADDITIONAL), (output_vars, SaveType.OUTPUT)]
+
+
+def get_scan_type(var_to_scan, threshold_var=None):
     '''
     Gets the scan type from the variable being scanned
 
+    Variable scans are threshold scans when a threshold variable is specified
+    (see the adaptive module).
+
     Parameters:
     * var_to_scan (str): The variable being scanned
-    * options (Options): Object containing user options
+    * threshold_var (str): The output variable of a threshold scan (optional)
 
     Raises:
     * TypeError: If var_to_scan is not a member of InputVariables or InputControls
+    * TypeError: If threshold_var is not a member of OutputVariables
     '''
 
     scan_type = ScanType.NONE
@@ -153,4 +298,10 @@ def get_scan_type(var_to_scan):
         else:
             raise TypeError(f'Variable {var_to_scan} is not defined under InputVariables or InputControls')
 
+    if threshold_var is not None:
+        if not hasattr(variables.OutputVariables(), threshold_var):
+            raise TypeError(f'Variable {threshold_var} is not defined under OutputVariables')
+        if scan_type is ScanType.VARIABLE:
+            scan_type = ScanType.THRESHOLD
+
     return scan_type
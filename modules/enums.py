@@ -27,6 +27,8 @@ class ScanType(Enum):
     VARIABLE = 1
     CONTROL = 2
     TIME = 3
+    THRESHOLD = 4
+    MULTIDIMENSIONAL = 5
 
 
 class ShotType(Enum):
@@ -0,0 +1,99 @@
+"""Interpolates many variables that share the same radial grid at once
+
+Cubic spline interpolation is linear in the values being interpolated, so
+interpolating from one grid onto another is equivalent to multiplying the
+values by a weight matrix that only depends on the two grids.  The weight
+matrix is found by interpolating the identity matrix using the same
+interp1d spline (cubic, with extrapolation) used elsewhere in this package,
+so results match interpolating each variable separately to within floating
+point error.  Weight matrices are cached for each pair of grids, and all
+variables on the same source grid are stacked into a single array so that
+they are interpolated using a single matrix multiplication.
+
+Example Usage:
+    te, ti = interpolation.interp_stacked(xb, [te_values, ti_values], xb_new)
+"""
+
+# Standard Packages
+import functools
+
+# 3rd Party Packages
+import numpy as np
+from scipy.interpolate import interp1d
+
+
+# Maximum number of cached weight matrices
+_MAX_CACHED_WEIGHTS = 32
+
+
+def get_weights(x, x_new):
+    '''
+    Gets the weights of a cubic spline interpolation from grid x onto grid x_new
+
+    Parameters:
+    * x (np.ndarray): The source grid (1-dimensional)
+    * x_new (np.ndarray): The target grid (1-dimensional)
+
+    Returns:
+    * (np.ndarray): Weight matrix of shape (x_new.size, x.size), which must not be modified
+    '''
+
+    x = np.ascontiguousarray(x, dtype=float)
+    x_new = np.ascontiguousarray(x_new, dtype=float)
+    return _get_cached_weights(x.tobytes(), x_new.tobytes())
+
+
+def interp(x, values, x_new):
+    '''
+    Interpolates values along their first axis from grid x onto grid x_new
+
+    Parameters:
+    * x (np.ndarray): The source grid (1-dimensional)
+    * values (np.ndarray): Values on the source grid, with shape (x.size, ...)
+    * x_new (np.ndarray): The target grid (1-dimensional)
+
+    Returns:
+    * (np.ndarray): Values on the target grid, with shape (x_new.size, ...)
+    '''
+
+    weights = get_weights(x, x_new)
+    return (weights @ values.reshape(values.shape[0], -1)).reshape((weights.shape[0],) + values.shape[1:])
+
+
+def interp_stacked(x, values_list, x_new):
+    '''
+    Interpolates many arrays of values from grid x onto grid x_new using a single matrix multiplication
+
+    Parameters:
+    * x (np.ndarray): The source grid (1-dimensional)
+    * values_list (list[np.ndarray]): Arrays of values on the source grid, each with shape (x.size, ...)
+    * x_new (np.ndarray): The target grid (1-dimensional)
+
+    Returns:
+    * (list[np.ndarray]): Arrays of values on the target grid, each with shape (x_new.size, ...)
+    '''
+
+    if not values_list:
+        return []
+
+    columns = [values.reshape(values.shape[0], -1) for values in values_list]
+    split_idxs = np.cumsum([column.shape[1] for column in columns])[:-1]
+    new_columns = np.split(get_weights(x, x_new) @ np.concatenate(columns, axis=1), split_idxs, axis=1)
+
+    return [
+        new_column.reshape((x_new.size,) + values.shape[1:])
+        for new_column, values in zip(new_columns, values_list)
+    ]
+
+
+@functools.lru_cache(maxsize=_MAX_CACHED_WEIGHTS)
+def _get_cached_weights(x_bytes, x_new_bytes):
+    '''Returns (np.ndarray): The weight matrix of the grids, which are given as bytes so they can be hashed'''
+    x = np.frombuffer(x_bytes)
+    x_new = np.frombuffer(x_new_bytes)
+
+    set_interp = interp1d(x, np.identity(x.size), kind='cubic', fill_value="extrapolate", axis=0)
+    weights = set_interp(x_new)
+    weights.flags.writeable = False  # Cached weights are shared by every caller
+
+    return weights
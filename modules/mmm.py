@@ -5,6 +5,19 @@ input file in MMM format.  Next, the MMM wrapper is ran using a terminal
 command, which produces an output CSV upon completion.  Afterwards, the
 output data is read into an OutputVariables object.
 
+Values can optionally be exchanged with the MMM wrapper using binary files
+instead of text files (see settings.MMM_BINARY_IO), which avoids formatting
+and parsing every value, and keeps the full precision of all values.
+
+Since MMM evaluates each radial point independently, the input variables of
+many runs can also be packed into a single input file using
+run_wrapper_packed, so that MMM is started once for all of the runs.
+
+MMM can also be ran asynchronously using run_wrapper_async, and many runs can
+be overlapped within a single process using run_wrapper_jobs, so that writing
+input files, running MMM, and reading output files no longer happen in
+lockstep.
+
 TODO:
 * This module can potentially be replaced by F2PY - Calling Fortran routines
   from Python, which would eliminate the overhead involved with reading and
@@ -15,23 +28,58 @@ TODO:
 
 # Standard Packages
 import os
+import copy
+import asyncio
 import subprocess
 
+# 3rd Party Packages
+import numpy as np
+
 # Local Packages
 import settings
-import modules.utils as utils
+import modules.runslot as runslot
+import modules.mmmworker as mmmworker
+import modules.resultcache as resultcache
 import modules.variables as variables
 import modules.constants as constants
 from modules.enums import SaveType
 
 
-def run_wrapper(input_vars, controls):
+# Input variables in the binary input file, in the order they are read by the MMM wrapper
+BINARY_INPUT_NAMES = [
+    'rmin', 'rmaj', 'elong', 'ne', 'nh', 'nz', 'nf', 'zeff', 'te', 'ti', 'q', 'btor', 'zimp', 'aimp', 'ahyd',
+    'aimass', 'wexbs', 'gne', 'gni', 'gnh', 'gnz', 'gte', 'gti', 'gq', 'gvtor', 'vtor', 'gvpol', 'vpol', 'gvpar',
+    'vpar',
+]
+
+# Output variables in the binary output file, in the order they are written by the MMM wrapper
+BINARY_OUTPUT_NAMES = [
+    'rmin', 'xti', 'xdi', 'xte', 'xdz', 'xvt', 'xvp', 'xtiW20', 'xdiW20', 'xteW20', 'xtiDBM', 'xdiDBM', 'xteDBM',
+    'xteETG', 'xteMTM', 'xteETGM', 'xdiETGM', 'gmaW20ii', 'omgW20ii', 'gmaW20ie', 'omgW20ie', 'gmaW20ei',
+    'omgW20ei', 'gmaW20ee', 'omgW20ee', 'gmaDBM', 'omgDBM', 'gmaMTM', 'omgMTM', 'gmaETGM', 'omgETGM', 'dbsqprf',
+]
+
+_BINARY_MAGIC = 1296911682
+_BINARY_VERSION = 1
+_BINARY_HEADER_DTYPE = np.dtype([('magic', '<i4'), ('version', '<i4'), ('npoints', '<i4'), ('nvars', '<i4')])
+_BINARY_VALUE_DTYPE = np.dtype('<f8')
+
+
+def run_wrapper(input_vars, controls, tmp_path=None, binary_io=None):
     '''
     Controls operation of the MMM wrapper
 
+    Each run of MMM is made in its own run slot directory within the temp
+    folder, unless a directory is specified, so that concurrent runs never
+    share input or output files.  When settings.USE_RESULT_CACHE is enabled,
+    the result of a previous run with identical inputs is returned instead of
+    running MMM again (see the resultcache module).  When a resident MMM
+    worker is active in the current process, the run is made by the worker
+    instead of starting MMM (see the mmmworker module).
+
     Steps:
-    * Write input file to the temp folder
-    * Run MMM wrapper, which produces output file in the temp folder
+    * Write input file to the run directory
+    * Run MMM wrapper, which produces output file in the run directory
     * Check that the output file exists and is not empty
     * Output file is read into OutputVariables object
     * Delete output file, to ensure that error checking is accurate on the next run
@@ -39,6 +87,8 @@ def run_wrapper(input_vars, controls):
     Parameters:
     * input_vars (InputVariables): contains all data needed to write MMM input file
     * controls (InputControls): contains all data needed to write control values in the input file
+    * tmp_path (str): directory to run MMM in, instead of a new run slot (optional)
+    * binary_io (bool): exchange data with MMM using binary files (optional; default is settings.MMM_BINARY_IO)
 
     Returns:
     * output_vars (OutputVariables): contains all data read in from the MMM output file
@@ -49,51 +99,457 @@ def run_wrapper(input_vars, controls):
     * ValueError: If MMM produces an empty output file
     '''
 
+    if binary_io is None:
+        binary_io = settings.MMM_BINARY_IO
+
+    cache_key = _get_cache_key(input_vars, controls, binary_io)
+    output_vars = resultcache.load_result(cache_key, input_vars.options) if cache_key else None
+
+    if output_vars is None and tmp_path is None and not binary_io:
+        output_vars = mmmworker.run_active(input_vars, controls)
+
+    if output_vars is None:
+        if tmp_path is None:
+            with runslot.RunSlot(input_vars.options.runid, input_vars.options.scan_num) as slot:
+                output_vars = _run_in_path(input_vars, controls, slot.path, binary_io)
+        else:
+            output_vars = _run_in_path(input_vars, controls, tmp_path, binary_io)
+
+        if cache_key:
+            resultcache.save_result(cache_key, output_vars)
+
+    return output_vars
+
+
+def run_wrapper_packed(input_vars_list, controls, tmp_path=None, binary_io=None):
+    '''
+    Runs MMM once for many sets of input variables
+
+    The radial points of every set of input variables are concatenated into
+    a single input file, and the output of MMM is then split back into one
+    OutputVariables object per set of input variables.  MMM uses the major
+    radius at the first point as the major radius of the magnetic axis, so
+    all sets of input variables must share this value (see
+    get_packing_key).
+
+    Parameters:
+    * input_vars_list (list[InputVariables]): sets of input variables to run, each at its own options.time_idx
+    * controls (InputControls): contains all data needed to write control values in the input file
+    * tmp_path (str): directory to run MMM in, instead of a new run slot (optional)
+    * binary_io (bool): exchange data with MMM using binary files (optional; default is settings.MMM_BINARY_IO)
+
+    Returns:
+    * (list[OutputVariables]): output variables of each set of input variables, in the same order
+
+    Raises:
+    * ValueError: If the sets of input variables cannot be packed together
+    '''
+
+    packed_vars = _pack_input_variables(input_vars_list)
+
+    # The number of input points is written to the input file from controls
+    packed_controls = copy.copy(controls)
+    packed_controls.input_points = copy.copy(controls.input_points)
+    packed_controls.input_points.values = packed_vars.options.input_points
+
+    packed_output_vars = run_wrapper(packed_vars, packed_controls, tmp_path, binary_io)
+
+    return _unpack_output_variables(packed_output_vars, input_vars_list)
+
+
+def get_packing_key(input_vars):
+    '''Returns (float): the value that must be shared by all input variables packed into one run of MMM'''
+    return float(input_vars.rmaj.values[0, input_vars.options.time_idx])
+
+
+async def run_wrapper_async(input_vars, controls, tmp_path=None, binary_io=None):
+    '''
+    Controls operation of the MMM wrapper without blocking the event loop
+
+    This is the asynchronous counterpart of run_wrapper.  Writing the input
+    file and reading the output file are done in the default executor of the
+    event loop, and MMM is ran using asyncio.create_subprocess_exec, so that
+    other runs can make progress while this run is waiting.  If the run is
+    cancelled while MMM is running, the MMM process is killed.
+
+    Parameters:
+    * input_vars (InputVariables): contains all data needed to write MMM input file
+    * controls (InputControls): contains all data needed to write control values in the input file
+    * tmp_path (str): directory to run MMM in, instead of a new run slot (optional)
+    * binary_io (bool): exchange data with MMM using binary files (optional; default is settings.MMM_BINARY_IO)
+
+    Returns:
+    * output_vars (OutputVariables): contains all data read in from the MMM output file
+
+    Raises:
+    * RuntimeError: If MMM has a runtime error
+    * FileNotFoundError: If MMM does not produce an output file
+    * ValueError: If MMM produces an empty output file
+    '''
+
+    if binary_io is None:
+        binary_io = settings.MMM_BINARY_IO
+
+    loop = asyncio.get_running_loop()
+    cache_key = _get_cache_key(input_vars, controls, binary_io)
+    output_vars = None
+    if cache_key:
+        output_vars = await loop.run_in_executor(None, resultcache.load_result, cache_key, input_vars.options)
+
+    if output_vars is None:
+        if tmp_path is None:
+            with runslot.RunSlot(input_vars.options.runid, input_vars.options.scan_num) as slot:
+                output_vars = await _run_in_path_async(input_vars, controls, slot.path, binary_io)
+        else:
+            output_vars = await _run_in_path_async(input_vars, controls, tmp_path, binary_io)
+
+        if cache_key:
+            await loop.run_in_executor(None, resultcache.save_result, cache_key, output_vars)
+
+    return output_vars
+
+
+async def run_wrapper_jobs(jobs, max_concurrent=None):
+    '''
+    Runs many MMM jobs concurrently, and yields results as they complete
+
+    Jobs are taken from the jobs iterable only as running jobs complete, so
+    at most max_concurrent jobs are in flight at once, and jobs produced by a
+    generator are not created faster than they can be ran.  Since results
+    are yielded in order of completion, each result is paired with the index
+    of its job in the jobs iterable.  Jobs that are still running are
+    cancelled if the generator is closed early or if any job raises an
+    exception.
+
+    Example Usage:
+        async for i, output_vars in mmm.run_wrapper_jobs(jobs, max_concurrent=8):
+            output_vars.save(scan_range[i])
+
+    Parameters:
+    * jobs (iterable): Pairs of (InputVariables, InputControls) objects to run
+    * max_concurrent (int): The maximum number of jobs to run at once (optional; default is the CPU count)
+
+    Yields:
+    * i (int): The index of the completed job in jobs
+    * output_vars (OutputVariables): contains all data read in from the MMM output file of the job
+    '''
+
+    async def run_job(i, input_vars, controls):
+        return i, await run_wrapper_async(input_vars, controls)
+
+    max_concurrent = max_concurrent or os.cpu_count() or 1
+    job_iter = enumerate(jobs)
+    pending = set()
+
+    try:
+        while True:
+            # Fill any open positions with new jobs
+            for i, (input_vars, controls) in job_iter:
+                pending.add(asyncio.ensure_future(run_job(i, input_vars, controls)))
+                if len(pending) >= max_concurrent:
+                    break
+
+            if not pending:
+                break
+
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+def get_driver_command():
+    '''
+    Gets the command used to run the MMM driver
+
+    settings.MMM_DRIVER_PATH is normally the path to the MMM executable, but
+    it may also be a list of command arguments (such as a Python interpreter
+    followed by the path to wrapper/mmm_stub.py).
+
+    Returns:
+    * (list[str]): The command used to run the MMM driver
+    '''
+
+    if isinstance(settings.MMM_DRIVER_PATH, str):
+        return [settings.MMM_DRIVER_PATH]
+    return list(settings.MMM_DRIVER_PATH)
+
+
+def get_input_str(input_vars, controls, binary_io=False):
+    '''
+    Gets the contents of the MMM input file
+
+    Only the header of the input file is needed when binary_io is enabled,
+    since values of input variables are then written to the binary input
+    file instead.
+
+    Parameters:
+    * input_vars (InputVariables): contains all data needed to write MMM input file
+    * controls (InputControls): contains all data needed to write control values in the input file
+    * binary_io (bool): only include the header of the input file (optional)
+
+    Returns:
+    * (str): The contents of the MMM input file
+    '''
+
+    if binary_io:
+        return f'{controls.get_mmm_header(binary_io=True)}/\n'
+
     time_idx = input_vars.options.time_idx
-    runid = input_vars.options.runid
-    scan_num = input_vars.options.scan_num
+    lines = [controls.get_mmm_header()]
+
+    # Loop through MMM variables and write input variable labels and values
+    var_names = input_vars.get_vars_of_type(SaveType.INPUT)
+    for var_name in var_names:
+        var = getattr(input_vars, var_name)
+        units_str = f' [{var.units}]' if var.units else ''
+        lines.append(f'! {var.name}{units_str}\n')
+        lines.append(f'{var_name} = \n')
 
-    tmp_path = utils.get_temp_path(runid, scan_num)
-    input_file = utils.get_temp_path(runid, scan_num, 'input')  # input has no file type
-    output_file = utils.get_temp_path(runid, scan_num, 'output.csv')
+        values = var.get_read_only_values()[:, time_idx]
+        for value in values:
+            lines.append(f'   {value:{constants.INPUT_VARIABLE_VALUE_FMT}}\n')
+        lines.append('\n')
 
-    # Create input file in temp directory
-    with open(input_file, 'w') as f:
-        f.write(controls.get_mmm_header())
+    lines.append('/\n')  # Needed for the MMM wrapper to know that the input file has ended
 
-        # Loop through MMM variables and write input variable labels and values
-        var_names = input_vars.get_vars_of_type(SaveType.INPUT)
-        for var_name in var_names:
-            var = getattr(input_vars, var_name)
-            units_str = f' [{var.units}]' if var.units else ''
-            f.write(f'! {var.name}{units_str}\n')
-            f.write(f'{var_name} = \n')
+    return ''.join(lines)
 
-            values = var.values[:, time_idx]
-            for value in values:
-                f.write(f'   {value:{constants.INPUT_VARIABLE_VALUE_FMT}}\n')
-            f.write('\n')
 
-        f.write('/\n')  # Needed for the MMM wrapper to know that the input file has ended
+def _pack_input_variables(input_vars_list):
+    '''
+    Concatenates the radial points of the input variables of many runs
+
+    Parameters:
+    * input_vars_list (list[InputVariables]): sets of input variables to pack, each at its own options.time_idx
+
+    Returns:
+    * packed_vars (InputVariables): input variables containing all radial points at time_idx = 0
+
+    Raises:
+    * ValueError: If the sets of input variables do not share the same packing key
+    '''
+
+    if len({get_packing_key(input_vars) for input_vars in input_vars_list}) > 1:
+        raise ValueError('Input variables packed into one run of MMM must have the same major radius at rho = 0')
+
+    # Shallow copies are used, since only the values of input variables are replaced
+    packed_vars = copy.copy(input_vars_list[0])
+    packed_vars.options = copy.copy(packed_vars.options)
+    packed_vars.options.time_idx = 0
+
+    for var_name in packed_vars.get_vars_of_type(SaveType.INPUT):
+        packed_var = copy.copy(getattr(packed_vars, var_name))
+        packed_var.values = np.concatenate([
+            getattr(input_vars, var_name).values[:, input_vars.options.time_idx]
+            for input_vars in input_vars_list
+        ])[:, np.newaxis]
+        setattr(packed_vars, var_name, packed_var)
+
+    packed_vars.options.input_points = packed_vars.rmin.values.shape[0]
+
+    return packed_vars
+
+
+def _unpack_output_variables(packed_output_vars, input_vars_list):
+    '''
+    Splits the output variables of a packed run of MMM into the output variables of each run
+
+    Parameters:
+    * packed_output_vars (OutputVariables): output variables of the packed run
+    * input_vars_list (list[InputVariables]): sets of input variables that were packed, in order
+
+    Returns:
+    * (list[OutputVariables]): output variables of each set of input variables
+    '''
+
+    npoints = [input_vars.rmin.values.shape[0] for input_vars in input_vars_list]
+    split_idxs = np.cumsum(npoints)[:-1]
+    output_vars_list = [variables.OutputVariables(input_vars.options) for input_vars in input_vars_list]
+
+    for var_name in packed_output_vars.get_nonzero_variables():
+        values = getattr(packed_output_vars, var_name).values
+        if var_name not in ['rho', 'rmina'] and isinstance(values, np.ndarray) and values.ndim > 0:
+            for output_vars, split_values in zip(output_vars_list, np.split(values, split_idxs)):
+                getattr(output_vars, var_name).values = split_values
+
+    for output_vars in output_vars_list:
+        output_vars.set_radius_values()
+
+    return output_vars_list
+
+
+def _get_cache_key(input_vars, controls, binary_io):
+    '''Returns (str | None): the result cache key of the run, or None if the result cache is not used'''
+    if not settings.USE_RESULT_CACHE:
+        return None
+    return resultcache.get_key(input_vars, controls, get_driver_command(), binary_io)
+
+
+def _run_in_path(input_vars, controls, tmp_path, binary_io):
+    '''
+    Runs MMM within a directory
+
+    Parameters:
+    * input_vars (InputVariables): contains all data needed to write MMM input file
+    * controls (InputControls): contains all data needed to write control values in the input file
+    * tmp_path (str): directory to run MMM in
+    * binary_io (bool): exchange data with MMM using binary files
+
+    Returns:
+    * output_vars (OutputVariables): contains all data read in from the MMM output file
+    '''
+
+    output_file = _get_output_file(tmp_path, binary_io)
+    _write_input_files(input_vars, controls, tmp_path, binary_io)
 
     # Issue terminal command to run MMM
-    result = subprocess.run(settings.MMM_DRIVER_PATH, cwd=tmp_path,
+    result = subprocess.run(get_driver_command(), cwd=tmp_path,
                             stdout=subprocess.PIPE, stderr=subprocess.PIPE,
                             universal_newlines=True)
 
+    _check_result(result.stdout, result.stderr, output_file)
+
+    return _read_output_file(input_vars, output_file, binary_io)
+
+
+async def _run_in_path_async(input_vars, controls, tmp_path, binary_io):
+    '''
+    Runs MMM within a directory without blocking the event loop
+
+    Parameters:
+    * input_vars (InputVariables): contains all data needed to write MMM input file
+    * controls (InputControls): contains all data needed to write control values in the input file
+    * tmp_path (str): directory to run MMM in
+    * binary_io (bool): exchange data with MMM using binary files
+
+    Returns:
+    * output_vars (OutputVariables): contains all data read in from the MMM output file
+    '''
+
+    output_file = _get_output_file(tmp_path, binary_io)
+
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, _write_input_files, input_vars, controls, tmp_path, binary_io)
+
+    # Start MMM as a subprocess of the event loop
+    process = await asyncio.create_subprocess_exec(*get_driver_command(), cwd=tmp_path,
+                                                   stdout=asyncio.subprocess.PIPE,
+                                                   stderr=asyncio.subprocess.PIPE)
+    try:
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        process.kill()
+        await process.wait()
+        raise
+
+    _check_result(stdout.decode(), stderr.decode(), output_file)
+
+    return await loop.run_in_executor(None, _read_output_file, input_vars, output_file, binary_io)
+
+
+def _get_output_file(tmp_path, binary_io):
+    '''Returns (str): the path of the MMM output file'''
+    return f'{tmp_path}\\{"output.bin" if binary_io else "output.csv"}'
+
+
+def _write_input_files(input_vars, controls, tmp_path, binary_io):
+    '''
+    Writes the MMM input file, as well as the binary input file when binary_io is enabled
+
+    The binary input file starts with a header of four little-endian 32-bit
+    integers (magic number, format version, number of points, number of
+    variables), followed by the values of each variable in BINARY_INPUT_NAMES
+    as a contiguous array of little-endian 64-bit floats.
+
+    Parameters:
+    * input_vars (InputVariables): contains all data needed to write MMM input file
+    * controls (InputControls): contains all data needed to write control values in the input file
+    * tmp_path (str): directory to write the input files to
+    * binary_io (bool): write values of input variables to the binary input file
+    '''
+
+    with open(f'{tmp_path}\\input', 'w') as f:  # input has no file type
+        f.write(get_input_str(input_vars, controls, binary_io))
+
+    if binary_io:
+        time_idx = input_vars.options.time_idx
+        values = np.array([getattr(input_vars, var_name).values[:, time_idx] for var_name in BINARY_INPUT_NAMES],
+                          dtype=_BINARY_VALUE_DTYPE)
+        header = np.array([(_BINARY_MAGIC, _BINARY_VERSION, values.shape[1], values.shape[0])],
+                          dtype=_BINARY_HEADER_DTYPE)
+
+        with open(f'{tmp_path}\\input.bin', 'wb') as f:
+            header.tofile(f)
+            values.tofile(f)
+
+
+def _check_result(stdout, stderr, output_file):
+    '''
+    Checks the response of MMM and the output file it produced
+
+    Parameters:
+    * stdout (str): the standard output of MMM
+    * stderr (str): the standard error of MMM
+    * output_file (str): path of the output file
+
+    Raises:
+    * RuntimeError: If MMM has a runtime error
+    * FileNotFoundError: If MMM does not produce an output file
+    * ValueError: If MMM produces an empty output file
+    '''
+
     if settings.PRINT_MMM_RESPONSE:
-        print(result.stdout)  # Only prints after MMM finishes running
+        print(stdout)  # Only prints after MMM finishes running
 
-    # Error checks
-    if result.stderr:
-        raise RuntimeError(result.stderr)
+    if stderr:
+        raise RuntimeError(stderr)
     if not os.path.exists(output_file):
         raise FileNotFoundError('MMM did not produce an output file')
     if not os.stat(output_file).st_size:
         raise ValueError('MMM produced an empty output file')
 
+
+def _read_output_file(input_vars, output_file, binary_io=False):
+    '''
+    Reads the MMM output file into an OutputVariables object, and then deletes the output file
+
+    Parameters:
+    * input_vars (InputVariables): contains the options used by the output variables
+    * output_file (str): path of the output file
+    * binary_io (bool): the output file is a binary output file (optional)
+
+    Returns:
+    * output_vars (OutputVariables): contains all data read in from the MMM output file
+
+    Raises:
+    * ValueError: If the binary output file is not in the expected format
+    '''
+
     output_vars = variables.OutputVariables(input_vars.options)
-    output_vars.load_from_file_path(output_file)
+
+    if binary_io:
+        with open(output_file, 'rb') as f:
+            header = np.fromfile(f, dtype=_BINARY_HEADER_DTYPE, count=1)[0]
+            npoints, nvars = int(header['npoints']), int(header['nvars'])
+            values = np.fromfile(f, dtype=_BINARY_VALUE_DTYPE, count=npoints * nvars)
+
+        if header['magic'] != _BINARY_MAGIC or header['version'] != _BINARY_VERSION:
+            raise ValueError(f'{output_file} is not a supported MMM binary file')
+        if nvars != len(BINARY_OUTPUT_NAMES) or values.size != npoints * nvars:
+            raise ValueError(f'{output_file} does not contain the expected number of values')
+
+        for var_name, var_values in zip(BINARY_OUTPUT_NAMES, values.reshape(nvars, npoints)):
+            if hasattr(output_vars, var_name):
+                getattr(output_vars, var_name).values = var_values
+        output_vars.set_radius_values()
+    else:
+        output_vars.load_from_file_path(output_file, use_cache=False)  # The output file is only read once
+
     os.remove(output_file)  # ensure accurate error checks on next run
 
     return output_vars
@@ -0,0 +1,410 @@
+"""Runs many MMM cases using resident MMM wrapper processes
+
+Starting the MMM wrapper, and writing and reading its input and output files,
+can take longer than MMM itself when the number of input points is small.
+When the wrapper is started with the argument 'persistent', it instead stays
+resident and reads one case after another from stdin, writing the results of
+each case to stdout.  Each case is written in exactly the same format as the
+MMM input file, and each result is written in the same format as the MMM
+output CSV, between the lines '#begin_output' and '#end_output'.  An error
+in a case is reported by a block that starts with an '#error' line.  The
+line '#end_output' is also written to stderr at the end of each case, and
+anything else written to stderr during a case raises a RuntimeError, as it
+does when the wrapper is started for a single run (see mmm._check_result).
+stderr is read by a separate thread, so that the wrapper is never blocked
+writing to a full stderr pipe while its stdout is being read.
+
+An MMMWorker manages a single resident wrapper process, which is started on
+first use and restarted if it exits.  An MMMWorkerPool manages several
+workers, so that cases can be ran concurrently from multiple threads.  Each
+worker runs within its own run slot directory, since MMM may write
+diagnostic files to its working directory.
+
+When settings.MMM_PERSISTENT_WORKERS is enabled, each process that runs
+scan factors starts one worker (see the scanner module), and mmm.run_wrapper
+runs its cases using that worker instead of starting the wrapper for every
+run.  Only one worker is active in each process.  A wrapper that exits
+before completing its first case is assumed not to support persistent mode,
+so cases are then ran by starting the wrapper for every run, as they are
+when no worker is active.  A case that makes a worker exit after that is ran
+again by starting the wrapper, which raises the error of the case.
+
+The stub driver wrapper/mmm_stub.py speaks the same protocol as the MMM
+wrapper, and can be used for testing when MMM is not available.
+
+Example Usage:
+    with MMMWorkerPool(options, num_workers=8) as pool:
+        for output_vars in pool.run_many(jobs):
+            output_vars.save()
+
+    # Run every case of the current process using a single worker
+    mmmworker.start(options)
+    try:
+        output_vars = mmm.run_wrapper(input_vars, controls)
+    finally:
+        mmmworker.stop()
+"""
+
+# Standard Packages
+import sys; sys.path.insert(0, '../')
+import io
+import os
+import queue
+import logging
+import threading
+import subprocess
+import concurrent.futures
+
+# Local Packages
+import settings
+import modules.mmm as mmm
+import modules.runslot as runslot
+import modules.variables as variables
+
+
+_log = logging.getLogger(__name__)
+
+_BEGIN_OUTPUT = '#begin_output'
+_END_OUTPUT = '#end_output'
+_ERROR = '#error'
+
+# The active worker of the current process, or None when the wrapper is started for every run
+_active_worker = None
+
+
+class MMMWorker:
+    '''
+    A resident MMM wrapper process that runs many cases over a single pipe
+
+    Members:
+    * command (list[str]): the command used to start the wrapper process
+    * completed_runs (int): the number of cases completed by the worker
+    * is_supported (bool): False once the wrapper exits before completing its first case
+    * options (Options): the options of the scan the worker belongs to
+    * process (subprocess.Popen): the wrapper process, or None if the worker is not started
+    * slot (RunSlot): the run slot the wrapper process runs in
+    '''
+
+    def __init__(self, options, command=None):
+        self.command = command if command is not None else mmm.get_driver_command() + ['persistent']
+        self.completed_runs = 0
+        self.is_supported = True
+        self.options = options
+        self.process = None
+        self.slot = runslot.RunSlot(options.runid, options.scan_num)
+        self._stderr_lines = None
+        self._stderr_thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def is_running(self):
+        '''Returns (bool): True if the wrapper process is running'''
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        '''
+        Starts the wrapper process, if it is not already running
+
+        Returns:
+        * self (MMMWorker)
+        '''
+
+        if self.is_running():
+            return self
+
+        self.stop()  # Clean up after a process that has exited
+        self.slot.acquire()
+        self.process = subprocess.Popen(self.command, cwd=self.slot.path,
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE, universal_newlines=True)
+        self._stderr_lines = queue.Queue()
+        self._stderr_thread = threading.Thread(target=_read_lines, args=(self.process.stderr, self._stderr_lines),
+                                               daemon=True)
+        self._stderr_thread.start()
+
+        return self
+
+    def stop(self):
+        '''Closes stdin of the wrapper process, waits for it to exit, and releases its run slot'''
+
+        if self.process is not None:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass  # The process has already exited
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            self._stderr_thread.join()
+            self.process.stdout.close()
+            self.process.stderr.close()
+            self.process = None
+
+        self.slot.release()
+
+    def run(self, input_vars, controls):
+        '''
+        Runs a single case in the wrapper process
+
+        Parameters:
+        * input_vars (InputVariables): contains all data needed to write the MMM input
+        * controls (InputControls): contains all data needed to write control values in the input
+
+        Returns:
+        * output_vars (OutputVariables): contains all data read in from the MMM output
+
+        Raises:
+        * RuntimeError: If the wrapper reports an error, writes to stderr, or exits before completing the case
+        '''
+
+        self.start()
+
+        try:
+            self.process.stdin.write(mmm.get_input_str(input_vars, controls))
+            self.process.stdin.flush()
+        except OSError:
+            pass  # The process has exited; the response is read below to get the reason
+
+        output_lines = self._read_response()
+
+        output_vars = variables.OutputVariables(input_vars.options)
+        output_vars.load_from_file_path(io.StringIO(''.join(output_lines)), use_cache=False)
+        self.completed_runs += 1
+
+        return output_vars
+
+    def try_run(self, input_vars, controls):
+        '''
+        Runs a single case in the wrapper process, unless the wrapper process exits during the case
+
+        A wrapper that exits before completing its first case is assumed not
+        to support persistent mode, so is_supported is set to False and the
+        worker does not run any more cases.
+
+        Parameters:
+        * input_vars (InputVariables): contains all data needed to write the MMM input
+        * controls (InputControls): contains all data needed to write control values in the input
+
+        Returns:
+        * output_vars (OutputVariables | None): the output of the case, or None if the case was not completed
+
+        Raises:
+        * RuntimeError: If the wrapper reports an error for the case
+        '''
+
+        if not self.is_supported:
+            return None
+
+        try:
+            return self.run(input_vars, controls)
+        except RuntimeError:
+            if self.is_running():
+                raise  # The wrapper reported an error for the case
+            if not self.completed_runs:
+                self.is_supported = False
+                _log.warning(f'\n\tMMM wrapper does not support persistent mode; starting MMM for every run\n')
+
+        return None
+
+    def _read_response(self):
+        '''
+        Reads the response of the wrapper process to a single case
+
+        Lines written before the output block (such as messages from MMM) are
+        printed when settings.PRINT_MMM_RESPONSE is enabled.  Lines written to
+        stderr during the case are read once the output block has been read.
+
+        Returns:
+        * output_lines (list[str]): lines of the output block, in the format of the MMM output CSV
+
+        Raises:
+        * RuntimeError: If the wrapper reports an error, writes to stderr, or exits before completing the case
+        '''
+
+        response_lines, output_lines = [], []
+        stdout = self.process.stdout
+
+        line = stdout.readline()
+        while line and not line.startswith((_BEGIN_OUTPUT, _ERROR)):
+            response_lines.append(line)
+            line = stdout.readline()
+
+        if settings.PRINT_MMM_RESPONSE and response_lines:
+            print(''.join(response_lines))
+
+        if not line:
+            stderr = self._read_stderr()
+            self.stop()
+            raise RuntimeError(f'MMM worker exited before completing the case\n{"".join(response_lines)}{stderr}')
+
+        error_line = line if line.startswith(_ERROR) else None
+
+        line = stdout.readline()
+        while line and not line.startswith(_END_OUTPUT):
+            output_lines.append(line)
+            line = stdout.readline()
+
+        stderr = self._read_stderr()
+
+        if error_line:
+            raise RuntimeError(f'MMM worker error: {error_line[len(_ERROR):].strip()}')
+        if not line:
+            self.stop()
+            raise RuntimeError(f'MMM worker exited before completing the output\n{stderr}')
+        if stderr:
+            raise RuntimeError(stderr)
+        if not output_lines:
+            raise ValueError('MMM worker produced an empty output')
+
+        return output_lines
+
+    def _read_stderr(self):
+        '''
+        Reads the lines written to stderr by the wrapper process during a single case
+
+        Returns:
+        * (str): lines written to stderr up to the end of the case, or until the process exits
+        '''
+
+        stderr_lines = []
+        line = self._stderr_lines.get()
+        while line is not None and not line.startswith(_END_OUTPUT):
+            stderr_lines.append(line)
+            line = self._stderr_lines.get()
+
+        return ''.join(stderr_lines)
+
+
+class MMMWorkerPool:
+    '''
+    A pool of resident MMM wrapper processes
+
+    Each case is ran by a worker that is not busy with another case, so the
+    pool can be used from multiple threads at once.
+
+    Members:
+    * num_workers (int): the number of workers in the pool
+    * workers (list[MMMWorker]): all workers of the pool
+    '''
+
+    def __init__(self, options, num_workers=None, command=None):
+        self.num_workers = num_workers or settings.SCAN_WORKERS or os.cpu_count() or 1
+        self.workers = [MMMWorker(options, command) for __ in range(self.num_workers)]
+        self._idle_workers = queue.Queue()
+        for worker in self.workers:
+            self._idle_workers.put(worker)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        '''Stops all workers of the pool'''
+        for worker in self.workers:
+            worker.stop()
+
+    def run(self, input_vars, controls):
+        '''
+        Runs a single case using the next idle worker
+
+        Parameters:
+        * input_vars (InputVariables): contains all data needed to write the MMM input
+        * controls (InputControls): contains all data needed to write control values in the input
+
+        Returns:
+        * output_vars (OutputVariables): contains all data read in from the MMM output
+
+        Raises:
+        * RuntimeError: If MMM has a runtime error
+        '''
+
+        worker = self._idle_workers.get()
+        try:
+            output_vars = worker.try_run(input_vars, controls)
+        finally:
+            self._idle_workers.put(worker)
+
+        if output_vars is None:
+            output_vars = mmm.run_wrapper(input_vars, controls, binary_io=False)
+
+        return output_vars
+
+    def run_many(self, jobs):
+        '''
+        Runs many cases using all workers of the pool
+
+        Parameters:
+        * jobs (iterable): Pairs of (InputVariables, InputControls) objects to run
+
+        Returns:
+        * (iterator[OutputVariables]): Output variables of each job, in the same order as jobs
+        '''
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.num_workers)
+        with executor:
+            yield from executor.map(lambda job: self.run(*job), jobs)
+
+
+def _read_lines(stream, lines):
+    '''
+    Puts each line read from stream into a queue, followed by None once the stream is closed
+
+    Parameters:
+    * stream (io.TextIOBase): the stream to read
+    * lines (queue.Queue): the queue to put lines into
+    '''
+
+    for line in stream:
+        lines.put(line)
+    lines.put(None)
+
+
+def start(options):
+    '''
+    Starts the active worker of the current process, if settings.MMM_PERSISTENT_WORKERS is enabled
+
+    The wrapper process of the worker is started by the first case it runs.
+
+    Parameters:
+    * options (Options): Object containing user options of the scan
+    '''
+
+    global _active_worker
+    if _active_worker is None and settings.MMM_PERSISTENT_WORKERS:
+        _active_worker = MMMWorker(options)
+
+
+def stop():
+    '''Stops the active worker of the current process (if one is active)'''
+    global _active_worker
+    worker, _active_worker = _active_worker, None
+    if worker is not None:
+        worker.stop()
+
+
+def run_active(input_vars, controls):
+    '''
+    Runs a single case using the active worker of the current process
+
+    Parameters:
+    * input_vars (InputVariables): contains all data needed to write the MMM input
+    * controls (InputControls): contains all data needed to write control values in the input
+
+    Returns:
+    * output_vars (OutputVariables | None): the output of the case, or None if the case was not ran by a worker
+
+    Raises:
+    * RuntimeError: If the wrapper reports an error for the case
+    '''
+
+    if _active_worker is None:
+        return None
+    return _active_worker.try_run(input_vars, controls)
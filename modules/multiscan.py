@@ -0,0 +1,299 @@
+"""Executes multidimensional scans of several variables and controls at once
+
+A multidimensional scan adjusts several input variables and controls at once
+(such as gte x gne, or etgm_kyrhos_min x betaeunit), where options.scan_axes
+maps the adjustment name of each scanned variable or control to its scan
+factors.  Each point of the scan has one scan factor per axis, and points are
+chosen using one of two sampling methods:
+* Grid: Every combination of the scan factors of each axis is ran (the
+  Cartesian product of the axes), which is used when options.scan_samples is
+  None.
+* Latin hypercube: options.scan_samples points are ran, where the range of
+  each axis is divided into scan_samples strata of equal width (in terms of
+  the index of its scan factors, so nonuniform scan factors keep their
+  spacing) and each stratum of each axis is sampled exactly once.  The number
+  of points then does not grow with the number of axes.
+
+Variables of each point are adjusted one axis at a time, in the order of
+scan_axes, using the same adjustments as variable scans (see the adjustments
+module), and controls are adjusted in the same way as control scans.  Points
+are independent, so they are executed in parallel by the scanner module.
+
+Every point is saved to a single store per save type, which is created and
+opened by the scanstore module in the same way as the scan stores of
+variable scans (see scanstore.create_store_file).  The values of a store
+have shape (*axes, rho, variable) for grid sampling, where each axis has the
+length of the scan factors of its scanned variable or control, and shape
+(sample, rho, variable) for Latin hypercube sampling.  The scan factors of
+each axis (or of each sample) are stored in a JSON sidecar file next to the
+values.  Points that have not been saved yet still have nan values.
+
+Example Usage:
+    # Run a scan of every combination of gte and gne factors
+    options.scan_axes = {'gte': np.arange(0.5, 3 + 1e-6, 0.1), 'gne': np.arange(0.5, 3 + 1e-6, 0.1)}
+    multiscan.execute_scan(mmm_vars, controls)
+
+    # Load values of gmaETGM, with shape (gte, gne, rho), and the factors of each axis
+    values = multiscan.load_variable(options, SaveType.OUTPUT, 'gmaETGM')
+    axes = multiscan.get_axes(options)
+"""
+
+# Standard Packages
+import sys; sys.path.insert(0, '../')
+import os
+import copy
+import logging
+
+# 3rd Party Packages
+import numpy as np
+
+# Local Packages
+import modules.mmm as mmm
+import modules.utils as utils
+import modules.scanner as scanner
+import modules.scanstore as scanstore
+import modules.variables as variables
+import modules.constants as constants
+import modules.adjustments as adjustments
+import modules.calculations as calculations
+from modules.enums import SaveType, ScanType
+
+
+_log = logging.getLogger(__name__)
+
+# Seed of the random number generator used for Latin hypercube sampling, so that samples are reproducible
+_SAMPLING_SEED = 0
+
+
+def execute_scan(mmm_vars, controls):
+    '''
+    Executes each point of a multidimensional scan, using a pool of worker processes when available
+
+    Parameters:
+    * mmm_vars (InputVariables): Contains all base variables needed to write the MMM input file
+    * controls (InputControls): Specifies input control values in the MMM input file
+    '''
+
+    options = mmm_vars.options
+    points = get_scan_points(options)
+    create_stores(mmm_vars, controls, points)
+
+    scanner.run_factors(mmm_vars, controls, run_point, list(enumerate(points)))
+
+
+def get_scan_points(options):
+    '''
+    Gets the scan factors of each point of a multidimensional scan
+
+    Parameters:
+    * options (Options): Object containing user options
+
+    Returns:
+    * (np.ndarray): Scan factors of each point, with shape (point, axis), in the order that points are stored
+    '''
+
+    axes = list(options.scan_axes.values())
+    if options.scan_samples is None:
+        grids = np.meshgrid(*axes, indexing='ij')
+        return np.stack([grid.ravel() for grid in grids], axis=1)
+
+    # Latin hypercube: one sample per stratum of each axis, with strata paired randomly between axes
+    rng = np.random.default_rng(_SAMPLING_SEED)
+    num_samples = options.scan_samples
+    points = np.empty((num_samples, len(axes)))
+    for i, factors in enumerate(axes):
+        positions = (rng.permutation(num_samples) + rng.random(num_samples)) / num_samples
+        points[:, i] = np.interp(positions * (factors.size - 1), np.arange(factors.size), factors)
+
+    return points
+
+
+def run_point(mmm_vars, controls, point):
+    '''
+    Runs MMM for a single point of a multidimensional scan, and saves it to the stores of the scan
+
+    Parameters:
+    * mmm_vars (InputVariables): Contains all base variables needed to write the MMM input file
+    * controls (InputControls): Specifies base input control values in the MMM input file
+    * point (tuple[int, np.ndarray]): The index of the point, and its scan factor of each axis
+
+    Returns:
+    * (list): Empty, since the point is saved to the stores of the scan instead of to rho files
+    '''
+
+    options = mmm_vars.options
+    point_idx, point_factors = point
+
+    adjusted_vars, adjusted_controls = mmm_vars, controls
+    for (adjustment_name, scan_range), scan_factor in zip(options.scan_axes.items(), point_factors):
+        axis_options = copy.copy(options)
+        axis_options.set(scan_axes=None, adjustment_name=adjustment_name, scan_range=scan_range)
+        if axis_options.scan_type is ScanType.CONTROL:
+            adjusted_controls = scanner.adjust_control(adjusted_controls, axis_options.var_to_scan, scan_factor,
+                                                       scan_range)
+        else:
+            axis_vars = copy.copy(adjusted_vars)
+            axis_vars.options = axis_options
+            adjusted_vars = adjustments.adjust_scanned_variable(axis_vars, scan_factor)
+            adjusted_vars.options = options
+
+    output_vars = mmm.run_wrapper(adjusted_vars, adjusted_controls)
+    calculations.calculate_output_variables(adjusted_vars, output_vars, adjusted_controls)
+
+    for save_type in [SaveType.INPUT, SaveType.ADDITIONAL]:
+        save_point(options, save_type, point_idx, *adjusted_vars.get_data_of_type(save_type))
+    save_point(options, SaveType.OUTPUT, point_idx, *output_vars.get_data_of_type(SaveType.OUTPUT))
+    if has_store(options, SaveType.CONTROLS):
+        save_point(options, SaveType.CONTROLS, point_idx, *adjusted_controls.get_data_as_array())
+
+    return []
+
+
+def create_stores(mmm_vars, controls, points):
+    '''
+    Creates the stores that every point of a multidimensional scan is saved to, with all values set to nan
+
+    Controls are only stored when a control is scanned, since they are
+    otherwise the same for every point.
+
+    Parameters:
+    * mmm_vars (InputVariables): Contains all base variables needed to write the MMM input file
+    * controls (InputControls): Specifies input control values in the MMM input file
+    * points (np.ndarray): Scan factors of each point, with shape (point, axis) (see get_scan_points)
+    '''
+
+    options = mmm_vars.options
+    output_vars = variables.OutputVariables(options)
+    stores = [(mmm_vars, SaveType.INPUT), (mmm_vars, SaveType.ADDITIONAL), (output_vars, SaveType.OUTPUT)]
+    for vars_obj, save_type in stores:
+        var_names = vars_obj.get_vars_to_save(save_type)
+        units = [getattr(vars_obj, var_name).units for var_name in var_names]
+        _create_store(options, save_type, points, var_names, units, options.input_points)
+
+    if any(hasattr(controls, adjustment_name) for adjustment_name in options.scan_axes):
+        var_names = controls.get_keys()
+        _create_store(options, SaveType.CONTROLS, points, var_names, [''] * len(var_names), 1)
+
+
+def has_store(options, save_type):
+    '''Returns (bool): True if the multidimensional scan of options has a store of save_type'''
+    return bool(options.scan_axes) and os.path.exists(f'{_get_store_path(options, save_type)}.json')
+
+
+def save_point(options, save_type, point_idx, data, var_names):
+    '''
+    Saves the values of a single point of a multidimensional scan to its store
+
+    The store stays open for writing until scanstore.close_stores is called
+    (see scanstore.save_factor).
+
+    Parameters:
+    * options (Options): Object containing user options
+    * save_type (SaveType): The save type of the values
+    * point_idx (int): The index of the point (see get_scan_points)
+    * data (np.ndarray): Values of each variable, with shape (rho, variable)
+    * var_names (list[str] | str): Names of each variable in data (or a comma separated string of names)
+
+    Raises:
+    * ValueError: If the variables of data do not match the store
+    '''
+
+    if isinstance(var_names, str):
+        var_names = var_names.split(',')
+
+    store_path = _get_store_path(options, save_type)
+    metadata, values = scanstore.open_store_file(store_path, writable=True)
+    if list(var_names) != metadata['var_names']:
+        raise ValueError(f'Variables of {save_type.name} data do not match the variables of the scan store')
+
+    values[np.unravel_index(point_idx, metadata['shape'])] = data
+
+    _log.info(f'\n\tSaved: {store_path}.npy, point {point_idx}\n')
+
+
+def load_variable(options, save_type, var_name):
+    '''
+    Loads the values of a single variable at every point and rho value of a multidimensional scan
+
+    Values of points that have not been saved are nan.
+
+    Parameters:
+    * options (Options): Object containing user options
+    * save_type (SaveType): The save type of the values
+    * var_name (str): The name of the variable to load
+
+    Returns:
+    * (np.ndarray): Read-only values of the variable, with shape (*axes, rho) for grid sampling,
+      or (sample, rho) for Latin hypercube sampling
+
+    Raises:
+    * ValueError: If the variable is not a variable of the store
+    '''
+
+    metadata, values = scanstore.open_store_file(_get_store_path(options, save_type))
+    if var_name not in metadata['var_names']:
+        raise ValueError(f'{var_name} is not a variable of the {save_type.name} scan store')
+
+    return values[..., metadata['var_names'].index(var_name)]
+
+
+def get_axes(options, save_type=SaveType.OUTPUT):
+    '''
+    Gets the scan factors of each axis of the stores of a multidimensional scan
+
+    Parameters:
+    * options (Options): Object containing user options
+    * save_type (SaveType): The save type of the store (optional)
+
+    Returns:
+    * (dict[str, np.ndarray]): Maps the adjustment name of each axis to its scan factors for grid sampling,
+      or to its scan factor of each sample for Latin hypercube sampling
+    '''
+
+    metadata, __ = scanstore.open_store_file(_get_store_path(options, save_type))
+    return {name: np.array(factors) for name, factors in metadata['axes'].items()}
+
+
+def get_rho_values(options, save_type=SaveType.OUTPUT):
+    '''Returns (np.ndarray): the rho value of each radial point of the store of save_type'''
+    metadata, __ = scanstore.open_store_file(_get_store_path(options, save_type))
+    rho_strs = [f'{rho:{constants.RHO_VALUE_FMT}}' for rho in np.linspace(0, 1, metadata['num_points'])]
+    return np.array(rho_strs, dtype=float)
+
+
+def _create_store(options, save_type, points, var_names, units, num_points):
+    '''
+    Creates the store of a save type of a multidimensional scan, with the values of every point set to nan
+
+    Parameters:
+    * options (Options): Object containing user options
+    * save_type (SaveType): The save type of the store
+    * points (np.ndarray): Scan factors of each point, with shape (point, axis)
+    * var_names (list[str]): Names of the variables of the store, in the order they are saved
+    * units (list[str]): Units of each variable
+    * num_points (int): The number of radial points of each point of the scan
+    '''
+
+    store_path = _get_store_path(options, save_type)
+    if options.scan_samples is None:
+        shape = [factors.size for factors in options.scan_axes.values()]
+        axes = {name: factors.tolist() for name, factors in options.scan_axes.items()}
+    else:
+        shape = [points.shape[0]]
+        axes = {name: points[:, i].tolist() for i, name in enumerate(options.scan_axes)}
+
+    metadata = {
+        'save_type': save_type.name,
+        'sampling': 'grid' if options.scan_samples is None else 'latin hypercube',
+        'axes': axes,
+        'shape': shape,
+        'num_points': num_points,
+        'var_names': list(var_names),
+        'units': list(units),
+    }
+    scanstore.create_store_file(store_path, (*shape, num_points, len(var_names)), metadata)
+
+
+def _get_store_path(options, save_type):
+    '''Returns (str): the path of the store of save_type, without a file extension'''
+    return utils.get_multiscan_store_path(options.runid, options.scan_num, list(options.scan_axes), save_type)
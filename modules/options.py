@@ -61,6 +61,15 @@ _adjustment_name_to_var_dict = {
 }
 
 
+def _replace_small_factors(scan_range):
+    '''Replaces (np.ndarray): scan factors too close to zero with ABSMIN_SCAN_FACTOR_VALUE (in place)'''
+    too_small = np.absolute(scan_range) < constants.ABSMIN_SCAN_FACTOR_VALUE
+    if too_small.any():
+        value_signs = np.sign(scan_range[too_small])
+        value_signs[value_signs == 0] = 1  # np.sign(0) = 0, so set these to +1
+        scan_range[too_small] = constants.ABSMIN_SCAN_FACTOR_VALUE * value_signs
+
+
 class Options:
     '''
     Stores options for MMM Controller
@@ -73,16 +82,27 @@ class Options:
     * input_time (float): the time to check the CDF for values
     * input_time_range (np.ndarray[float]): the input range of time values to use in a time scan
     * normalize_time_range (bool): treat input time range as a range of normalized time values
+    * refine_max_factors (int): the maximum number of factors ran by refined scans (None to allow every factor)
+    * refine_tolerance (float): the largest change of refine_vars between adjacent factors, relative to their range
+    * refine_vars (list[str]): variables that refined scans add factors for (scan_range is then the finest grid)
     * runid (str): the Runid in the CDF, usually also the name of the CDF
     * scan_factor_str (str): the string of the scan factor, rounded for better visual presentation
     * scan_num (int): the number identifying where data is stored within the ./output/runid/ directory
+    * scan_axes (dict[str, np.ndarray[float]]): scan factors of each variable or control of multidimensional scans
     * scan_range_idxs (list[int]): indices corresponding to scan range values (used for time scans)
     * scan_range (np.ndarray[float]): the range of factors to multiply the var_to_scan by
+    * scan_samples (int): the number of Latin hypercube samples of multidimensional scans (None for every
+      combination of scan factors)
+    * scan_store (bool): save scan factors to a single binary store per save type instead of CSVs (see scanstore)
     * scan_type (ScanType): the type of the scan
     * shot_type (ShotType): the shot type of the CDF
+    * single_time_slice (bool): only extract and calculate variables at the measurement time (ignored for time scans)
     * temperature_profiles (bool): replace temperature variables with experimental profiles
+    * threshold_tolerance (float): the width of the scan factor bracket each threshold is found within
+    * threshold_value (float): the value of threshold_var that is found in threshold scans
+    * threshold_var (str): the output variable of threshold scans (variable scans are threshold scans when set)
     * time_str (str): the string of the measurement time, rounded for better visual presentation
-    * time_idx (int): the index of the CDF time value that is closest to input_time
+    * time_idx (int): the index of the CDF time value that is closest to input_time (0 when using single_time_slice)
     * use_gnezero (bool): set gne equal to zero (sets gne to a small number to avoid division by 0)
     * use_gtezero (bool): set gte equal to zero (sets gte to a small number to avoid division by 0)
     * use_gneabs (bool): take absolute value of gne
@@ -97,7 +117,9 @@ class Options:
         self._adjustment_name = None
         self._input_points = None
         self._runid = None
+        self._scan_axes = None
         self._scan_range = None
+        self._threshold_var = None
         self._time_str = None
         self._var_to_scan = None
         # Public members
@@ -106,11 +128,19 @@ class Options:
         self.input_time = None
         self.input_time_range = None
         self.normalize_time_range = False
+        self.refine_max_factors = None
+        self.refine_tolerance = 0.05
+        self.refine_vars = None
         self.scan_num = None
         self.scan_range_idxs = None
+        self.scan_samples = None
+        self.scan_store = False
         self.scan_type = ScanType.NONE
         self.shot_type = ShotType.NONE
+        self.single_time_slice = False
         self.temperature_profiles = False
+        self.threshold_tolerance = 0.1
+        self.threshold_value = 0
         # self.time_str = None
         self.time_idx = None
         self.use_gnezero = False
@@ -155,6 +185,25 @@ class Options:
             runid = str(runid)
         self._runid = runid.strip()
 
+    @property
+    def scan_axes(self):
+        return self._scan_axes
+
+    @scan_axes.setter
+    def scan_axes(self, scan_axes):
+        if scan_axes:
+            for adjustment_name, scan_range in scan_axes.items():
+                var_name = _adjustment_name_to_var_dict.get(adjustment_name, adjustment_name)
+                if datahelper.get_scan_type(var_name) not in [ScanType.VARIABLE, ScanType.CONTROL]:
+                    raise TypeError(f'{adjustment_name} cannot be scanned in a multidimensional scan')
+                if not isinstance(scan_range, np.ndarray):
+                    raise TypeError(f'Factors of {adjustment_name} must be {np.ndarray} and not {type(scan_range)}')
+                _replace_small_factors(scan_range)
+            self._scan_axes = dict(scan_axes)
+        else:
+            self._scan_axes = None
+        self.scan_type = self._get_scan_type()
+
     @property
     def scan_range(self):
         return self._scan_range
@@ -164,13 +213,18 @@ class Options:
         if scan_range is not None:
             if not isinstance(scan_range, np.ndarray):
                 raise TypeError(f'scan_range must be {np.ndarray} or {None} and not {type(scan_range)}')
-            too_small = np.absolute(scan_range) < constants.ABSMIN_SCAN_FACTOR_VALUE
-            if too_small.any():
-                value_signs = np.sign(scan_range[too_small])
-                value_signs[value_signs == 0] = 1  # np.sign(0) = 0, so set these to +1
-                scan_range[too_small] = constants.ABSMIN_SCAN_FACTOR_VALUE * value_signs
+            _replace_small_factors(scan_range)
         self._scan_range = scan_range
 
+    @property
+    def threshold_var(self):
+        return self._threshold_var
+
+    @threshold_var.setter
+    def threshold_var(self, threshold_var):
+        self._threshold_var = threshold_var
+        self.scan_type = self._get_scan_type()
+
     @property
     def time_str(self):
         return self._time_str
@@ -189,9 +243,15 @@ class Options:
     @var_to_scan.setter
     def var_to_scan(self, var_to_scan):
         self._var_to_scan = var_to_scan
-        self.scan_type = datahelper.get_scan_type(var_to_scan)
+        self.scan_type = self._get_scan_type()
 
     # Methods
+    def _get_scan_type(self):
+        '''Returns (ScanType): the scan type of the scanned variable, or of the scan axes when they are set'''
+        if self.scan_axes:
+            return ScanType.MULTIDIMENSIONAL
+        return datahelper.get_scan_type(self.var_to_scan, self.threshold_var)
+
     def get_keys(self):
         '''Returns (list): Names of properties and public members'''
         kvps = self.get_key_value_pairs()
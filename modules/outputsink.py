@@ -0,0 +1,185 @@
+"""Writes output files of a scan in a background thread
+
+Saving the variables of each scan factor formats every value as text, and
+MMM is idle while the files of a factor are written.  When an OutputSink is
+active, files are instead written by a background thread, so that formatting
+and writing the files of one factor overlaps with running MMM.
+
+Writes are held in a bounded queue of up to settings.OUTPUT_QUEUE_SIZE
+writes, so a scan that produces files faster than they can be written waits
+for the writer thread (back-pressure) instead of holding every pending file
+in memory.  Writes are done in the order they are submitted.  The data of
+each write must not be changed after it is submitted, which is always the
+case for the arrays created when saving variables.
+
+Only one OutputSink is active in each process, and an OutputSink that was
+inherited from a parent process (by forking) is never active, since its
+writer thread only runs in the parent.  Calling flush waits for all
+submitted writes to complete, and raises the first exception raised by any
+write.  When no OutputSink is active (or OUTPUT_QUEUE_SIZE is 0), files are
+written immediately.
+
+Example Usage:
+    outputsink.start()
+    try:
+        outputsink.write(np.savetxt, file_path, data, delimiter=',')  # Returns before the file is written
+    finally:
+        outputsink.stop()  # Waits for all files to be written
+"""
+
+# Standard Packages
+import sys; sys.path.insert(0, '../')
+import os
+import queue
+import logging
+import threading
+
+# Local Packages
+import settings
+
+
+_log = logging.getLogger(__name__)
+
+# The active OutputSink of the current process, or None when files are written immediately
+_active_sink = None
+
+
+class OutputSink:
+    '''
+    Writes files in a background thread, in the order writes are submitted
+
+    Members:
+    * max_pending (int): The maximum number of writes waiting to be done before write blocks
+    * pid (int): The ID of the process the writer thread runs in
+    '''
+
+    def __init__(self, max_pending):
+        self.max_pending = max_pending
+        self.pid = os.getpid()
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._errors = []
+        self._thread = threading.Thread(target=self._run, name='OutputSink', daemon=True)
+        self._thread.start()
+
+    def write(self, write_func, *args, **kwargs):
+        '''
+        Submits a write to the writer thread, waiting while max_pending writes are queued
+
+        Parameters:
+        * write_func (function): The function that writes the file
+        * args, kwargs: Arguments of write_func
+
+        Raises:
+        * Exception: The first exception raised by a previous write
+        '''
+
+        self._raise_errors()
+        self._queue.put((write_func, args, kwargs))
+
+    def flush(self):
+        '''
+        Waits for all submitted writes to complete
+
+        Raises:
+        * Exception: The first exception raised by a write
+        '''
+
+        self._queue.join()
+        self._raise_errors()
+
+    def close(self):
+        '''
+        Waits for all submitted writes to complete, and then stops the writer thread
+
+        Raises:
+        * Exception: The first exception raised by a write
+        '''
+
+        self._queue.put(None)
+        self._thread.join()
+        self._raise_errors()
+
+    def _run(self):
+        '''Does each submitted write until the sink is closed'''
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                write_func, args, kwargs = item
+                write_func(*args, **kwargs)
+            except Exception as e:
+                self._errors.append(e)
+            finally:
+                self._queue.task_done()
+
+    def _raise_errors(self):
+        '''Raises the first exception raised by a write, which is then cleared'''
+        if self._errors:
+            errors, self._errors = self._errors, []
+            if len(errors) > 1:
+                _log.error(f'\n\t{len(errors) - 1} additional file writes failed\n')
+            raise errors[0]
+
+
+def start():
+    '''Starts an OutputSink in the current process, unless one is active or settings.OUTPUT_QUEUE_SIZE is 0'''
+    global _active_sink
+    if _get_active_sink() is None and settings.OUTPUT_QUEUE_SIZE:
+        _active_sink = OutputSink(settings.OUTPUT_QUEUE_SIZE)
+
+
+def stop():
+    '''Waits for all writes of the active OutputSink to complete, and then stops it (if one is active)'''
+    global _active_sink
+    sink, _active_sink = _get_active_sink(), None
+    if sink is not None:
+        sink.close()
+
+
+def flush():
+    '''Waits for all writes of the active OutputSink to complete (if one is active)'''
+    sink = _get_active_sink()
+    if sink is not None:
+        sink.flush()
+
+
+def write(write_func, *args, **kwargs):
+    '''
+    Writes a file using the active OutputSink, or immediately when no OutputSink is active
+
+    Parameters:
+    * write_func (function): The function that writes the file
+    * args, kwargs: Arguments of write_func
+    '''
+
+    sink = _get_active_sink()
+    if sink is not None:
+        sink.write(write_func, *args, **kwargs)
+    else:
+        write_func(*args, **kwargs)
+
+
+def write_text(file_path, text):
+    '''
+    Writes text to a file using the active OutputSink, or immediately when no OutputSink is active
+
+    Parameters:
+    * file_path (str): The path of the file
+    * text (str): The text to write
+    '''
+
+    write(_write_text, file_path, text)
+
+
+def _get_active_sink():
+    '''Returns (OutputSink | None): the active OutputSink, unless it belongs to a parent process'''
+    if _active_sink is not None and _active_sink.pid == os.getpid():
+        return _active_sink
+    return None
+
+
+def _write_text(file_path, text):
+    '''Writes (str): text to the file at file_path'''
+    with open(file_path, 'w') as f:
+        f.write(text)
@@ -1,17 +1,30 @@
 """Reshapes data stored in factor files into data stored in rho files
 
-At the end of a variable scan after all factor CSV files are saved, reshaper
-can be called to load in all data stored in each factor file, and then
-reshape and save the data in new rho files.  In each factor file, variables
-are dependent on the radial dimension rmin.  Reshaper redefines the
-dependence of each variable instead to the scanned variable, and saves rho
-values for each value of rho (from rmin) found in the factor files.
+In each factor file, variables are dependent on the radial dimension rmin.
+Reshaper redefines the dependence of each variable instead to the scanned
+variable, and saves rho values for each value of rho (from rmin) found in the
+factor files.
+
+During a scan, a StreamingReshaper receives the data of each factor as soon
+as the factor completes, and writes it into preallocated rho-major arrays.
+Rows of completed factors are appended to rho files periodically while the
+scan runs, so that partial results of long scans can be plotted, and the rho
+files are complete as soon as the scan ends.  The create_rho_files function
+instead reshapes all factor files of a scan after the scan has completed,
+which is only needed to recreate rho files of a scan.
 
 See the docstring on _reshape_data for an example of how this work.
+
+Example Usage:
+    rho_reshaper = reshaper.StreamingReshaper(options)
+    rho_reshaper.add_factor(scan_factor, saved_data)  # For each completed factor
+    rho_reshaper.flush()  # Writes rho files of all completed factors
 """
 
 # Standard Packages
 import sys; sys.path.insert(0, '../')
+import os
+import time
 import logging
 
 # 3rd Party Packages
@@ -20,11 +33,17 @@ import numpy as np
 # Local Packages
 import modules.utils as utils
 import modules.constants as constants
+import modules.scanstore as scanstore
+import modules.csvreader as csvreader
+import modules.outputsink as outputsink
 from modules.enums import SaveType
 
 
 _log = logging.getLogger(__name__)
 
+# Minimum number of seconds between writes of rho files during a scan
+_FLUSH_INTERVAL = 10
+
 
 def _read_from_files(file_list, dtype):
     '''
@@ -75,19 +94,10 @@ def _reshape_data(data_array, var_names):
     * reshaped_data (list): List of arrays; each array is a different rho value
     '''
 
-    num_radial_points = data_array.shape[1]
-    num_scan_factors = data_array.shape[0]
     num_variables = len(var_names)
-    reshaped_data = []
-
-    for r in range(num_radial_points):
-        data_at_r = np.empty((num_scan_factors, num_variables))
-        for f in range(num_scan_factors):
-            data_at_r[f, :] = data_array[f, r]
-
-        reshaped_data.append(data_at_r)
+    factor_data = np.asarray(data_array, dtype=float).reshape(len(data_array), -1, num_variables)
 
-    return reshaped_data
+    return list(factor_data.transpose(1, 0, 2))
 
 
 def _save_reshaped_csv(reshaped_data, var_names, save_dir, save_type):
@@ -111,7 +121,7 @@ def _save_reshaped_csv(reshaped_data, var_names, save_dir, save_type):
     for rho, data in zip(rho_values, reshaped_data):
         rho_value = f'{rho:{constants.RHO_VALUE_FMT}}'
         file_name = f'{base_file_name}{rho_value}.csv'
-        np.savetxt(file_name, data, fmt='%.4e', delimiter=',', header=header_str)
+        _save_csv(file_name, data, header_str)
 
 
 def _save_simple_csv(data, var_names, save_dir, save_type):
@@ -127,7 +137,26 @@ def _save_simple_csv(data, var_names, save_dir, save_type):
 
     file_name = f'{save_dir}\\{save_type}.csv'
     header_str = ','.join(var_names)
-    np.savetxt(file_name, data, fmt='%.4e', delimiter=',', header=header_str)
+    _save_csv(file_name, data, header_str)
+
+
+def _save_csv(file_name, data, header_str):
+    '''
+    Saves data to a CSV, replacing any existing CSV only once the new CSV is complete
+
+    Rho files are rewritten while a scan runs, so they are first written to a
+    temporary file and then renamed, and are never read partially written.
+
+    Parameters:
+    * file_name (str): The name and path of the CSV
+    * data (np.ndarray): The data to save
+    * header_str (str): The header to be saved to the CSV
+    '''
+
+    tmp_file_name = f'{file_name}.{os.getpid()}.tmp'
+    with open(tmp_file_name, 'w') as f:
+        np.savetxt(f, data, fmt='%.4e', delimiter=',', header=header_str)
+    os.replace(tmp_file_name, file_name)
 
 
 def create_rho_files(options):
@@ -158,8 +187,10 @@ def create_rho_files(options):
         non_negative_factors = [file for file in saved_files if file not in negative_factors]
         # Sort negative factors in reverse order (e.g., -6, -5, -4, etc.), then join with non negative factors
         saved_files = negative_factors[::-1] + non_negative_factors
-        saved_data = _read_from_files(saved_files, float)
-        var_names = np.genfromtxt(saved_files[0], delimiter=',', names=True).dtype.names
+        # Factor files are only read once, so their values are not cached
+        saved_csvs = [csvreader.read_csv(file, use_cache=False) for file in saved_files]
+        saved_data = np.array([values for __, values in saved_csvs])
+        var_names = saved_csvs[0][0]
         reshaped_data = _reshape_data(saved_data, var_names)
         _save_reshaped_csv(reshaped_data, var_names, save_dir, save_type.name.capitalize())
 
@@ -179,6 +210,137 @@ def create_rho_files(options):
     _log.info(f'\n\tSaved: {save_dir}')
 
 
+class StreamingReshaper:
+    '''
+    Reshapes the data of each factor of a scan into rho data as each factor completes
+
+    The data of each save type is stored in a preallocated array of shape
+    (rho, factor, variable), so the data of each rho value is a contiguous
+    slice of the array.  Rows of rho files are ordered the same as the
+    factors of options.scan_range, and rho files only contain factors that
+    have been added.
+
+    Rho files are written by the OutputSink of the current process (see the
+    outputsink module), and only the rows of newly added factors are written
+    to them, which are appended to the rows already written.  When
+    add_factor writes rho files (at most once every flush_interval seconds),
+    only factors that directly follow the written rows in scan order are
+    written, so factors that complete out of order are appended once every
+    factor before them has completed.  Calling flush writes every added
+    factor, and rho files are only rewritten when a factor was added before
+    rows that are already written (such as in refined scans).
+
+    Members:
+    * options (Options): Object containing user options
+    * flush_interval (float): Minimum number of seconds between writes of rho files made by add_factor
+    '''
+
+    def __init__(self, options, flush_interval=_FLUSH_INTERVAL):
+        self.options = options
+        self.flush_interval = flush_interval
+        self._factors = np.asarray(options.scan_range, dtype=float)
+        self._is_added = np.zeros(self._factors.size, dtype=bool)
+        self._is_written = np.zeros(self._factors.size, dtype=bool)
+        self._buffers = {}  # Maps each SaveType to its header and rho-major data
+        self._flush_time = time.monotonic()
+
+    def add_factor(self, scan_factor, saved_data):
+        '''
+        Adds the data of a completed factor of the scan
+
+        Parameters:
+        * scan_factor (float | str): The scan factor of the data
+        * saved_data (dict): Maps each SaveType to its saved data (np.ndarray with shape (rho, variable))
+          and header (str), as returned by the save methods of Variables and InputControls
+        '''
+
+        factor_idx = scanstore.get_factor_idx(self._factors, scan_factor)
+        for save_type, (data, header) in saved_data.items():
+            if save_type not in self._buffers:
+                buffer = np.full((data.shape[0], self._factors.size, data.shape[1]), np.nan)
+                self._buffers[save_type] = (header, buffer)
+            self._buffers[save_type][1][:, factor_idx, :] = data
+
+        self._is_added[factor_idx] = True
+
+        if time.monotonic() - self._flush_time >= self.flush_interval:
+            # Factors that directly follow the written rows
+            first_idx = np.flatnonzero(self._is_written)[-1] + 1 if self._is_written.any() else 0
+            num_completed = np.argmin(np.append(self._is_added[first_idx:], False))
+            self._write_factors(np.arange(first_idx, first_idx + num_completed))
+
+    def flush(self):
+        '''Writes rows of every added factor to rho files, if any were added since rho files were last written'''
+        self._write_factors(np.flatnonzero(self._is_added & ~self._is_written))
+
+    def _write_factors(self, factor_idxs):
+        '''
+        Writes rows of factors to rho files, appending them when they follow the rows already written
+
+        Parameters:
+        * factor_idxs (np.ndarray): Indices of the factors to write, in increasing order
+        '''
+
+        self._flush_time = time.monotonic()
+        if not factor_idxs.size:
+            return
+
+        written_idxs = np.flatnonzero(self._is_written)
+        is_appended = written_idxs.size > 0 and factor_idxs[0] > written_idxs[-1]
+        if written_idxs.size and not is_appended:
+            factor_idxs = np.flatnonzero(self._is_added)  # Rows are inserted, so every row is rewritten
+        self._is_written[factor_idxs] = True
+
+        save_dir = utils.get_rho_path(self.options.runid, self.options.scan_num, self.options.var_to_scan)
+        for save_type, (header, buffer) in self._buffers.items():
+            file_name = save_type.name.capitalize()
+            if save_type is SaveType.CONTROLS:
+                _save_rows(buffer[:1, factor_idxs], header, save_dir, file_name, is_appended, has_rho=False)
+            else:
+                _save_rows(buffer[:, factor_idxs], header, save_dir, file_name, is_appended)
+
+        _log.info(f'\n\tSaved: {save_dir} ({factor_idxs.size} factors{" appended" if is_appended else ""})')
+
+
+def _save_rows(data, header_str, save_dir, save_type, is_appended, has_rho=True):
+    '''
+    Saves rows of rho files using the OutputSink of the current process (see the outputsink module)
+
+    Parameters:
+    * data (np.ndarray): Rows of each rho file, with shape (rho, factor, variable)
+    * header_str (str): The header of the rho files
+    * save_dir (str): The path where the rho files are saved
+    * save_type (str): The name of the data type to be saved
+    * is_appended (bool): Append rows to existing rho files, instead of replacing them
+    * has_rho (bool): Save data[0] to a single CSV without a rho value (optional)
+    '''
+
+    if has_rho:
+        rho_values = [f'{rho:{constants.RHO_VALUE_FMT}}' for rho in np.linspace(0, 1, data.shape[0])]
+        file_names = [f'{save_dir}\\{save_type} rho{constants.RHO_VALUE_SEPARATOR}{rho}.csv' for rho in rho_values]
+    else:
+        file_names = [f'{save_dir}\\{save_type}.csv']
+
+    for file_name, rows in zip(file_names, data):
+        if is_appended:
+            outputsink.write(_append_csv, file_name, rows)
+        else:
+            outputsink.write(_save_csv, file_name, rows, header_str)
+
+
+def _append_csv(file_name, data):
+    '''
+    Appends rows of data to a CSV
+
+    Parameters:
+    * file_name (str): The name and path of the CSV
+    * data (np.ndarray): The rows to append
+    '''
+
+    with open(file_name, 'a') as f:
+        np.savetxt(f, data, fmt='%.4e', delimiter=',')
+
+
 '''
 For testing purposes
 '''
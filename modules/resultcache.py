@@ -0,0 +1,257 @@
+"""Caches the results of MMM runs on disk, keyed by the content of each run
+
+The same CDF, time, options, and controls are often ran through MMM many
+times (such as when adjusting plots), and MMM always produces the same output
+for the same input.  Each run is identified by a SHA-256 hash of everything
+that MMM receives: the header of the input file (which contains all input
+controls), the values of every input variable, the exchange format used, and
+the identity of the MMM driver (the path, size, and modification time of each
+file in the driver command).  Rebuilding the MMM driver therefore produces new
+cache keys, and old results are no longer used.  A driver that is rebuilt in
+place with the same size and modification time still returns old results,
+so the cache is only used when settings.USE_RESULT_CACHE is enabled.
+
+Results are stored as .npz files in the cache folder, with one file per run.
+The modification time of a cached result is updated each time it is used, so
+that the least recently used results are removed first when the total size
+of the cache exceeds settings.RESULT_CACHE_MAX_MB.  Results are written to a
+temporary file and then renamed, so concurrent runs in other threads or
+processes never read a partially written result.
+
+Statistics of cache hits and misses are kept separately within each process.
+
+Example Usage:
+    cache_key = resultcache.get_key(input_vars, controls, mmm.get_driver_command(), binary_io)
+    output_vars = resultcache.load_result(cache_key, input_vars.options)
+    if output_vars is None:
+        output_vars = run_mmm(input_vars, controls)
+        resultcache.save_result(cache_key, output_vars)
+"""
+
+# Standard Packages
+import sys; sys.path.insert(0, '../')
+import os
+import hashlib
+import logging
+import threading
+
+# 3rd Party Packages
+import numpy as np
+
+# Local Packages
+import settings
+import modules.utils as utils
+import modules.variables as variables
+from modules.enums import SaveType
+
+
+_log = logging.getLogger(__name__)
+
+# Increase when the contents of cached results change, so that old results are not used
+_CACHE_VERSION = 1
+_FILE_EXT = '.npz'
+
+# Variables that are calculated from rmin when a result is loaded
+_RADIUS_VARS = ('rho', 'rmina')
+
+_stats = {'hits': 0, 'misses': 0, 'saves': 0, 'evictions': 0}
+_stats_lock = threading.Lock()
+
+
+def get_key(input_vars, controls, driver_command, binary_io=False):
+    '''
+    Gets the cache key of a single run of MMM
+
+    Parameters:
+    * input_vars (InputVariables): contains all data needed to write MMM input file
+    * controls (InputControls): contains all data needed to write control values in the input file
+    * driver_command (list[str]): the command used to run the MMM driver
+    * binary_io (bool): values are exchanged with MMM using binary files (optional)
+
+    Returns:
+    * (str): The hexadecimal SHA-256 hash identifying the run
+    '''
+
+    time_idx = input_vars.options.time_idx
+    key_hash = hashlib.sha256()
+    key_hash.update(f'{_CACHE_VERSION}\n{int(bool(binary_io))}\n'.encode())
+    key_hash.update(_get_driver_identity(driver_command).encode())
+    key_hash.update(controls.get_mmm_header().encode())
+
+    for var_name in input_vars.get_vars_of_type(SaveType.INPUT):
+        values = np.ascontiguousarray(getattr(input_vars, var_name).values[:, time_idx], dtype='<f8')
+        key_hash.update(f'{var_name}:{values.size}\n'.encode())
+        key_hash.update(values.tobytes())
+
+    return key_hash.hexdigest()
+
+
+def load_result(cache_key, options):
+    '''
+    Loads a cached result of MMM, and marks the result as recently used
+
+    Parameters:
+    * cache_key (str): The cache key of the run (see get_key)
+    * options (Options): The options of the output variables
+
+    Returns:
+    * output_vars (OutputVariables | None): The cached output variables, or None if the run is not cached
+    '''
+
+    file_path = _get_file_path(cache_key)
+
+    try:
+        with np.load(file_path) as data:
+            values = {var_name: data[var_name] for var_name in data.files}
+        os.utime(file_path)
+    except (OSError, ValueError):
+        # The result is not cached, or was removed or corrupted by another process
+        _add_stat('misses')
+        return None
+
+    output_vars = variables.OutputVariables(options)
+    for var_name, var_values in values.items():
+        if hasattr(output_vars, var_name):
+            getattr(output_vars, var_name).values = var_values
+    output_vars.set_radius_values()
+
+    _add_stat('hits')
+    _log.info(f'\n\tLoaded cached MMM result: {file_path}\n')
+
+    return output_vars
+
+
+def save_result(cache_key, output_vars):
+    '''
+    Saves a result of MMM to the cache, and then evicts old results if the cache is too large
+
+    Parameters:
+    * cache_key (str): The cache key of the run (see get_key)
+    * output_vars (OutputVariables): The output variables produced by MMM
+    '''
+
+    os.makedirs(utils.get_result_cache_path(), exist_ok=True)  # Safe when called concurrently
+
+    values = {
+        var_name: getattr(output_vars, var_name).values
+        for var_name in output_vars.get_nonzero_variables() if var_name not in _RADIUS_VARS
+    }
+
+    file_path = _get_file_path(cache_key)
+    tmp_file_path = f'{file_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_file_path, 'wb') as f:
+        np.savez(f, **values)
+    os.replace(tmp_file_path, file_path)
+
+    _add_stat('saves')
+    evict_results()
+
+
+def evict_results(max_size=None):
+    '''
+    Removes the least recently used results until the cache is within its size limit
+
+    Parameters:
+    * max_size (float): The maximum size of the cache in MB (optional; default is settings.RESULT_CACHE_MAX_MB)
+
+    Returns:
+    * (int): The number of results removed
+    '''
+
+    max_bytes = (max_size if max_size is not None else settings.RESULT_CACHE_MAX_MB) * 1024**2
+    entries = []
+    for entry in _get_cache_entries():
+        try:
+            entry_stat = entry.stat()
+        except FileNotFoundError:
+            continue  # Removed by another process
+        entries.append((entry_stat.st_mtime, entry_stat.st_size, entry.path))
+
+    total_bytes = sum(size for __, size, __ in entries)
+
+    num_removed = 0
+    for __, size, file_path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass  # Already removed by another process
+        total_bytes -= size
+        num_removed += 1
+
+    if num_removed:
+        _add_stat('evictions', num_removed)
+        _log.info(f'\n\tEvicted {num_removed} cached MMM results\n')
+
+    return num_removed
+
+
+def clear_cache():
+    '''Removes all cached results'''
+    utils.remove_directory(utils.get_result_cache_path())
+
+
+def get_cache_size():
+    '''Returns (tuple[int, int]): The number of cached results, and their total size in bytes'''
+    sizes = [entry.stat().st_size for entry in _get_cache_entries()]
+    return len(sizes), sum(sizes)
+
+
+def get_stats():
+    '''Returns (dict): Counts of cache hits, misses, saves, and evictions in the current process'''
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    '''Sets all cache statistics of the current process to zero'''
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
+
+
+def _add_stat(name, count=1):
+    '''Adds (int): count to the named cache statistic'''
+    with _stats_lock:
+        _stats[name] += count
+
+
+def _get_file_path(cache_key):
+    '''Returns (str): the path of the cached result for the cache key'''
+    return f'{utils.get_result_cache_path()}\\{cache_key}{_FILE_EXT}'
+
+
+def _get_cache_entries():
+    '''Returns (list[os.DirEntry]): all cached results'''
+    try:
+        with os.scandir(utils.get_result_cache_path()) as scan:
+            return [entry for entry in scan if entry.name.endswith(_FILE_EXT)]
+    except FileNotFoundError:
+        return []
+
+
+def _get_driver_identity(driver_command):
+    '''
+    Gets a string that identifies the MMM driver
+
+    Each argument of the driver command that is an existing file is identified
+    by its path, size, and modification time, so that a rebuilt driver is
+    never mistaken for the driver that produced a cached result.
+
+    Parameters:
+    * driver_command (list[str]): the command used to run the MMM driver
+
+    Returns:
+    * (str): The identity of the MMM driver
+    '''
+
+    identity = []
+    for arg in driver_command:
+        if os.path.isfile(arg):
+            file_stat = os.stat(arg)
+            identity.append(f'{os.path.abspath(arg)}:{file_stat.st_size}:{file_stat.st_mtime_ns}')
+        else:
+            identity.append(arg)
+
+    return '\n'.join(identity) + '\n'
@@ -0,0 +1,280 @@
+"""Allocates isolated working directories for runs of the MMM driver
+
+The MMM driver always reads a file named input and writes a file named
+output.csv within its working directory, so two runs of the driver that
+share a working directory will overwrite each other's files.  A RunSlot is a
+working directory within the temp folder of a scan that belongs to exactly
+one run of the MMM driver while the slot is held.
+
+Slots are claimed by atomically creating a lock file inside the slot
+directory, which works the same way for threads, worker processes, and
+separate invocations of the controller that use the same scan folder.  The
+lock file contains the process ID of the run that holds the slot, so the lock
+of a process that exited without releasing its slot (such as after a crash)
+is reclaimed by the next run that finds it.  When a slot is released, its
+files are cleared and the lock file is removed, so the slot directory can be
+reused by the next run.
+
+Slot directories of a scan can be removed entirely using clear_run_slots,
+which claims the lock of each slot before removing it.  A run of another
+controller can therefore never hold a slot that is being removed, and a slot
+directory that is removed while a run is claiming it is created again.
+
+Example Usage:
+    with RunSlot(options.runid, options.scan_num) as slot:
+        output_vars = mmm.run_wrapper(input_vars, controls, slot.path)
+"""
+
+# Standard Packages
+import sys; sys.path.insert(0, '../')
+import os
+import glob
+import logging
+
+# Local Packages
+import modules.utils as utils
+
+
+_log = logging.getLogger(__name__)
+
+_LOCK_FILE_NAME = 'slot.lock'
+_MAX_SLOTS = 10000
+
+# Number of times a slot is claimed again after its directory was removed by clear_run_slots
+_MAX_CLAIM_ATTEMPTS = 5
+
+# Exit code of a Windows process that is still running
+_STILL_ACTIVE = 259
+
+
+class RunSlot:
+    '''
+    A working directory for a single in-flight run of the MMM driver
+
+    Members:
+    * path (str): the path to the slot directory, or None if the slot is not held
+    * runid (str): the runid of the scan the slot belongs to
+    * scan_num (int): the scan number the slot belongs to
+    * slot_num (int): the number of the slot directory, or None if the slot is not held
+    '''
+
+    def __init__(self, runid, scan_num):
+        self.path = None
+        self.runid = runid
+        self.scan_num = scan_num
+        self.slot_num = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def acquire(self):
+        '''
+        Claims the first slot directory that is not held by another run
+
+        Returns:
+        * self (RunSlot)
+
+        Raises:
+        * RuntimeError: If the slot is already held
+        * ValueError: If every slot directory is held
+        '''
+
+        if self.path is not None:
+            raise RuntimeError(f'Run slot {self.slot_num} is already held')
+
+        for slot_num in range(1, _MAX_SLOTS):
+            slot_path = utils.get_run_slot_path(self.runid, self.scan_num, slot_num)
+            if not _claim_slot(slot_path):
+                continue  # Slot is held by another run
+
+            self.path = slot_path
+            self.slot_num = slot_num
+            return self
+
+        raise ValueError(f'Maximum run slots reached {_MAX_SLOTS}! Clear the temp folder to continue')
+
+    def release(self):
+        '''Clears all files from the slot directory, and then releases the slot for reuse'''
+
+        if self.path is None:
+            return
+
+        lock_file = f'{self.path}\\{_LOCK_FILE_NAME}'
+        for file in glob.glob(f'{self.path}\\*'):
+            if file != lock_file and os.path.isfile(file):
+                os.remove(file)
+        os.remove(lock_file)
+
+        self.path = None
+        self.slot_num = None
+
+
+def clear_run_slots(runid, scan_num):
+    '''
+    Removes all slot directories of a scan that are not currently held
+
+    Parameters:
+    * runid (str): The runid of the scan
+    * scan_num (int): The scan number of the scan
+    '''
+
+    slot_paths = glob.glob(utils.get_run_slot_path(runid, scan_num, '*'))
+    for slot_path in slot_paths:
+        try:
+            if _claim_lock(slot_path):
+                utils.remove_directory(slot_path)
+        except FileNotFoundError:
+            pass  # Slot was already removed by another controller
+
+    _log.info(f'\n\tCleared run slots from {utils.get_temp_path(runid, scan_num)}\n')
+
+
+def _claim_slot(slot_path):
+    '''
+    Creates a slot directory if needed, and then claims its lock
+
+    The slot directory is created again if it is removed by clear_run_slots
+    of another controller before its lock is claimed.
+
+    Parameters:
+    * slot_path (str): The path to the slot directory
+
+    Returns:
+    * (bool): True if the lock was claimed, or False if the slot is held by another run
+    '''
+
+    for _ in range(_MAX_CLAIM_ATTEMPTS):
+        os.makedirs(slot_path, exist_ok=True)
+        try:
+            return _claim_lock(slot_path)
+        except FileNotFoundError:
+            continue  # Slot directory was removed after it was created
+
+    return False
+
+
+def _claim_lock(slot_path):
+    '''
+    Atomically creates the lock file of a slot directory, reclaiming the lock of a process that no longer exists
+
+    Parameters:
+    * slot_path (str): The path to the slot directory
+
+    Returns:
+    * (bool): True if the lock was claimed, or False if the slot is held by another run
+
+    Raises:
+    * FileNotFoundError: If the slot directory does not exist
+    '''
+
+    lock_file = f'{slot_path}\\{_LOCK_FILE_NAME}'
+    for _ in range(2):
+        try:
+            lock = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if not _reclaim_stale_lock(lock_file):
+                return False
+            continue  # Claim the reclaimed lock
+
+        with os.fdopen(lock, 'w') as f:
+            f.write(str(os.getpid()))
+
+        return True
+
+    return False
+
+
+def _reclaim_stale_lock(lock_file):
+    '''
+    Removes a lock file if the process that created it no longer exists
+
+    The lock file is first renamed to a name that is unique to this process,
+    so that only one process can reclaim a stale lock.  If the renamed lock
+    no longer belongs to the stale process (because another process already
+    reclaimed the slot), the lock is restored.
+
+    Parameters:
+    * lock_file (str): The path to the lock file
+
+    Returns:
+    * (bool): True if the stale lock was removed
+    '''
+
+    pid = _read_lock_pid(lock_file)
+    if pid is None or _is_process_running(pid):
+        return False
+
+    stale_file = f'{lock_file}.{os.getpid()}'
+    try:
+        os.rename(lock_file, stale_file)
+    except OSError:
+        return False  # Lock was reclaimed or released by another process
+
+    if _read_lock_pid(stale_file) != pid:
+        try:
+            os.rename(stale_file, lock_file)
+        except OSError:
+            _log.warning(f'\n\tUnable to restore the lock file {lock_file}\n')
+        return False
+
+    os.remove(stale_file)
+    _log.info(f'\n\tReclaimed the run slot of exited process {pid}: {lock_file}\n')
+
+    return True
+
+
+def _read_lock_pid(lock_file):
+    '''
+    Reads the process ID of the process that holds a lock
+
+    Parameters:
+    * lock_file (str): The path to the lock file
+
+    Returns:
+    * (int | None): The process ID, or None if the lock file does not exist or its process ID is not written yet
+    '''
+
+    try:
+        with open(lock_file, 'r') as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def _is_process_running(pid):
+    '''
+    Checks if a process is running
+
+    Parameters:
+    * pid (int): The process ID
+
+    Returns:
+    * (bool): True if the process is running
+    '''
+
+    if pid == os.getpid():
+        return True
+
+    if os.name == 'nt':
+        # os.kill terminates processes on Windows, so the exit code of the process is checked instead
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return kernel32.GetLastError() == 5  # ERROR_ACCESS_DENIED: the process exists
+        exit_code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        kernel32.CloseHandle(handle)
+        return exit_code.value == _STILL_ACTIVE
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # The process exists, but belongs to another user
+
+    return True
@@ -0,0 +1,443 @@
+"""Executes the factors of variable, control, and time scans
+
+Every factor of a scan is independent of every other factor, so the factors
+of a scan can be executed concurrently by a pool of worker processes.  The
+number of worker processes is set by settings.SCAN_WORKERS, and the factors
+of a scan are executed one after another in the current process when only
+one worker is used.
+
+Each run of the MMM driver is made in its own run slot directory within the
+temp folder of the scan (see the runslot module), so that concurrent runs of
+the MMM driver never read or write the same input and output files.  The
+factor CSVs saved for each factor are identical to the CSVs that would be
+saved by executing the scan sequentially.
+
+Worker processes receive copies of the base variables, controls, and settings
+once when they are started, so only the scan factor is sent to a worker for
+each factor of the scan.
+
+Factors of variable scans can also be packed together, so that MMM is ran
+once for up to settings.SCAN_PACK_SIZE factors (see mmm.run_wrapper_packed).
+Packs are sized so that every worker still receives work.
+
+When options.scan_store is enabled, the stores of the scan are created
+before any factor is executed, and each factor saves its values to the
+stores instead of to factor CSVs (see the scanstore module).  Otherwise,
+the saved data of each factor is returned to the current process, and rho
+files are written as factors complete (see reshaper.StreamingReshaper).
+
+Factor CSVs are written by a background thread in each process that runs
+factors (see the outputsink module), so that the files of a factor are
+written while MMM runs.  Rho files are also written by a background thread
+in the current process.  All files are written by the time a factor (in a
+worker process) or the scan (in the current process) completes.
+
+When settings.MMM_PERSISTENT_WORKERS is enabled, each process that runs
+factors also starts a resident MMM wrapper process, which runs every case of
+that process over a single pipe (see the mmmworker module).
+
+Example Usage:
+    scanner.execute_scan(mmm_vars, controls, scanner.run_variable_factor, options.scan_range)
+"""
+
+# Standard Packages
+import sys; sys.path.insert(0, '../')
+import os
+import copy
+import concurrent.futures
+import multiprocessing.util
+
+# Local Packages
+import settings
+import modules.mmm as mmm
+import modules.reshaper as reshaper
+import modules.runslot as runslot
+import modules.mmmworker as mmmworker
+import modules.outputsink as outputsink
+import modules.scanstore as scanstore
+import modules.variables as variables
+import modules.constants as constants
+import modules.datahelper as datahelper
+import modules.adjustments as adjustments
+import modules.calculations as calculations
+from modules.enums import SaveType, ScanType
+
+
+# Base data of the scan in each worker process, which is set by _init_worker
+_worker_data = {}
+
+
+def run_variable_factor(mmm_vars, controls, scan_factor):
+    '''
+    Runs MMM for a single factor of an input variable scan
+
+    The value of the scanned variable is adjusted by the scan factor, along
+    with any dependent variables, and the adjusted input variables and the
+    output variables produced by MMM are saved to the factor CSVs.
+
+    Parameters:
+    * mmm_vars (InputVariables): Contains all base variables needed to write the MMM input file
+    * controls (InputControls): Specifies input control values in the MMM input file
+    * scan_factor (float): The factor to adjust the scanned variable by
+
+    Returns:
+    * (list[tuple]): The scan factor and its saved data (see reshaper.StreamingReshaper.add_factor)
+    '''
+
+    adjusted_vars = adjustments.adjust_scanned_variable(mmm_vars, scan_factor)
+    saved_data = adjusted_vars.save(scan_factor)
+    output_vars = mmm.run_wrapper(adjusted_vars, controls)
+    calculations.calculate_output_variables(mmm_vars, output_vars, controls)
+    saved_data.update(output_vars.save(scan_factor))
+
+    return [(scan_factor, saved_data)]
+
+
+def run_variable_factors(mmm_vars, controls, scan_factors):
+    '''
+    Runs MMM for many factors of an input variable scan, packing factors into as few runs of MMM as possible
+
+    Factors are only packed together when their adjusted variables share the
+    same major radius at rho = 0, which is only not the case when scanning
+    variables that change the major radius.  All factors are adjusted at
+    once as a single batch (see adjustments.adjust_scanned_variables).  The
+    saved CSVs are the same as those saved by run_variable_factor, to within
+    the tolerance of iterative adjustments.
+
+    Parameters:
+    * mmm_vars (InputVariables): Contains all base variables needed to write the MMM input file
+    * controls (InputControls): Specifies input control values in the MMM input file
+    * scan_factors (list[float]): The factors to adjust the scanned variable by
+
+    Returns:
+    * (list[tuple]): Each scan factor and its saved data (see reshaper.StreamingReshaper.add_factor)
+    '''
+
+    batch_vars = adjustments.adjust_scanned_variables(mmm_vars, scan_factors)
+
+    saved_data = {}
+    adjusted_vars_groups = {}
+    for scan_factor, adjusted_vars in zip(scan_factors, adjustments.get_factor_variables(batch_vars)):
+        saved_data[scan_factor] = adjusted_vars.save(scan_factor)
+        packing_key = mmm.get_packing_key(adjusted_vars)
+        adjusted_vars_groups.setdefault(packing_key, []).append((scan_factor, adjusted_vars))
+
+    for group in adjusted_vars_groups.values():
+        output_vars_list = mmm.run_wrapper_packed([adjusted_vars for __, adjusted_vars in group], controls)
+        for (scan_factor, __), output_vars in zip(group, output_vars_list):
+            calculations.calculate_output_variables(mmm_vars, output_vars, controls)
+            saved_data[scan_factor].update(output_vars.save(scan_factor))
+
+    return [(scan_factor, saved_data[scan_factor]) for scan_factor in scan_factors]
+
+
+def run_control_factor(mmm_vars, controls, scan_factor):
+    '''
+    Runs MMM for a single factor of an input control scan
+
+    The number of MTM kyrhos loops is scaled along with the scan factor, so
+    that the resolution of the MTM kyrhos scan is preserved as the scanned
+    control increases.
+
+    Parameters:
+    * mmm_vars (InputVariables): Contains all variables needed to write the MMM input file
+    * controls (InputControls): Specifies base input control values in the MMM input file
+    * scan_factor (float): The factor to multiply the scanned control by
+
+    Returns:
+    * (list[tuple]): The scan factor and its saved data (see reshaper.StreamingReshaper.add_factor)
+    '''
+
+    adjusted_controls = adjust_control(controls, mmm_vars.options.var_to_scan, scan_factor, mmm_vars.options.scan_range)
+
+    saved_data = mmm_vars.save(scan_factor)
+    saved_data.update(adjusted_controls.save(scan_factor))
+    output_vars = mmm.run_wrapper(mmm_vars, adjusted_controls)
+    calculations.calculate_output_variables(mmm_vars, output_vars, controls)
+    saved_data.update(output_vars.save(scan_factor))
+
+    return [(scan_factor, saved_data)]
+
+
+def adjust_control(controls, control_name, scan_factor, scan_range):
+    '''
+    Adjusts the value of a control by a scan factor
+
+    Parameters:
+    * controls (InputControls): Specifies base input control values in the MMM input file
+    * control_name (str): The name of the control to adjust
+    * scan_factor (float): The factor to multiply the control by
+    * scan_range (np.ndarray): The scan factors of the control
+
+    Returns:
+    * adjusted_controls (InputControls): A copy of controls with the adjusted control
+    '''
+
+    adjusted_controls = datahelper.deepcopy_data(controls)
+    getattr(adjusted_controls, control_name).values = scan_factor * getattr(controls, control_name).values
+    adjusted_controls.mtm_kyrhos_loops.values = int(controls.mtm_kyrhos_loops.values * scan_factor / scan_range[0])
+
+    return adjusted_controls
+
+
+def run_time_factor(mmm_vars, controls, scan_idx):
+    '''
+    Runs MMM for a single time of an input time scan
+
+    A shallow copy of mmm_vars is given its own copy of options, so that the
+    measurement time of the base variables is not changed by the scan.
+
+    Parameters:
+    * mmm_vars (InputVariables): Contains all variables needed to write the MMM input file
+    * controls (InputControls): Specifies input control values in the MMM input file
+    * scan_idx (int): The index of the time in options.scan_range
+
+    Returns:
+    * (list[tuple]): The time of the scan index and its saved data (see reshaper.StreamingReshaper.add_factor)
+    '''
+
+    time_vars = copy.copy(mmm_vars)
+    time_vars.options = copy.copy(mmm_vars.options)
+    time_vars.options.time_idx = time_vars.options.scan_range_idxs[scan_idx]
+    time_vars.options.time_str = time_vars.options.scan_range[scan_idx]
+    time_scan_str = f'{float(time_vars.options.time_str):{constants.SCAN_FACTOR_FMT}}'
+
+    saved_data = time_vars.save(time_scan_str)
+    output_vars = mmm.run_wrapper(time_vars, controls)
+    calculations.calculate_output_variables(time_vars, output_vars, controls)
+    saved_data.update(output_vars.save(time_scan_str))
+
+    return [(time_scan_str, saved_data)]
+
+
+def get_pack_size(run_factor, num_factors, workers):
+    '''
+    Gets the number of factors to pack into each run of MMM
+
+    Parameters:
+    * run_factor (function): Runs a single factor of the scan
+    * num_factors (int): The number of factors in the scan
+    * workers (int): The number of worker processes used for the scan
+
+    Returns:
+    * (int): The number of factors per pack, where 1 means that factors are not packed
+    '''
+
+    if run_factor is not run_variable_factor or not settings.SCAN_PACK_SIZE:
+        return 1
+    return max(min(settings.SCAN_PACK_SIZE, -(-num_factors // workers)), 1)
+
+
+def get_worker_count(num_factors):
+    '''
+    Gets the number of worker processes to use for a scan
+
+    Parameters:
+    * num_factors (int): The number of factors in the scan
+
+    Returns:
+    * (int): The number of worker processes, which never exceeds the number of factors
+    '''
+
+    workers = settings.SCAN_WORKERS or os.cpu_count() or 1
+    return max(min(workers, num_factors), 1)
+
+
+def execute_scan(mmm_vars, controls, run_factor, factors):
+    '''
+    Executes each factor of a scan, using a pool of worker processes when
+    more than one worker is available
+
+    Factors may complete in any order when executed by multiple workers, so
+    the printed progress only reflects the number of completed factors.  If
+    any factor raises an exception, factors that have not started yet are
+    cancelled and the exception is raised again here.
+
+    Unless the scan is saved to scan stores, the data saved by each factor is
+    added to a StreamingReshaper as soon as the factor completes, so that rho
+    files are written during the scan instead of after it.
+
+    Parameters:
+    * mmm_vars (InputVariables): Contains all base variables needed to write the MMM input file
+    * controls (InputControls): Specifies input control values in the MMM input file
+    * run_factor (function): Runs a single factor of the scan (such as run_variable_factor)
+    * factors (iterable): The scan factors (or scan indices) to pass into run_factor
+    '''
+
+    rho_reshaper = None
+    if mmm_vars.options.scan_store:
+        create_scan_stores(mmm_vars, controls)
+    else:
+        rho_reshaper = reshaper.StreamingReshaper(mmm_vars.options)
+
+    run_factors(mmm_vars, controls, run_factor, factors, rho_reshaper)
+
+
+def run_factors(mmm_vars, controls, run_factor, factors, rho_reshaper=None):
+    '''
+    Runs factors of a scan whose stores (or StreamingReshaper) have already been created
+
+    Scans that run their factors over many calls (such as refined scans, see
+    the adaptive module) use the same stores or StreamingReshaper for every
+    call, so that saved data contains the factors of every call.
+
+    Parameters:
+    * mmm_vars (InputVariables): Contains all base variables needed to write the MMM input file
+    * controls (InputControls): Specifies input control values in the MMM input file
+    * run_factor (function): Runs a single factor of the scan (such as run_variable_factor)
+    * factors (iterable): The scan factors (or scan indices) to pass into run_factor
+    * rho_reshaper (StreamingReshaper): Writes rho files as factors complete (optional; None for scan stores)
+    '''
+
+    options = mmm_vars.options
+    factors = list(factors)
+    num_factors = len(factors)
+
+    workers = get_worker_count(num_factors)
+    scan_name = options.var_to_scan or ' x '.join(options.scan_axes or [])
+    progress_str = f'{options.runid}.{options.scan_num} {scan_name} scan'
+
+    # Each unit of work is either a single factor, or a pack of factors
+    pack_size = get_pack_size(run_factor, num_factors, workers)
+    if pack_size > 1:
+        factors = [factors[i:i + pack_size] for i in range(0, num_factors, pack_size)]
+        run_factor = run_variable_factors
+        workers = get_worker_count(len(factors))
+    factor_counts = [len(factor) if pack_size > 1 else 1 for factor in factors]
+
+    if workers == 1:
+        completed = 0
+        outputsink.start()
+        mmmworker.start(options)
+        try:
+            for factor, factor_count in zip(factors, factor_counts):
+                completed += factor_count
+                print(f'{progress_str}: {completed} / {num_factors}')
+                _add_saved_data(rho_reshaper, run_factor(mmm_vars, controls, factor))
+        finally:
+            mmmworker.stop()
+            _flush_saved_data(rho_reshaper)
+            outputsink.stop()
+            scanstore.close_stores()
+        runslot.clear_run_slots(options.runid, options.scan_num)
+        return
+
+    pack_str = f' in packs of up to {pack_size}' if pack_size > 1 else ''
+    print(f'{progress_str}: running {num_factors} factors{pack_str} using {workers} workers')
+
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(mmm_vars, controls, _get_settings_values()),
+    )
+
+    outputsink.start()  # Writes rho files while factors run
+    try:
+        futures = {executor.submit(_run_worker_factor, run_factor, factor): factor_count
+                   for factor, factor_count in zip(factors, factor_counts)}
+        completed = 0
+        for future in concurrent.futures.as_completed(futures):
+            _add_saved_data(rho_reshaper, future.result())  # Raises any exception from the worker
+            completed += futures[future]
+            print(f'{progress_str}: {completed} / {num_factors}')
+    except BaseException:
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    else:
+        executor.shutdown(wait=True)
+    finally:
+        _flush_saved_data(rho_reshaper)
+        outputsink.stop()
+
+    runslot.clear_run_slots(options.runid, options.scan_num)
+
+
+def create_scan_stores(mmm_vars, controls):
+    '''
+    Creates the stores that every factor of the scan is saved to (see scanstore)
+
+    Controls are only stored when scanning a control, since they are
+    otherwise the same for every factor.
+
+    Parameters:
+    * mmm_vars (InputVariables): Contains all base variables needed to write the MMM input file
+    * controls (InputControls): Specifies input control values in the MMM input file
+    '''
+
+    options = mmm_vars.options
+    output_vars = variables.OutputVariables(options)
+    for vars_obj, save_type in [(mmm_vars, SaveType.INPUT), (mmm_vars, SaveType.ADDITIONAL),
+                                (output_vars, SaveType.OUTPUT)]:
+        var_names = vars_obj.get_vars_to_save(save_type)
+        units = [getattr(vars_obj, var_name).units for var_name in var_names]
+        scanstore.create_store(options, save_type, var_names, units)
+
+    if options.scan_type is ScanType.CONTROL:
+        scanstore.create_store(options, SaveType.CONTROLS, controls.get_keys(), num_points=1)
+
+
+def _add_saved_data(rho_reshaper, factor_results):
+    '''Adds (list[tuple]): the scan factor and saved data of completed factors to rho_reshaper (if not None)'''
+    if rho_reshaper is not None:
+        for scan_factor, saved_data in factor_results:
+            rho_reshaper.add_factor(scan_factor, saved_data)
+
+
+def _flush_saved_data(rho_reshaper):
+    '''Writes rho files of all factors added to rho_reshaper (if not None)'''
+    if rho_reshaper is not None:
+        rho_reshaper.flush()
+
+
+def _get_settings_values():
+    '''Returns (dict): Values of all settings, which may have been changed at runtime'''
+    return {name: getattr(settings, name) for name in dir(settings) if name.isupper()}
+
+
+def _init_worker(mmm_vars, controls, settings_values):
+    '''
+    Stores the base data of the scan in a worker process, and starts its OutputSink and MMM worker
+
+    Settings are set again in each worker, since settings changed at runtime
+    (such as in mmm_controller.py) are not seen by newly spawned processes.
+    The MMM worker is stopped when the worker process exits, which releases
+    its run slot, and scan stores opened for writing by the worker are
+    closed.
+
+    Parameters:
+    * mmm_vars (InputVariables): Contains all base variables needed to write the MMM input file
+    * controls (InputControls): Specifies input control values in the MMM input file
+    * settings_values (dict): Values of all settings in the parent process
+    '''
+
+    for name, value in settings_values.items():
+        setattr(settings, name, value)
+
+    _worker_data['mmm_vars'] = mmm_vars
+    _worker_data['controls'] = controls
+
+    outputsink.start()
+    mmmworker.start(mmm_vars.options)
+    multiprocessing.util.Finalize(None, mmmworker.stop, exitpriority=10)
+    multiprocessing.util.Finalize(None, scanstore.close_stores, exitpriority=10)
+
+
+def _run_worker_factor(run_factor, factor):
+    '''
+    Runs a single factor of the scan using the base data of the worker
+
+    All files of the factor are written before the factor completes, since
+    worker processes may exit as soon as the scan completes.
+
+    Parameters:
+    * run_factor (function): Runs a single factor of the scan (such as run_variable_factor)
+    * factor (float | int | list): The scan factor (or scan index, or pack of factors) to pass into run_factor
+
+    Returns:
+    * (list[tuple]): Each scan factor and its saved data (see reshaper.StreamingReshaper.add_factor)
+    '''
+
+    factor_results = run_factor(_worker_data['mmm_vars'], _worker_data['controls'], factor)
+    outputsink.flush()
+
+    return factor_results
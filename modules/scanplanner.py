@@ -0,0 +1,114 @@
+"""Plans the scans queued in mmm_controller.py into batches that share base data
+
+Every scan starts from the same base data: variables initialized from the
+CDF, and the output of a single run of MMM using those variables.  When many
+scans are queued, this base data only differs between scans that need the
+values of every time slice of the CDF (time scans, when
+options.single_time_slice is enabled) and scans that only need the
+measurement time.  Queued scans are therefore split into batches of scans
+that can share base data, so that the CDF is read, converted, and calculated
+once per batch, and MMM runs the base case once per batch.
+
+Scans of a batch are then ran one after another using the shared base data,
+since the factors of each scan are already ran in parallel by every worker
+(see the scanner module).  Each scan still saves the base data to its own
+scan folder.  Every scan of a batch uses its own copy of options, and its own
+copies of the base data that reference those options, since scans modify
+their options while running (such as the scan range of refined scans, or
+the time ranges of time scans).
+
+Example Usage:
+    for batch in scanplanner.plan_scans(options, scanned_vars):
+        for adjustment_name, scan_range in batch:
+            scan_options = copy.copy(options)
+            scanplanner.set_scan(scan_options, adjustment_name, scan_range)
+            scan_vars, = scanplanner.copy_base_data(scan_options, mmm_vars)
+"""
+
+# Standard Packages
+import sys; sys.path.insert(0, '../')
+import copy
+
+# Local Packages
+import modules.datahelper as datahelper
+
+
+def plan_scans(options, scanned_vars):
+    '''
+    Splits queued scans into batches of scans that can share the same base data
+
+    Batches are ordered by their first queued scan, and scans keep their
+    queued order within each batch.
+
+    Parameters:
+    * options (Options): Object containing user options
+    * scanned_vars (dict): Maps each scanned variable (or tuple of variables) to its scan range (or tuple of ranges)
+
+    Returns:
+    * (list[list[tuple]]): Batches of (adjustment_name, scan_range) pairs
+    '''
+
+    batches = {}
+    for adjustment_name, scan_range in scanned_vars.items():
+        base_key = get_base_key(options, adjustment_name, scan_range)
+        batches.setdefault(base_key, []).append((adjustment_name, scan_range))
+
+    return list(batches.values())
+
+
+def get_base_key(options, adjustment_name, scan_range):
+    '''
+    Gets the key of the base data of a scan, which is the same for all scans that can share base data
+
+    Parameters:
+    * options (Options): Object containing user options
+    * adjustment_name (str | tuple[str] | None): The scanned variable (or variables)
+    * scan_range (np.ndarray | tuple[np.ndarray] | None): The scan range (or ranges)
+
+    Returns:
+    * (bool): True if the scan needs the values of every time slice of the CDF (see datahelper.initialize_variables)
+    '''
+
+    scan_options = copy.copy(options)
+    set_scan(scan_options, adjustment_name, scan_range)
+
+    return datahelper.uses_all_times(scan_options)
+
+
+def set_scan(options, adjustment_name, scan_range):
+    '''
+    Sets the scanned variable and scan range of options
+
+    Parameters:
+    * options (Options): Object containing user options
+    * adjustment_name (str | tuple[str] | None): The scanned variable, or a tuple of the variables of a
+      multidimensional scan
+    * scan_range (np.ndarray | tuple[np.ndarray] | None): The scan range, or a tuple of the range of each variable
+    '''
+
+    if isinstance(adjustment_name, tuple):
+        options.set(adjustment_name=None, scan_range=None, scan_axes=dict(zip(adjustment_name, scan_range)))
+    else:
+        options.set(scan_axes=None, adjustment_name=adjustment_name, scan_range=scan_range)
+
+
+def copy_base_data(options, *base_data):
+    '''
+    Copies the base data of a batch for a single scan of the batch
+
+    Variables are copied using copy-on-write, so values are only copied when
+    they are modified by the scan (see datahelper.deepcopy_data).
+
+    Parameters:
+    * options (Options): The options of the scan, which are referenced by every copy
+    * base_data (InputVariables | OutputVariables | InputControls): Each object to copy
+
+    Returns:
+    * (tuple): A copy of each object of base_data
+    '''
+
+    scan_data = tuple(datahelper.deepcopy_data(obj) for obj in base_data)
+    for obj in scan_data:
+        obj.options = options
+
+    return scan_data
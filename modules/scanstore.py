@@ -0,0 +1,448 @@
+"""Stores the saved data of every factor of a scan in a single binary file per save type
+
+Saving each factor of a scan to its own CSV, and then reshaping every factor
+CSV into a CSV per rho value, writes each value of the scan to disk twice as
+text, and creates thousands of files for large scans.  A scan store instead
+holds the values of every factor of a save type in a single .npy array of
+shape (factor, rho, variable), which is created with all values set to nan
+before the scan starts.  Each factor writes its own rows of the array as soon
+as it completes, so factors that complete in any order (or in different
+worker processes) never write the same values.
+
+The array is read as a memory map, so the values of a single factor are the
+slice [factor, :, :], and the values of a single rho value are the slice
+[:, rho, :]; rho files are therefore a transposed view of the same array,
+and are never written to disk.  The names and units of the variables of the
+array, the scan factors, and the number of radial points are stored in a
+JSON sidecar file next to the array.  Factors that have not been saved yet
+still have nan values.
+
+Each process keeps the stores it saves to open for writing until
+close_stores is called (which the scanner module does when a scan
+completes), so saving a factor only writes its rows.  Open stores are closed
+before a store is created or replaced, since files that are memory-mapped
+cannot be replaced on Windows.
+
+Controls are stored the same way when scanning a control, using a single
+point in place of the radial points.
+
+Stores of other shapes (such as the stores of multidimensional scans, which
+have one axis per scanned variable) are created and opened by path using
+create_store_file and open_store_file, so that they share the layout,
+versioning, and open stores of scan stores (see the multiscan module).
+
+Example Usage:
+    # Create the store of input variables before the scan
+    scanstore.create_store(options, SaveType.INPUT, var_names, units)
+
+    # Save the values of a factor, with shape (rho, variable)
+    scanstore.save_factor(options, SaveType.INPUT, scan_factor, data, var_names)
+
+    # Load the values of a single factor, or of a single rho value
+    var_names, values = scanstore.load_factor(options, SaveType.INPUT, scan_factor)
+    var_names, values = scanstore.load_rho(options, SaveType.INPUT, rho_value)
+
+    # Load the values of a single variable, with shape (factor, rho)
+    values = scanstore.load_variable(options, SaveType.OUTPUT, 'gmaETGM')
+
+    # Remove factors that were never saved (such as factors skipped by refined scans)
+    scanstore.remove_unsaved_factors(options, SaveType.OUTPUT)
+
+    # Flush and close all stores that are open in the current process
+    scanstore.close_stores()
+
+    # Create and open a store of any shape by its path
+    scanstore.create_store_file(store_path, (*axes_shape, num_points, len(var_names)), metadata)
+    metadata, values = scanstore.open_store_file(store_path, writable=True)
+"""
+
+# Standard Packages
+import sys; sys.path.insert(0, '../')
+import os
+import json
+import logging
+import functools
+import threading
+
+# 3rd Party Packages
+import numpy as np
+
+# Local Packages
+import modules.utils as utils
+import modules.constants as constants
+from modules.enums import SaveType
+
+
+_log = logging.getLogger(__name__)
+
+# Increase when the layout of stores changes
+_STORE_VERSION = 1
+
+# Maximum number of stores that are kept open for reading, and for writing
+_MAX_OPEN_STORES = 8
+
+# Modification time, metadata, and writable values of each store open for writing, keyed by store path
+_writable_stores = {}
+
+
+def create_store(options, save_type, var_names, units=None, num_points=None):
+    '''
+    Creates the store of a save type of a scan, with the values of every factor set to nan
+
+    Parameters:
+    * options (Options): Contains user specified options
+    * save_type (SaveType): The save type of the store
+    * var_names (list[str]): Names of the variables of the store, in the order they are saved
+    * units (list[str]): Units of each variable (optional)
+    * num_points (int): The number of radial points of each factor (optional; default is options.input_points)
+    '''
+
+    store_path = _get_store_path(options, save_type)
+    factors = np.asarray(options.scan_range, dtype=float)
+    num_points = num_points if num_points is not None else options.input_points
+
+    metadata = {
+        'save_type': save_type.name,
+        'var_to_scan': options.var_to_scan,
+        'factors': factors.tolist(),
+        'num_points': num_points,
+        'var_names': list(var_names),
+        'units': list(units) if units is not None else [''] * len(var_names),
+    }
+    create_store_file(store_path, (factors.size, num_points, len(var_names)), metadata)
+
+
+def has_store(options, save_type):
+    '''Returns (bool): True if the scan of options has a store of save_type'''
+    return (
+        options.scan_store
+        and options.var_to_scan is not None
+        and os.path.exists(f'{_get_store_path(options, save_type)}.json')
+    )
+
+
+def save_factor(options, save_type, scan_factor, data, var_names):
+    '''
+    Saves the values of a single factor of a scan to its store
+
+    The store stays open for writing, so the values are only certain to be
+    written to disk once close_stores is called.  Values are visible to
+    other processes as soon as they are saved.
+
+    Parameters:
+    * options (Options): Contains user specified options
+    * save_type (SaveType): The save type of the values
+    * scan_factor (float | str): The scan factor of the values
+    * data (np.ndarray): Values of each variable, with shape (rho, variable)
+    * var_names (list[str] | str): Names of each variable in data (or a comma separated string of names)
+
+    Raises:
+    * ValueError: If the variables or shape of data do not match the store
+    '''
+
+    if isinstance(var_names, str):
+        var_names = var_names.split(',')
+
+    store_path = _get_store_path(options, save_type)
+    metadata, values = open_store_file(store_path, writable=True)
+    if list(var_names) != metadata['var_names']:
+        raise ValueError(f'Variables of {save_type.name} data do not match the variables of the scan store')
+
+    values[get_factor_idx(metadata['factors'], scan_factor)] = data
+
+    _log.info(f'\n\tSaved: {store_path}.npy, factor {scan_factor}\n')
+
+
+def load_factor(options, save_type, scan_factor):
+    '''
+    Loads the values of a single factor of a scan
+
+    Parameters:
+    * options (Options): Contains user specified options
+    * save_type (SaveType): The save type of the values
+    * scan_factor (float | str): The scan factor to load
+
+    Returns:
+    * var_names (list[str]): Names of each variable in values
+    * values (np.ndarray): Read-only values of each variable, with shape (rho, variable)
+
+    Raises:
+    * ValueError: If the factor has not been saved
+    '''
+
+    metadata, values = open_store_file(_get_store_path(options, save_type))
+    factor_idx = get_factor_idx(metadata['factors'], scan_factor)
+    if np.isnan(values[factor_idx, 0, 0]):
+        raise ValueError(f'Scan factor {scan_factor} of {options.var_to_scan} has not been saved')
+
+    return metadata['var_names'], values[factor_idx]
+
+
+def load_rho(options, save_type, rho_value):
+    '''
+    Loads the values of a single rho value of every factor of a scan
+
+    Values of factors that have not been saved are nan.
+
+    Parameters:
+    * options (Options): Contains user specified options
+    * save_type (SaveType): The save type of the values
+    * rho_value (str | float): The rho value to load
+
+    Returns:
+    * var_names (list[str]): Names of each variable in values
+    * values (np.ndarray): Read-only values of each variable, with shape (factor, variable)
+
+    Raises:
+    * ValueError: If the rho value is not a rho value of the store
+    '''
+
+    metadata, values = open_store_file(_get_store_path(options, save_type))
+    rho_str = rho_value if isinstance(rho_value, str) else f'{rho_value:{constants.RHO_VALUE_FMT}}'
+    rho_strs = _get_rho_strings(metadata['num_points'])
+    if rho_str not in rho_strs:
+        raise ValueError(f'Rho value {rho_str} is not a rho value of the scan store')
+
+    return metadata['var_names'], values[:, rho_strs.index(rho_str)]
+
+
+def load_variable(options, save_type, var_name):
+    '''
+    Loads the values of a single variable at every factor and rho value of a scan
+
+    Values of factors that have not been saved are nan.
+
+    Parameters:
+    * options (Options): Contains user specified options
+    * save_type (SaveType): The save type of the values
+    * var_name (str): The name of the variable to load
+
+    Returns:
+    * (np.ndarray): Read-only values of the variable, with shape (factor, rho)
+
+    Raises:
+    * ValueError: If the variable is not a variable of the store
+    '''
+
+    metadata, values = open_store_file(_get_store_path(options, save_type))
+    if var_name not in metadata['var_names']:
+        raise ValueError(f'{var_name} is not a variable of the {save_type.name} scan store')
+
+    return values[:, :, metadata['var_names'].index(var_name)]
+
+
+def load_controls(options, scan_factor=None):
+    '''
+    Loads the values of scanned controls
+
+    Parameters:
+    * options (Options): Contains user specified options
+    * scan_factor (float | str): The scan factor to load (optional; all factors when None)
+
+    Returns:
+    * var_names (list[str]): Names of each control in values
+    * values (np.ndarray): Values of each control, with shape (control,) for a single factor,
+      or (factor, control) for all factors
+    '''
+
+    if scan_factor is not None:
+        var_names, values = load_factor(options, SaveType.CONTROLS, scan_factor)
+        return var_names, values[0]
+    return load_rho(options, SaveType.CONTROLS, 0)
+
+
+def get_rho_strings(options, save_type):
+    '''Returns (list[str]): the rho values of the store of save_type as strings'''
+    metadata, __ = open_store_file(_get_store_path(options, save_type))
+    return _get_rho_strings(metadata['num_points'])
+
+
+def get_var_names(options, save_type):
+    '''Returns (list[str]): the names of the variables of the store of save_type'''
+    metadata, __ = open_store_file(_get_store_path(options, save_type))
+    return list(metadata['var_names'])
+
+
+def get_saved_factors(options, save_type):
+    '''Returns (np.ndarray): the scan factors of the store of save_type that have been saved'''
+    metadata, values = open_store_file(_get_store_path(options, save_type))
+    return np.array(metadata['factors'])[~np.isnan(values[:, 0, 0])]
+
+
+def remove_unsaved_factors(options, save_type):
+    '''
+    Removes the factors of a store that have not been saved, so that the store only contains saved factors
+
+    The values of the saved factors are written to a new array, which then
+    replaces the array of the store.  All open stores of the current process
+    are closed first, so arrays previously loaded from the store must no
+    longer be referenced.
+
+    Parameters:
+    * options (Options): Contains user specified options
+    * save_type (SaveType): The save type of the store
+
+    Returns:
+    * (np.ndarray): The scan factors of the store, which have all been saved
+    '''
+
+    store_path = _get_store_path(options, save_type)
+    close_stores()  # Open stores may include this store, which could not be replaced while open
+    metadata = _load_metadata(store_path)
+
+    values = np.load(f'{store_path}.npy', mmap_mode='r')
+    is_saved = ~np.isnan(values[:, 0, 0])
+    saved_values = np.array(values[is_saved])
+    del values  # Closes the memory map
+
+    tmp_path = f'{store_path}.npy.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, saved_values)
+    os.replace(tmp_path, f'{store_path}.npy')
+
+    metadata['factors'] = np.array(metadata['factors'])[is_saved].tolist()
+    with open(f'{store_path}.json', 'w') as f:
+        json.dump(metadata, f, indent=1)
+
+    _log.info(f'\n\tRemoved {is_saved.size - is_saved.sum()} unsaved factors: {store_path}.npy\n')
+
+    return np.array(metadata['factors'])
+
+
+def create_store_file(store_path, shape, metadata):
+    '''
+    Creates a store of any shape, with all values set to nan
+
+    Parameters:
+    * store_path (str): The path of the store, without a file extension
+    * shape (tuple[int]): The shape of the values of the store
+    * metadata (dict): The metadata of the store, which is saved to its JSON sidecar file along with the store version
+    '''
+
+    close_stores()  # The store may replace a store that is still open
+    values = np.lib.format.open_memmap(f'{store_path}.npy', mode='w+', dtype='<f8', shape=tuple(shape))
+    values[:] = np.nan
+    values.flush()
+    del values
+
+    with open(f'{store_path}.json', 'w') as f:
+        json.dump({'version': _STORE_VERSION, **metadata}, f, indent=1)
+
+    _log.info(f'\n\tCreated scan store: {store_path}.npy\n')
+
+
+def open_store_file(store_path, writable=False):
+    '''
+    Opens a store by its path, reusing the store if it is already open in the current process
+
+    Stores are opened again once they are created again, since the
+    modification time of their metadata is part of the key of open stores.
+
+    Parameters:
+    * store_path (str): The path of the store, without a file extension
+    * writable (bool): Open the store for writing, until close_stores is called (optional)
+
+    Returns:
+    * metadata (dict): The metadata of the store
+    * values (np.memmap): The values of the store, which are read-only unless writable is True
+    '''
+
+    mtime_ns = os.stat(f'{store_path}.json').st_mtime_ns
+    if writable:
+        return _open_writable_store(store_path, mtime_ns)
+    return _open_store(store_path, mtime_ns)
+
+
+def close_stores():
+    '''Flushes the stores that are open for writing, and then closes every open store of the current process'''
+    for __, __, values in _writable_stores.values():
+        values.flush()
+    _writable_stores.clear()
+    _open_store.cache_clear()
+
+
+def get_factor_idx(factors, scan_factor):
+    '''
+    Gets the index of a scan factor in the factors of a scan
+
+    Factors are matched using SCAN_FACTOR_FMT, which is the precision that
+    scan factors are saved with in factor CSVs.
+
+    Parameters:
+    * factors (list[float] | np.ndarray): The factors of the scan
+    * scan_factor (float | str): The scan factor
+
+    Returns:
+    * (int): The index of the factor
+
+    Raises:
+    * ValueError: If the scan factor is not a factor of the scan
+    '''
+
+    factors = np.asarray(factors, dtype=float)
+    factor_idx = int(np.argmin(np.abs(factors - float(scan_factor))))
+    if f'{factors[factor_idx]:{constants.SCAN_FACTOR_FMT}}' != f'{float(scan_factor):{constants.SCAN_FACTOR_FMT}}':
+        raise ValueError(f'Scan factor {scan_factor} is not a factor of the scan')
+
+    return factor_idx
+
+
+def _get_store_path(options, save_type):
+    '''Returns (str): the path of the store of save_type, without a file extension'''
+    return utils.get_scan_store_path(options.runid, options.scan_num, options.var_to_scan, save_type)
+
+
+def _open_writable_store(store_path, mtime_ns):
+    '''
+    Opens a store for writing, reusing the store if it is already open
+
+    Parameters:
+    * store_path (str): The path of the store, without a file extension
+    * mtime_ns (int): The modification time of the metadata of the store, which changes when it is created again
+
+    Returns:
+    * (tuple[dict, np.memmap]): The metadata and writable values of the store
+    '''
+
+    store = _writable_stores.get(store_path)
+    if store is None or store[0] != mtime_ns:
+        if len(_writable_stores) >= _MAX_OPEN_STORES:
+            close_stores()
+        store = mtime_ns, _load_metadata(store_path), np.load(f'{store_path}.npy', mmap_mode='r+')
+        _writable_stores[store_path] = store
+
+    return store[1:]
+
+
+@functools.lru_cache(maxsize=_MAX_OPEN_STORES)
+def _open_store(store_path, mtime_ns):
+    '''Returns (tuple[dict, np.memmap]): the metadata and read-only values of a store'''
+    return _load_metadata(store_path), np.load(f'{store_path}.npy', mmap_mode='r')
+
+
+def _load_metadata(store_path):
+    '''
+    Loads the metadata of a store
+
+    Parameters:
+    * store_path (str): The path of the store, without a file extension
+
+    Returns:
+    * (dict): The metadata of the store
+
+    Raises:
+    * ValueError: If the store was created with a different store version
+    '''
+
+    with open(f'{store_path}.json') as f:
+        metadata = json.load(f)
+
+    if metadata.get('version') != _STORE_VERSION:
+        raise ValueError(f'Scan store version {metadata.get("version")} is not supported: {store_path}')
+
+    return metadata
+
+
+def _get_rho_strings(num_points):
+    '''Returns (list[str]): rho values of each radial point as strings (matching the names of rho files)'''
+    return [f'{rho:{constants.RHO_VALUE_FMT}}' for rho in np.linspace(0, 1, num_points)]
@@ -96,6 +96,21 @@ def get_plotting_contours_path():
     return f'{os.path.dirname(plotting.output.contours.__file__)}'
 
 
+def get_cache_path():
+    '''Returns (str): the path to the cache folder'''
+    return f'{get_output_path()}\\cache'
+
+
+def get_result_cache_path():
+    '''Returns (str): the path to the folder of cached MMM results'''
+    return f'{get_cache_path()}\\results'
+
+
+def get_cdf_cache_path():
+    '''Returns (str): the path to the folder of cached CDF variables'''
+    return f'{get_cache_path()}\\cdfs'
+
+
 def get_runid_path(runid):
     '''Returns (str): the path to the runid folder'''
     return f'{get_output_path()}\\{runid}'
@@ -111,6 +126,11 @@ def get_temp_path(runid, scan_num, file_name=''):
     return f'{get_scan_num_path(runid, scan_num)}\\temp\\{file_name}'
 
 
+def get_run_slot_path(runid, scan_num, slot_num):
+    '''Returns (str): the path to a run slot directory within the temp folder'''
+    return f'{get_temp_path(runid, scan_num)}slot {slot_num}'
+
+
 def get_options_path(runid, scan_num):
     '''Returns (str): the path to the options pickle file'''
     return f'{get_scan_num_path(runid, scan_num)}\\Options.pickle'
@@ -136,6 +156,21 @@ def get_rho_path(runid, scan_num, var_to_scan):
     return f'{get_scan_num_path(runid, scan_num)}\\{var_to_scan} rho'
 
 
+def get_scan_store_path(runid, scan_num, var_to_scan, save_type):
+    '''Returns (str): the path of the scan store of save_type, without a file extension'''
+    return f'{get_var_to_scan_path(runid, scan_num, var_to_scan)}\\Store {save_type.name.capitalize()}'
+
+
+def get_multiscan_store_path(runid, scan_num, scan_names, save_type):
+    '''Returns (str): the path of the store of save_type of a multidimensional scan, without a file extension'''
+    return f'{get_scan_num_path(runid, scan_num)}\\{" x ".join(scan_names)} Store {save_type.name.capitalize()}'
+
+
+def get_threshold_path(runid, scan_num, var_to_scan):
+    '''Returns (str): the path of the thresholds CSV of a threshold scan'''
+    return f'{get_scan_num_path(runid, scan_num)}\\{var_to_scan} thresholds.csv'
+
+
 def get_rho_files(options, save_type):
     '''
     Returns (list): all rho files of save_type in the rho folder
@@ -229,6 +264,18 @@ def create_directory(dir_name):
         os.mkdir(dir_name)
 
 
+def remove_directory(dir_name):
+    '''
+    Removes a directory and all of its contents, if the directory exists
+
+    Parameters:
+    * dir_name (str): Path of directory
+    '''
+
+    if os.path.exists(dir_name):
+        shutil.rmtree(dir_name, ignore_errors=True)
+
+
 def check_exists(file_path):
     '''Returns (bool): True if the file exists'''
     return os.path.exists(file_path)
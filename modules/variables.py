@@ -24,6 +24,26 @@ variables are stored here as well.  Each variable class also handles the
 saving and loading of its data to CSVs, with the help of the utils class,
 which provides the paths of directories for saving and loading of data.
 
+Copies of Variables objects made with copy_on_write share the values of each
+variable with the original object, instead of copying them.  The values of a
+shared variable are only copied the first time values is accessed from
+either object, and every later access returns the same copy, so values can
+be modified in place (such as var.values *= 2, or through an alias of
+values) as they would be without sharing.  Values that are only read can be
+accessed without copying them (see Variable.get_read_only_values), and
+assigning new values to a variable never copies anything, so copies that
+only change a few variables use almost no extra memory (see
+get_memory_usage).
+
+The names, save types, CDF variable names, and units of all variables of
+each class are stored in a schema that is created once per class (see
+get_schema), so variables are listed without inspecting each attribute of
+every object.  The values of many variables of the same shape can also be
+stored in a single contiguous array (see set_backing_store), where the values
+of each variable are views of the array.  Operations on every variable, such
+as interpolating, smoothing, or saving them, are then done using a single
+array operation (see get_stored_values).
+
 The Variables class and its children are all coupled with the Options class,
 which is used for storing options needed for plotting, checking values, and
 both saving and loading variable data.  An Options object must be
@@ -55,6 +75,7 @@ Example Usage:
 
 # Standard Packages
 import sys; sys.path.insert(0, '../')
+import copy
 import logging
 
 # 3rd Party Packages
@@ -64,6 +85,9 @@ import scipy.ndimage
 # Local Packages
 import modules.constants as constants
 import modules.utils as utils
+import modules.scanstore as scanstore
+import modules.csvreader as csvreader
+import modules.outputsink as outputsink
 from modules.enums import SaveType
 
 
@@ -88,18 +112,219 @@ _UNITS_TO_UNITS_LABEL = {
 class Variables:
     def __init__(self, options):
         self.options = options
+        self._store = None  # Names, views, and values of the backing store (see set_backing_store)
 
     def __str__(self):
         return str(self.get_nonzero_variables())
 
+    @classmethod
+    def get_schema(cls):
+        '''
+        Gets the schema of all variables of the class, which is only created once per class
+
+        Variables are listed in sorted order.  Units are the units that each
+        variable is created with, since units may be changed during conversion.
+
+        Returns:
+        * (dict): Variable names ('names'), and maps of names to save types ('save_types'),
+          CDF variable names ('cdfvars'), and units ('units')
+        '''
+
+        schema = cls.__dict__.get('_schema')
+        if schema is None:
+            new_vars = cls(None)
+            names = sorted(name for name, value in vars(new_vars).items() if isinstance(value, Variable))
+            schema = {
+                'names': tuple(names),
+                'save_types': {name: getattr(new_vars, name).save_type for name in names},
+                'cdfvars': {name: getattr(new_vars, name).cdfvar for name in names},
+                'units': {name: getattr(new_vars, name).units for name in names},
+            }
+            cls._schema = schema
+
+        return schema
+
     def get_variables(self):
         '''Returns (list[str]): all variable names'''
-        return [var for var in dir(self) if isinstance(getattr(self, var), Variable)]
+        return list(self.get_schema()['names'])
+
+    def set_backing_store(self, var_names=None, values=None):
+        '''
+        Stores the values of variables in a single contiguous array
+
+        The values of each variable are replaced with a view of the array, so
+        that the values of all stored variables can be used as one array (see
+        get_stored_values).  Variables that are later assigned new values are
+        no longer part of the store.
+
+        Parameters:
+        * var_names (list[str]): Names of variables to store (optional; all variables with 2D values of the most
+          common 2D shape when None)
+        * values (np.ndarray): New values of the variables, with shape (len(var_names), ...) (optional; the
+          current values of the variables are stacked when None)
+
+        Raises:
+        * ValueError: If values does not have one row per variable name
+        '''
+
+        if var_names is None:
+            var_names = [var_name for var_name in self.get_nonzero_variables()
+                         if isinstance(getattr(self, var_name).get_read_only_values(), np.ndarray)
+                         and getattr(self, var_name).get_read_only_values().ndim == 2]
+            shapes = [getattr(self, var_name).get_read_only_values().shape for var_name in var_names]
+            if shapes:
+                store_shape = max(set(shapes), key=shapes.count)
+                var_names = [var_name for var_name, shape in zip(var_names, shapes) if shape == store_shape]
+
+        if not var_names:
+            self._store = None
+            return
+
+        if values is None:
+            values = np.stack([getattr(self, var_name).get_read_only_values() for var_name in var_names])
+        elif values.shape[0] != len(var_names):
+            raise ValueError(f'Values of {values.shape[0]} variables cannot be stored in {len(var_names)} variables')
+
+        values = np.ascontiguousarray(values)
+        views = []
+        for var_name, var_values in zip(var_names, values):
+            getattr(self, var_name).values = var_values
+            views.append(var_values)
+
+        self._store = {'names': {var_name: i for i, var_name in enumerate(var_names)}, 'views': views,
+                       'values': values}
+
+    def get_stored_names(self):
+        '''Returns (list[str]): names of variables whose values are still views of the backing store'''
+        store = self._store
+        if store is None:
+            return []
+        return [var_name for var_name, i in store['names'].items()
+                if getattr(self, var_name)._values is store['views'][i]]
+
+    def get_stored_values(self, var_names):
+        '''
+        Gets the values of variables from the backing store, without copying values where possible
+
+        Parameters:
+        * var_names (list[str]): Names of the variables
+
+        Returns:
+        * (np.ndarray | None): Read-only values of the variables, with shape (len(var_names), ...), or None
+          if any of the variables is not in the backing store
+        '''
+
+        store = self._store
+        if store is None:
+            return None
+
+        idxs = []
+        for var_name in var_names:
+            i = store['names'].get(var_name)
+            if i is None or getattr(self, var_name)._values is not store['views'][i]:
+                return None
+            idxs.append(i)
+
+        if idxs == list(range(len(store['views']))):
+            values = store['values'].view()
+        else:
+            values = store['values'][idxs]
+        values.flags.writeable = False
+
+        return values
+
+    def apply_smoothing(self, var_names):
+        '''
+        Applies smoothing to each variable (see Variable.apply_smoothing)
+
+        Variables of the backing store that are smoothed with the same sigma
+        are smoothed together using a single filter of the stored values, and
+        the smoothed values replace the backing store.  Other variables are
+        smoothed one at a time.
+
+        Parameters:
+        * var_names (list[str]): Names of the variables to smooth
+        '''
+
+        stored_names = self.get_stored_names()
+        stored_values = self.get_stored_values(stored_names) if stored_names else None
+
+        stored_idxs = {}  # Maps each sigma to the indices of stored variables smoothed with it
+        if stored_values is not None:
+            for i, var_name in enumerate(stored_names):
+                smooth = getattr(self, var_name).smooth
+                if var_name in var_names and smooth is not None:
+                    sigma = int(stored_values.shape[1] * smooth / 100)
+                    stored_idxs.setdefault(sigma, []).append(i)
+
+        if stored_idxs:
+            new_values = stored_values.copy()
+            for sigma, idxs in stored_idxs.items():
+                new_values[idxs] = scipy.ndimage.gaussian_filter(stored_values[idxs], sigma=(0, sigma, 0))
+            self.set_backing_store(stored_names, new_values)
+
+        smoothed_names = {stored_names[i] for idxs in stored_idxs.values() for i in idxs}
+        for var_name in var_names:
+            if var_name not in smoothed_names:
+                getattr(self, var_name).apply_smoothing()
+
+    def copy_on_write(self):
+        '''
+        Creates a copy that shares the values of each variable until they are accessed
+
+        Both objects copy the values of each variable the first time values
+        is accessed (see Variable.share_values), so neither object sees
+        changes made by the other.  Arrays of values taken from this object
+        before the copy was made still refer to the shared values, which are
+        read-only.  Options are shared between both objects.
+
+        Returns:
+        * new_vars (InputVariables | OutputVariables): Copy of the current object
+        '''
+
+        new_vars = copy.copy(self)
+        for var_name in self.get_variables():
+            var = getattr(self, var_name)
+            var.share_values()
+            new_var = copy.copy(var)
+            if var.dimensions is not None:
+                new_var.dimensions = list(var.dimensions)  # Dimensions are modified in place by set_xdim
+            setattr(new_vars, var_name, new_var)
+
+        return new_vars
+
+    def get_memory_usage(self):
+        '''
+        Gets the memory used by the values of all variables
+
+        Shared values are also counted by every other object that shares them,
+        so the memory saved by a copy made with copy_on_write is the amount of
+        shared memory of the copy.  Values that have not been loaded yet are
+        not counted.
+
+        Returns:
+        * (dict[str, int]): Bytes of values that are owned by this object ('owned') and shared ('shared')
+        '''
+
+        memory_usage = {'owned': 0, 'shared': 0}
+        for var_name in self.get_variables():
+            var = getattr(self, var_name)
+            if var.is_loaded() and isinstance(var._values, np.ndarray):
+                memory_usage['shared' if var.is_shared() else 'owned'] += var._values.nbytes
+
+        # Values of the backing store that are no longer used by any variable
+        if self._store is not None:
+            stored_names = self.get_stored_names()
+            memory_usage['owned'] += sum(self._store['views'][i].nbytes
+                                         for var_name, i in self._store['names'].items()
+                                         if var_name not in stored_names)
+
+        return memory_usage
 
     def get_nonzero_variables(self):
         '''Returns (list[str]): variable names with nonzero values'''
         vars = self.get_variables()
-        return [var for var in vars if getattr(self, var).values is not None]
+        return [var for var in vars if getattr(self, var).get_read_only_values() is not None]
 
     def print_nonzero_variables(self):
         '''Prints various attributes of nonzero variables'''
@@ -126,6 +351,20 @@ class Variables:
                 self.rmina.values = self.rmin.values / self.rmin.values[-1]
                 self.rho.values = np.linspace(0, 1, self.rmin.values.shape[0])
 
+    def get_data_of_type(self, save_type):
+        '''
+        Gets the values of the variables that are saved for a save type, without saving them
+
+        Parameters:
+        * save_type (SaveType): The save type of the variables
+
+        Returns:
+        * data (np.ndarray): Values of each variable, with shape (rho, variable)
+        * header (str): The string of variable names corresponding to data in the array
+        '''
+
+        return self._get_data_as_array(self.get_vars_to_save(save_type))
+
     def _get_data_as_array(self, var_list):
         '''
         Gets data from requested variables in array format
@@ -148,21 +387,48 @@ class Variables:
         if isinstance(self, InputVariables):
             if self.options.time_idx is None:
                 raise ValueError('The time index has not been initialized')
+            # Values of variables in the backing store are copied using a single array operation
+            stored_names = []
+            if isinstance(self.options.time_idx, (int, np.integer)):
+                stored_names = [var_name for var_name in self.get_stored_names() if var_name in var_list]
+            if stored_names:
+                stored_cols = [var_list.index(var_name) for var_name in stored_names]
+                data[:, stored_cols] = self.get_stored_values(stored_names)[:, :, self.options.time_idx].T
             for i, var_name in enumerate(var_list):
-                var_values = getattr(self, var_name).values
+                if var_name in stored_names:
+                    continue
+                var_values = getattr(self, var_name).get_read_only_values()
                 if var_values is not None:
                     data[:, i] = var_values[:, self.options.time_idx]
 
         elif isinstance(self, OutputVariables):
             for i, var_name in enumerate(var_list):
-                data[:, i] = getattr(self, var_name).values
+                data[:, i] = getattr(self, var_name).get_read_only_values()
 
         return data, header
 
+    def _save_data(self, data, header, save_type, scan_factor=None):
+        '''
+        Saves data to the scan store when the scan has one (see scanstore), and otherwise to a CSV
+
+        Parameters:
+        * data (np.ndarray): The data to save
+        * header (str): The names of the variables of the data, separated by commas
+        * save_type (SaveType): The SaveType of the data being saved
+        * scan_factor (float | str): The scan_factor, if doing a parameter scan (optional)
+        '''
+
+        if scan_factor is not None and scanstore.has_store(self.options, save_type):
+            scanstore.save_factor(self.options, save_type, scan_factor, data, header)
+        else:
+            self._save_to_csv(data, header, save_type, scan_factor)
+
     def _save_to_csv(self, data, header, save_type, scan_factor=None, rho_value=None):
         '''
         Saves data in np.ndarray format to a CSV
 
+        The CSV is written in the background when an OutputSink is active (see outputsink).
+
         Parameters:
         * data (np.ndarray): The data to save
         * header (str): The header to be saved to the CSV
@@ -173,7 +439,7 @@ class Variables:
 
         dir_path, file_path = self._get_csv_save_path(save_type, scan_factor, rho_value)
         utils.create_directory(dir_path)
-        np.savetxt(file_path, data, header=header, fmt='%.6e', delimiter=',')
+        outputsink.write(np.savetxt, file_path, data, header=header, fmt='%.6e', delimiter=',')
 
         _log.info(f'\n\tSaved: {file_path}\n')
 
@@ -181,36 +447,67 @@ class Variables:
         '''
         Loads data from a CSV into the current Variables subclass object
 
+        Factors and rho values of scans saved to a scan store are loaded from
+        the store instead, since their CSVs are never written (see load_from_store).
+
         Parameters:
         * save_type (SaveType): The SaveType of the data being saved
         * scan_factor (str | float): The scan_factor, if doing a parameter scan (optional)
         * rho_value (str | float): The rho value of the CSV to use (optional)
         '''
 
+        if (scan_factor is not None or rho_value is not None) and scanstore.has_store(self.options, save_type):
+            self.load_from_store(save_type, scan_factor, rho_value)
+            return
+
         __, file_path = self._get_csv_save_path(save_type, scan_factor, rho_value)
         self.load_from_file_path(file_path)
 
-    def load_from_file_path(self, file_path):
+    def load_from_store(self, save_type, scan_factor=None, rho_value=None):
+        '''
+        Loads data of a single scan factor or rho value from the scan store (see scanstore)
+
+        Values are read-only views of the store, so no values are copied.
+
+        Parameters:
+        * save_type (SaveType): The SaveType of the data being loaded
+        * scan_factor (str | float): The scan_factor to load (optional)
+        * rho_value (str | float): The rho value to load (optional; used instead of scan_factor when specified)
+        '''
+
+        if rho_value is not None:
+            var_names, data = scanstore.load_rho(self.options, save_type, rho_value)
+        else:
+            var_names, data = scanstore.load_factor(self.options, save_type, scan_factor)
+
+        for i, var_name in enumerate(var_names):
+            if hasattr(self, var_name):
+                getattr(self, var_name).values = data[:, i]
+
+        if self.rmin.values is not None:
+            self.set_radius_values()
+
+    def load_from_file_path(self, file_path, use_cache=None):
         '''
         Loads data from a file into the current Variables subclass object
 
         Parameters:
-        * file_path (str): The path of the file to load
+        * file_path (str | file): The path of the file to load, or a file-like object
+        * use_cache (bool): Read and save cached values of the file (optional; see csvreader.read_csv)
 
         Raises:
         * ValueError: If no variable names are loaded
         '''
 
         # TODO: Add check if file exists
-        data_array = np.genfromtxt(file_path, delimiter=',', dtype=float, names=True)
-        var_names = data_array.dtype.names
+        var_names, values = csvreader.read_csv(file_path, use_cache)
 
         if not var_names:
             raise ValueError(f'No variable names were loaded from {file_path}')
 
-        for var_name in var_names:
+        for i, var_name in enumerate(var_names):
             if hasattr(self, var_name):
-                getattr(self, var_name).values = data_array[var_name]
+                getattr(self, var_name).values = values[:, i]
 
         if self.rmin.values is not None:
             self.set_radius_values()
@@ -531,13 +828,13 @@ class InputVariables(Variables):
 
     def get_vars_of_type(self, save_type):
         '''Returns (list of str): List of all variables with the specified save_type'''
-        nonzero_variables = self.get_variables()
-        return [v for v in nonzero_variables if getattr(self, v).save_type == save_type]
+        save_types = self.get_schema()['save_types']
+        return [v for v, v_save_type in save_types.items() if v_save_type == save_type]
 
     def get_cdf_variables(self):
         '''Returns (list of str): List of all variables where cdfvar is not None'''
-        all_variables = self.get_variables()
-        return [v for v in all_variables if getattr(self, v).cdfvar is not None]
+        cdfvars = self.get_schema()['cdfvars']
+        return [v for v, cdfvar in cdfvars.items() if cdfvar is not None]
 
     def get_nboundaries(self):
         '''Returns (int): The number of boundary points in the radial dimension of xb'''
@@ -570,17 +867,25 @@ class InputVariables(Variables):
         * scan_num (int): The scan number of the CSV to use
         * var_to_scan (str): The scanned variable of the CSV to use (optional)
         * scan_factor (scan_factor): The value of the scan factor (optional)
+
+        Returns:
+        * data (np.ndarray): The saved data in a 2-dimensional array
+        * header (str): The string of variable names corresponding to data in the array
         '''
 
-        # Put rmin at the front of the variable list
+        data, header = self.get_data_of_type(save_type)
+        self._save_data(data, header, save_type, scan_factor)
+
+        return data, header
+
+    def get_vars_to_save(self, save_type):
+        '''Returns (list[str]): the variables saved for save_type, in the order they are saved (rmin first)'''
         var_list = self.get_vars_of_type(save_type)
         if 'rmin' not in var_list:
             var_list.insert(0, 'rmin')
         else:
             var_list.insert(0, var_list.pop(var_list.index('rmin')))
-
-        data, header = self._get_data_as_array(var_list)
-        self._save_to_csv(data, header, save_type, scan_factor)
+        return var_list
 
     def save(self, scan_factor=None):
         '''
@@ -592,10 +897,15 @@ class InputVariables(Variables):
         * scan_num (int): The scan number of the CSV to use
         * var_to_scan (str): The scanned variable of the CSV to use (optional)
         * scan_factor (scan_factor): The value of the scan factor (optional)
+
+        Returns:
+        * (dict): Maps each saved SaveType to the saved data and header (see save_vars_of_type)
         '''
 
-        self.save_vars_of_type(SaveType.INPUT, scan_factor)
-        self.save_vars_of_type(SaveType.ADDITIONAL, scan_factor)
+        return {
+            SaveType.INPUT: self.save_vars_of_type(SaveType.INPUT, scan_factor),
+            SaveType.ADDITIONAL: self.save_vars_of_type(SaveType.ADDITIONAL, scan_factor),
+        }
 
 
 class OutputVariables(Variables):
@@ -714,18 +1024,32 @@ class OutputVariables(Variables):
         return [var for var in output_vars if 'W20' in var]
 
     def save(self, scan_factor=None):
-        '''Saves output variables to a CSV (other than rho)'''
+        '''
+        Saves output variables to a CSV (other than rho)
+
+        Returns:
+        * (dict): Maps SaveType.OUTPUT to the saved data and header
+        '''
+
+        data, header = self.get_data_of_type(SaveType.OUTPUT)
+        self._save_data(data, header, SaveType.OUTPUT, scan_factor)
+
+        return {SaveType.OUTPUT: (data, header)}
 
-        # Put rmin at the front of the variable list
+    def get_vars_to_save(self, save_type=SaveType.OUTPUT):
+        '''Returns (list[str]): the variables that are saved, in the order they are saved (rmin first, without rho)'''
         var_list = self.get_variables()
         var_list.insert(0, var_list.pop(var_list.index('rmin')))
         var_list.remove('rho')
-
-        data, header = self._get_data_as_array(var_list)
-        self._save_to_csv(data, header, SaveType.OUTPUT, scan_factor)
+        return var_list
 
 
 class Variable:
+    __slots__ = (
+        'name', 'cdfvar', 'smooth', 'label', 'desc', 'minvalue', 'absminvalue', 'save_type', 'default_values',
+        '_units_label', '_units', '_dimensions', '_values', '_loader', '_shared',
+    )
+
     def __init__(self, name, cdfvar=None, smooth=None, label='', desc='', minvalue=None, absminvalue=None,
                  save_type=None, default_values=1e-16, mmm_label='', units='', dimensions=None, values=None):
         # Public
@@ -744,6 +1068,8 @@ class Variable:
         # self._dimensions = dimensions if dimensions is not None else ['', '']
         self._dimensions = dimensions
         self._values = values
+        self._loader = None  # Deferred loader of values (see set_loader)
+        self._shared = False  # True while values are shared with a copy (see share_values)
 
         self.units = units  # Call units setter to also set units_label
 
@@ -786,19 +1112,89 @@ class Variable:
 
     @property
     def values(self):
-        return self._values if self._values is not None else self.default_values
+        if self._loader is not None:
+            self._values = self._loader()
+            self._loader = None
+        if self._values is None:
+            return self.default_values
+        if self._shared:
+            # Every later access returns the same copy, so all aliases of values refer to the same array
+            self._values = self._values.copy()
+            self._shared = False
+        return self._values
 
     @values.setter
     def values(self, values):
         if not isinstance(values, np.ndarray):
             raise ValueError(f'Variable values must be type {np.ndarray} and not {type(values)}')
         self._values = values
+        self._loader = None
+        self._shared = False
+
+    def set_loader(self, loader):
+        '''
+        Defers loading values until values are first accessed
+
+        Parameters:
+        * loader (callable): Called without arguments to get the values (np.ndarray)
+        '''
+        self._values = None
+        self._loader = loader
+        self._shared = False
+
+    def is_loaded(self):
+        '''Returns (bool): False if values have been deferred and not yet loaded'''
+        return self._loader is None
+
+    def is_shared(self):
+        '''Returns (bool): True if values are shared with a copy, and will be copied when values is next accessed'''
+        return self._shared
+
+    def share_values(self):
+        '''
+        Shares values with a copy of the variable (see copy_on_write)
+
+        Shared values are made read-only, and are replaced with a copy the
+        next time values is accessed.  Call share_values on both the
+        variable and its copy.
+        '''
+
+        if isinstance(self._values, np.ndarray):
+            self._values.flags.writeable = False
+            self._shared = True
+
+    def get_read_only_values(self):
+        '''
+        Gets values that are only read, without copying shared values
+
+        Returns:
+        * (np.ndarray | float | None): Read-only values, or the default values when values are not set
+        '''
+
+        if self._shared:
+            return self._values  # Shared values are read-only
+
+        values = self.values
+        if isinstance(values, np.ndarray):
+            values = values.view()
+            values.flags.writeable = False
+
+        return values
 
     def set(self, **kwargs):
         '''Sets members using keyword arguments'''
         for key, value in kwargs.items():
             setattr(self, key, value)
 
+    def get_members(self):
+        '''Returns (dict): all members of the variable (including private members), keyed by name'''
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def set_members(self, members):
+        '''Sets (dict): members of the variable (including private members), keyed by name'''
+        for name, value in members.items():
+            setattr(self, name, value)
+
     def apply_smoothing(self):
         '''
         Variable smoothing using a Gaussian filter
@@ -819,12 +1215,13 @@ class Variable:
         rmin = 1.
         '''
 
-        if self.smooth is not None and isinstance(self.values, np.ndarray):
-            sigma = int(self.values.shape[0] * self.smooth / 100)
-            if self.values.ndim == 2:
-                self.values = scipy.ndimage.gaussian_filter(self.values, sigma=(sigma, 0))
+        values = self.get_read_only_values()  # Smoothed values replace the values, so shared values are not copied
+        if self.smooth is not None and isinstance(values, np.ndarray):
+            sigma = int(values.shape[0] * self.smooth / 100)
+            if values.ndim == 2:
+                self.values = scipy.ndimage.gaussian_filter(values, sigma=(sigma, 0))
             else:
-                self.values = scipy.ndimage.gaussian_filter(self.values, sigma=sigma)
+                self.values = scipy.ndimage.gaussian_filter(values, sigma=sigma)
 
     def set_minvalue(self, ignore_exceptions=False):
         '''
@@ -861,7 +1258,9 @@ class Variable:
                     f'    time indices:  {idx_list}\n'
                 )
             # When an exception is not raised, fix the minimum value
-            self.values[self.values < self.minvalue] = self.minvalue
+            too_small = self.values < self.minvalue
+            if too_small.any():
+                self.values[too_small] = self.minvalue
 
         if self.absminvalue is not None and isinstance(self.values, np.ndarray):
             too_small = np.absolute(self.values) < self.absminvalue
@@ -872,8 +1271,9 @@ class Variable:
 
     def clamp_values(self, clamp_value):
         '''Clamps values between -clamp_value and +clamp_value'''
-        self.values[self.values > clamp_value] = clamp_value
-        self.values[self.values < -clamp_value] = -clamp_value
+        if (np.absolute(self.values) > clamp_value).any():
+            self.values[self.values > clamp_value] = clamp_value
+            self.values[self.values < -clamp_value] = -clamp_value
 
     def set_origin_to_zero(self):
         '''
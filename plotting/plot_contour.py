@@ -92,16 +92,6 @@ def run_plotting_loop(vars_to_plot, options, savenameend='', savefig=False, save
 
         return obj
 
-    def get_var_to_plot_data(name):
-        """Get dictionaries of data corresponding to each rho point"""
-        obj = None
-        if hasattr(output_vars, name):
-            obj = output_vars_rho
-        elif hasattr(input_vars, name):
-            obj = input_vars_rho
-
-        return obj
-
     def get_vmax_vmin():
         """Get the maximum and minimum values to display"""
         Zmax, Zmin = np.inf, -np.inf
@@ -243,16 +233,10 @@ def run_plotting_loop(vars_to_plot, options, savenameend='', savefig=False, save
     var_to_scan = options.var_to_scan
     adjustment_name = options.adjustment_name or options.var_to_scan
 
-    input_vars_rho, output_vars_rho, controls_rho = datahelper.get_all_rho_data(options)
     input_vars, output_vars, controls = datahelper.get_data_objects(options)
 
-    rho_strs = input_vars_rho.keys()
     xbase = get_base_data(var_to_scan)
-
-    x = np.array(list(output_vars_rho.keys()), dtype=float)
     y = options.scan_range
-    X, Y = np.meshgrid(x, y)
-    Z = np.zeros_like(X)
 
     for var_to_plot in vars_to_plot:
 
@@ -266,7 +250,6 @@ def run_plotting_loop(vars_to_plot, options, savenameend='', savefig=False, save
             continue  # nothing to plot (this can happen when using 'var_to_scan')
 
         ybase = get_base_data(var_to_plot)
-        ydata = get_var_to_plot_data(var_to_plot)
 
         if not isinstance(ybase.values, np.ndarray):
             # Contours need to be np.ndarray. This can happen when using the
@@ -277,8 +260,9 @@ def run_plotting_loop(vars_to_plot, options, savenameend='', savefig=False, save
 
         print(f'- {options.scan_num}, {var_to_plot}')
 
-        for i, rho_str in enumerate(rho_strs):
-            Z[:, i] = getattr(ydata[rho_str], var_to_plot).values
+        # Values of every factor and rho value, shape (factor, rho)
+        x, Z = datahelper.get_scan_values(options, var_to_plot)
+        X, Y = np.meshgrid(x, y)
 
         if np.isnan(Z).any():
             # This can happen due to calculation errors or or when loading
@@ -38,6 +38,7 @@ from PyQt5.QtWidgets import QApplication
 import modules.options
 import modules.constants as constants
 import modules.datahelper as datahelper
+import modules.cdfreader as cdfreader
 import modules.utils as utils
 from modules.enums import SaveType
 from plotting.modules.plotstyles import PlotStyles, StyleType
@@ -203,17 +204,17 @@ class PlotDataCdf(PlotData):
             runid=runid, input_time=input_time, input_points=input_points,
             ignore_exceptions=True, apply_smoothing=apply_smoothing
         )
-        mmm_vars, cdf_vars, raw_vars = datahelper.initialize_variables(options)
 
         if xname is None:
             xname = 'rho' if not timeplot else 'time'
 
         if source == 'mmm':
-            plot_vars = mmm_vars
+            plot_vars, __, __ = datahelper.initialize_variables(options)
         elif source == 'cdf':
-            plot_vars = cdf_vars
+            __, plot_vars, __ = datahelper.initialize_variables(options)
         elif source == 'raw':
-            plot_vars = raw_vars
+            # Raw values need no conversions, so only values of the plotted variables are read from the CDF
+            plot_vars = cdfreader.extract_data(options, lazy=True)
         else:
             raise ValueError(f'{source} is not a valid source value (use source = mmm, cdf, or raw)')
 
@@ -67,7 +67,6 @@ def run_plotting_loop(vars_to_plot, options):
     var_to_scan = options.var_to_scan
     scan_type = options.scan_type
 
-    input_vars_dict, output_vars_dict, input_controls = datahelper.get_all_rho_data(options)
     base_input_vars, base_output_vars, base_input_controls = datahelper.get_data_objects(options)
 
 
@@ -81,20 +80,12 @@ def run_plotting_loop(vars_to_plot, options):
     for var_to_plot in vars_to_plot:
         print(f'Creating scanned variable PDF for {var_to_plot} vs {var_to_scan}...')
 
-        # rho_strs are the same for both input and output variables
-        rho_strs = input_vars_dict.keys()
         profile_type = f'{var_to_plot}_{var_to_scan}'
         ybase = getattr(base_output_vars, var_to_plot)
 
-        keys = list(output_vars_dict.keys())
-        keysarray = np.array(keys, dtype=float)
-
-        im = np.zeros((len(rho_strs), getattr(output_vars_dict[keys[0]], var_to_plot).values.shape[0]))
-
-
-        for i, rho_str in enumerate(rho_strs):
-            im[i, :] = getattr(output_vars_dict[rho_str], var_to_plot).values
-            # print(rho_str, im[i, :])
+        # Values of every rho value and factor, shape (rho, factor)
+        keysarray, values = datahelper.get_scan_values(options, var_to_plot)
+        im = values.T
 
         # im[im<1]=0
         # np.set_printoptions(threshold=np.inf)
@@ -90,28 +90,17 @@ if __name__ == '__main__':
     input_vars_base, output_vars_base, __ = datahelper.get_data_objects(options_base)
     input_vars_gne, output_vars_gne, __ = datahelper.get_data_objects(options_gne)
     input_vars_gte, output_vars_gte, __ = datahelper.get_data_objects(options_gte)
-    input_vars_dict_gne, output_vars_dict_gne, __ = datahelper.get_all_rho_data(options_gne)
-    input_vars_dict_gte, output_vars_dict_gte, __ = datahelper.get_all_rho_data(options_gte)
     num_points_gne = options_gne.input_points
     num_points_gte = options_gte.input_points
-    num_scans_gne = options_gne.scan_range.size
-    num_scans_gte = options_gte.scan_range.size
 
-    gmaETGM_gne = np.zeros((num_points_gne, num_scans_gne))
-    gmaETGM_gte = np.zeros((num_points_gte, num_scans_gte))
-    gte = np.zeros_like(gmaETGM_gte)
-    gne = np.zeros_like(gmaETGM_gne)
+    # Values of every rho value and factor, shape (rho, factor)
+    gmaETGM_gne = datahelper.get_scan_values(options_gne, 'gmaETGM')[1].T
+    gmaETGM_gte = datahelper.get_scan_values(options_gte, 'gmaETGM')[1].T
+    gte = datahelper.get_scan_values(options_gte, 'gte')[1].T
+    gne = datahelper.get_scan_values(options_gne, 'gne')[1].T
     gte_threshold = np.zeros((num_points_gte))
     gne_threshold = np.zeros((num_points_gne))
 
-    rho_strs = input_vars_dict_gne.keys()
-
-    for i, rho_str in enumerate(rho_strs):
-        gmaETGM_gne[i, :] = getattr(output_vars_dict_gne[rho_str], 'gmaETGM').values
-        gmaETGM_gte[i, :] = getattr(output_vars_dict_gte[rho_str], 'gmaETGM').values
-        gte[i, :] = getattr(input_vars_dict_gte[rho_str], 'gte').values
-        gne[i, :] = getattr(input_vars_dict_gne[rho_str], 'gne').values
-
     gmaETGM_gne_bool = gmaETGM_gne < threshold
     gmaETGM_gte_bool = gmaETGM_gte < threshold
 
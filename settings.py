@@ -1,4 +1,4 @@
-# MMM Driver path (USE FORWARDSLASHES)
+# MMM Driver path (USE FORWARDSLASHES), or a list of command arguments to run the driver
 MMM_DRIVER_PATH = 'C:/cygwin64/home/metxc/mmmdev/wrapper/mmm.exe'
 
 # Make Profile PDFS when running scans
@@ -12,3 +12,31 @@ PRINT_SAVE_MESSAGES = False
 
 # Print non-error responses from MMM
 PRINT_MMM_RESPONSE = False
+
+# Number of worker processes used to run scan factors (None to use all available cores)
+SCAN_WORKERS = None
+
+# Run MMM cases through one resident MMM wrapper process per scan worker (requires persistent mode in the wrapper)
+MMM_PERSISTENT_WORKERS = False
+
+# Exchange variable values with MMM using binary files instead of text files (requires binary_io support in the wrapper)
+MMM_BINARY_IO = False
+
+# Reuse results of previous MMM runs with identical inputs, controls, and driver (clear the cache after rebuilding MMM)
+USE_RESULT_CACHE = False
+
+# Maximum size of cached MMM results in MB (least recently used results are removed first)
+RESULT_CACHE_MAX_MB = 500
+
+# Reuse variables that were previously initialized from the same CDF and options
+USE_CDF_CACHE = False
+
+# Save a binary copy of each CSV of variable data when it is first read, which is read instead of the unchanged CSV
+# (copies are saved to a __cache__ folder next to each CSV)
+USE_CSV_CACHE = False
+
+# Maximum number of files waiting to be written in the background during a scan (0 to write files immediately)
+OUTPUT_QUEUE_SIZE = 16
+
+# Maximum number of variable scan factors ran together in a single run of MMM (1 to run each factor separately)
+SCAN_PACK_SIZE = 1
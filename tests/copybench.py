@@ -0,0 +1,50 @@
+# Standard Packages
+import sys
+sys.path.insert(0, '../')
+from copy import deepcopy
+from timeit import repeat
+
+# 3rd Party Packages
+import numpy as np
+
+# Local Packages
+import modules.variables as variables
+import modules.datahelper as datahelper
+from modules.options import Options
+
+
+def deepcopy_vars(input_vars):
+    '''Previous copy path: a deepcopy of every variable and its values'''
+    new_vars = deepcopy(input_vars)
+    new_vars.options = input_vars.options
+    return new_vars
+
+
+def adjust_te(input_vars, copy_vars):
+    '''Copies variables and then adjusts te in place, as done by a simple variable scan'''
+    adjusted_vars = copy_vars(input_vars)
+    adjusted_vars.te.values *= 2
+    return adjusted_vars
+
+
+# Large CDF: every variable has 201 input points and 2000 time values
+options = Options(runid='TEST', input_points=201)
+input_vars = variables.InputVariables(options)
+for var_name in input_vars.get_variables():
+    getattr(input_vars, var_name).values = np.random.rand(201, 2000)
+
+deep_vars = adjust_te(input_vars, deepcopy_vars)
+cow_vars = adjust_te(input_vars, datahelper.deepcopy_data)
+assert all(
+    np.array_equal(getattr(deep_vars, var_name).values, getattr(cow_vars, var_name).get_read_only_values())
+    for var_name in input_vars.get_variables()
+)
+
+memory_usage = cow_vars.get_memory_usage()
+print(f'variables = {len(input_vars.get_variables())}, values = {201 * 2000} per variable')
+print(f'  deepcopy memory:      {sum(memory_usage.values()) / 1024**2:.1f} MB')
+print(f'  copy-on-write memory: {memory_usage["owned"] / 1024**2:.1f} MB ({memory_usage["shared"] / 1024**2:.1f} MB shared)')
+
+t1 = np.array(repeat(lambda: adjust_te(input_vars, deepcopy_vars), number=3, repeat=3))
+t2 = np.array(repeat(lambda: adjust_te(input_vars, datahelper.deepcopy_data), number=3, repeat=3))
+print('  copy speed ratio', t1.min() / t2.min())
@@ -0,0 +1,65 @@
+# Standard Packages
+import sys
+sys.path.insert(0, '../')
+import os
+import glob
+import shutil
+import tempfile
+from timeit import repeat
+
+# 3rd Party Packages
+import numpy as np
+
+# Local Packages
+import modules.csvreader as csvreader
+
+
+def read_genfromtxt(file_path):
+    '''Previous read path: np.genfromtxt with the names of the header'''
+    data_array = np.genfromtxt(file_path, delimiter=',', dtype=float, names=True)
+    return data_array.dtype.names, data_array
+
+
+def read_all(file_paths, read_file):
+    '''Reads every file, as done when plotting all rho files of a scan'''
+    return [read_file(file_path) for file_path in file_paths]
+
+
+# Large scan directory: 201 rho files, each with 100 factors of 60 variables (or the rho folder given)
+if len(sys.argv) > 1:
+    scan_dir = None
+    file_paths = sorted(glob.glob(os.path.join(sys.argv[1], '*.csv')))
+else:
+    scan_dir = tempfile.mkdtemp()
+    var_names = ['rmin'] + [f'var{i}' for i in range(59)]
+    for rho in np.linspace(0, 1, 201):
+        np.savetxt(
+            os.path.join(scan_dir, f'Output rho = {rho:.3f}.csv'), np.random.rand(100, len(var_names)) * 1e5,
+            fmt='%.4e', delimiter=',', header=','.join(var_names),
+        )
+    file_paths = sorted(glob.glob(os.path.join(scan_dir, '*.csv')))
+
+try:
+    for file_path in file_paths:
+        names, data_array = read_genfromtxt(file_path)
+        var_names, values = csvreader.read_csv(file_path, use_cache=True)  # Populates the cache
+        assert tuple(var_names) == names
+        assert all(np.array_equal(data_array[name], values[:, i], equal_nan=True) for i, name in enumerate(names))
+
+    print(f'files = {len(file_paths)}')
+    t1 = np.array(repeat(lambda: read_all(file_paths, read_genfromtxt), number=1, repeat=3))
+    t2 = np.array(repeat(
+        lambda: read_all(file_paths, lambda f: csvreader.read_csv(f, use_cache=False)), number=1, repeat=3,
+    ))
+    t3 = np.array(repeat(
+        lambda: read_all(file_paths, lambda f: csvreader.read_csv(f, use_cache=True)), number=1, repeat=3,
+    ))
+    print(f'  genfromtxt:       {t1.min():.3f} s')
+    print(f'  csvreader:        {t2.min():.3f} s (speed ratio {t1.min() / t2.min():.1f})')
+    print(f'  csvreader cached: {t3.min():.3f} s (speed ratio {t1.min() / t3.min():.1f})')
+finally:
+    # Removes the generated CSVs, or the cached CSVs of the rho folder given
+    if scan_dir is not None:
+        shutil.rmtree(scan_dir)
+    else:
+        csvreader.clear_cache(sys.argv[1])
@@ -0,0 +1,43 @@
+# Standard Packages
+import sys
+sys.path.insert(0, '../')
+from timeit import repeat
+
+# 3rd Party Packages
+import numpy as np
+from scipy.interpolate import interp1d
+
+# Local Packages
+import modules.interpolation as interpolation
+
+
+def interp_per_variable(x, values_list, x_new):
+    '''Previous conversion path: a new interp1d spline for each variable'''
+    return [interp1d(x, values, kind='cubic', fill_value="extrapolate", axis=0)(x_new) for values in values_list]
+
+
+def interp_stacked(x, values_list, x_new):
+    '''Batched conversion path: cached weights applied to all variables at once'''
+    return interpolation.interp_stacked(x, values_list, x_new)
+
+
+# Typical TRANSP run: 100 variables on XB, interpolated to XBO and then to 201 input points
+xb = np.linspace(0.01, 1, 50)
+xbo = np.append([0], xb)
+xb_new = np.arange(201) / 200
+
+for ntimes in [1, 100, 2000]:
+    values_list = [np.random.rand(xb.size, ntimes) for __ in range(100)]
+
+    slow = interp_per_variable(xb, values_list, xbo)
+    fast = interp_stacked(xb, values_list, xbo)
+    max_error = max(np.abs(s - f).max() for s, f in zip(slow, fast))
+
+    t1 = np.array(repeat(lambda: interp_per_variable(xb, values_list, xbo), number=5, repeat=3))
+    t2 = np.array(repeat(lambda: interp_stacked(xb, values_list, xbo), number=5, repeat=3))
+    t3 = np.array(repeat(lambda: interp_per_variable(xbo, slow, xb_new), number=5, repeat=3))
+    t4 = np.array(repeat(lambda: interp_stacked(xbo, slow, xb_new), number=5, repeat=3))
+
+    print(f'times = {ntimes}, max error = {max_error:.2e}')
+    print('  XB -> XBO speed ratio', t1.min() / t2.min())
+    print('  XBO -> input points speed ratio', t3.min() / t4.min())
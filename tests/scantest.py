@@ -0,0 +1,253 @@
+# Standard Packages
+import sys
+sys.path.insert(0, '../')
+import os
+import copy
+
+# 3rd Party Packages
+import numpy as np
+
+# Local Packages
+import settings
+import modules.mmm as mmm
+import modules.utils as utils
+import modules.adaptive as adaptive
+import modules.multiscan as multiscan
+import modules.scanstore as scanstore
+import modules.variables as variables
+import modules.datahelper as datahelper
+import modules.adjustments as adjustments
+import modules.calculations as calculations
+from modules.controls import InputControls
+from modules.options import Options
+from modules.enums import SaveType
+
+
+# The stub of the MMM wrapper is ran instead of MMM, so that results only depend on this package
+settings.MMM_DRIVER_PATH = [sys.executable, f'{os.path.dirname(os.path.abspath(__file__))}/../wrapper/mmm_stub.py']
+settings.MMM_PERSISTENT_WORKERS = False
+settings.USE_RESULT_CACHE = False
+settings.SCAN_WORKERS = 1
+
+
+def get_input_vars(options):
+    '''Returns (InputVariables): variables calculated from random values at 3 times, using time_idx = 1'''
+    np.random.seed(0)
+    options.time_idx = 1
+    input_vars = variables.InputVariables(options)
+    for var_name in input_vars.get_variables():
+        getattr(input_vars, var_name).values = np.random.rand(options.input_points, 3) + 1
+    input_vars.rmin.values = np.tile(np.linspace(0, 1, options.input_points)[:, np.newaxis], (1, 3))
+    input_vars.xb.values = np.tile(np.linspace(0, 1, options.input_points)[:, np.newaxis], (1, 3))
+    input_vars.x.values = (input_vars.xb.values[1:] + input_vars.xb.values[:-1]) / 2
+    input_vars.ne.values *= 10
+    input_vars.nh0.values = input_vars.ne.values * 0.5
+    return calculations.calculate_new_variables(input_vars)
+
+
+def get_scan_vars(input_vars, **options_values):
+    '''Returns (InputVariables): a shallow copy of input_vars using a copy of its options with options_values set'''
+    scan_vars = copy.copy(input_vars)
+    scan_vars.options = copy.copy(input_vars.options)
+    scan_vars.options.set(**options_values)
+    return scan_vars
+
+
+def adjust_nuei_loop(mmm_vars, scan_factor):
+    '''Previous nuei adjustment: ne and te are adjusted in steps until nuei is adjusted by the scan factor'''
+    t = mmm_vars.options.time_idx
+    r = adjustments._get_nonzero_idx(mmm_vars.nuei.values[:, t])
+    adjusted_vars = datahelper.deepcopy_data(mmm_vars)
+    adjustment_total = scan_factor**(-2 / 5)
+    adjustment_step = adjustment_total
+    for i in range(adjustments.MAX_ADJUSTMENT_ATTEMPTS):
+        adjusted_vars.ne.values /= adjustment_step
+        adjusted_vars.te.values *= adjustment_step
+        calculations.loge(adjusted_vars)
+        calculations.nuei(adjusted_vars)
+        current_factor = adjusted_vars.nuei.values[r, t] / mmm_vars.nuei.values[r, t]
+        if abs(current_factor / scan_factor - 1) < adjustments.SCAN_FACTOR_TOLERANCE:
+            break
+        adjustment_step = 1 + (current_factor - scan_factor) / (2 * scan_factor)
+        adjustment_total *= adjustment_step
+    return adjusted_vars, adjustment_total
+
+
+def assert_outputs_equal(output_vars, expected_vars):
+    '''Asserts that every output variable of MMM has the same values in both OutputVariables objects'''
+    for var_name in expected_vars.get_nonzero_variables():
+        values = getattr(expected_vars, var_name).values
+        if isinstance(values, np.ndarray) and values.ndim > 0:
+            assert np.allclose(getattr(output_vars, var_name).values, values, rtol=1e-6), var_name
+
+
+def packed_run_test(input_vars, controls):
+    '''Runs scan factors packed into one run of MMM, and compares them to one run of MMM per factor'''
+    scan_vars = get_scan_vars(input_vars, adjustment_name='te')
+    factor_vars = [adjustments.adjust_scanned_variable(scan_vars, factor) for factor in [0.5, 1, 2]]
+    packed_output_vars = mmm.run_wrapper_packed(factor_vars, controls)
+    for adjusted_vars, output_vars in zip(factor_vars, packed_output_vars):
+        assert_outputs_equal(output_vars, mmm.run_wrapper(adjusted_vars, controls))
+
+
+def scan_store_test(options):
+    '''Saves factors to a scan store in any order, and loads them by factor, rho value, and variable'''
+    options = copy.copy(options)
+    options.set(adjustment_name='gte', scan_range=np.array([0.5, 1, 2, 4]), scan_store=True)
+    utils.init_output_dirs(options)
+    var_names = ['rmin', 'a', 'b']
+    factor_data = {factor: np.random.rand(options.input_points, len(var_names)) for factor in [2, 0.5, 4]}
+
+    scanstore.create_store(options, SaveType.OUTPUT, var_names)
+    for factor, data in factor_data.items():
+        scanstore.save_factor(options, SaveType.OUTPUT, factor, data, ','.join(var_names))
+    scanstore.close_stores()
+
+    for factor, data in factor_data.items():
+        assert np.array_equal(scanstore.load_factor(options, SaveType.OUTPUT, factor)[1], data)
+    rho_str = scanstore.get_rho_strings(options, SaveType.OUTPUT)[3]
+    assert np.array_equal(scanstore.load_rho(options, SaveType.OUTPUT, rho_str)[1][[3, 0, 2]],
+                          np.array([factor_data[factor][3] for factor in [4, 0.5, 2]]))
+    assert np.isnan(scanstore.load_variable(options, SaveType.OUTPUT, 'b')[1]).all()
+    try:
+        scanstore.load_factor(options, SaveType.OUTPUT, 1)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('Loading a factor that was not saved should raise ValueError')
+
+    assert np.array_equal(scanstore.remove_unsaved_factors(options, SaveType.OUTPUT), [0.5, 2, 4])
+    assert np.array_equal(scanstore.load_variable(options, SaveType.OUTPUT, 'b'),
+                          np.array([factor_data[factor][:, 2] for factor in [0.5, 2, 4]]))
+    scanstore.close_stores()
+
+
+def copy_on_write_test(input_vars):
+    '''Modifies values of both a copy-on-write copy and the original, including writes through aliases of values'''
+    te_values, ne_values = input_vars.te.values.copy(), input_vars.ne.values.copy()
+    new_vars = datahelper.deepcopy_data(input_vars)
+    assert new_vars.te.is_shared() and input_vars.te.is_shared()
+    assert np.shares_memory(new_vars.te.get_read_only_values(), input_vars.te.get_read_only_values())
+
+    new_vars.te.values *= 2
+    new_vars.ne.values[:, 0][new_vars.ne.values[:, 0] > 0] = 0
+    assert np.array_equal(input_vars.te.values, te_values) and np.array_equal(input_vars.ne.values, ne_values)
+    assert np.array_equal(new_vars.te.values, te_values * 2) and not new_vars.ne.values[:, 0].any()
+
+    input_vars.ne.values[:, 1][:2] = 0
+    assert not input_vars.ne.values[:2, 1].any()
+    assert np.array_equal(new_vars.ne.values[:, 1], ne_values[:, 1])
+    input_vars.ne.values = ne_values
+
+    # An alias taken before the first write sees the write
+    new_vars = datahelper.deepcopy_data(input_vars)
+    values = new_vars.te.values
+    values[values < np.median(values)] = 100
+    assert np.array_equal(new_vars.te.values, values) and np.array_equal(input_vars.te.values, te_values)
+
+    # Aliases taken before the first write are all writeable, and refer to the same values
+    new_vars = datahelper.deepcopy_data(input_vars)
+    a, b = new_vars.ne.values, new_vars.ne.values
+    a[0, 0], b[1, 0] = -1, -2
+    assert new_vars.ne.values[0, 0] == -1 and new_vars.ne.values[1, 0] == -2
+    assert np.array_equal(input_vars.ne.values, ne_values)
+
+
+def nuei_secant_test(input_vars):
+    '''Adjusts nuei using the secant solver, for each factor and as a batch, and compares it to the previous loop'''
+    scan_vars = get_scan_vars(input_vars, adjustment_name='nuei_alphaconst')
+    factors = np.array([1.5, 2, 5, 10])
+    batch_vars = adjustments.adjust_scanned_variables(scan_vars, factors)
+    t = scan_vars.options.time_idx
+    for i, factor in enumerate(factors):
+        loop_vars, __ = adjust_nuei_loop(scan_vars, factor)
+        adjusted_vars = adjustments.adjust_scanned_variable(scan_vars, factor)
+        assert np.allclose(adjusted_vars.ne.values[:, t], loop_vars.ne.values[:, t], rtol=1e-3)
+        assert np.allclose(adjusted_vars.nuei.values[:, t], factor * scan_vars.nuei.values[:, t], rtol=1e-3)
+        assert np.allclose(adjustments.get_stacked_values(batch_vars, 'nuei')[:, i], adjusted_vars.nuei.values[:, t])
+
+
+def changed_variables_test(input_vars):
+    '''Changes each variable read by calculations, and compares recalculating its dependents to recalculating all'''
+    dependencies = set().union(*calculations.get_dependency_graph().values())
+    calculated_vars = set(sum(calculations.get_calculation_order(), []))
+    for var_name in sorted(dependencies - calculated_vars):
+        changed_vars = datahelper.deepcopy_data(input_vars)
+        getattr(changed_vars, var_name).values = getattr(input_vars, var_name).values * 1.1
+        full_vars = datahelper.deepcopy_data(changed_vars)
+
+        calculations.calculate_changed_variables(changed_vars, [var_name], gradients=True)
+        calculations.calculate_base_variables(full_vars)
+        calculations.calculate_gradient_variables(full_vars)
+        calculations.calculate_additional_variables(full_vars)
+
+        for name in full_vars.get_nonzero_variables():
+            values = getattr(full_vars, name).values
+            if isinstance(values, np.ndarray):
+                assert np.allclose(getattr(changed_vars, name).values, values, equal_nan=True), (var_name, name)
+
+
+def threshold_test(input_vars, controls):
+    '''Bisects the threshold of gmaETGM in gte, and compares it to the crossing found by running every factor'''
+    factors = np.linspace(0.05, 5, 21)
+    scan_vars = get_scan_vars(input_vars, adjustment_name='gte', threshold_var='gmaETGM', scan_range=factors,
+                              threshold_value=0, threshold_tolerance=1e-3)
+    thresholds = adaptive.find_thresholds(scan_vars, controls)
+
+    # gmaETGM of the stub is linear in gte, so linear interpolation between factors finds the exact crossing
+    values = np.array([
+        mmm.run_wrapper(adjustments.adjust_scanned_variable(scan_vars, factor), controls).gmaETGM.values
+        for factor in factors
+    ])
+    expected = np.full(values.shape[1], np.nan)
+    for i, point_values in enumerate(values.T):
+        crossing_idxs = np.flatnonzero((point_values[1:] >= 0) != (point_values[:-1] >= 0))
+        if crossing_idxs.size:
+            j = crossing_idxs[0]
+            weight = point_values[j] / (point_values[j] - point_values[j + 1])
+            expected[i] = factors[j] + weight * (factors[j + 1] - factors[j])
+
+    assert np.array_equal(np.isnan(thresholds['factor']), np.isnan(expected))
+    assert np.allclose(thresholds['factor'], expected, atol=1e-3, equal_nan=True)
+
+
+def multiscan_test(input_vars, controls):
+    '''Runs a gte x gne scan, and compares each point of the store to running its factors one after another'''
+    axes = {'gte': np.array([0.5, 1, 2]), 'gne': np.array([0.5, 2])}
+    scan_vars = get_scan_vars(input_vars, scan_axes=axes)
+    multiscan.execute_scan(scan_vars, controls)
+
+    values = multiscan.load_variable(scan_vars.options, SaveType.OUTPUT, 'gmaETGM')
+    assert values.shape == (3, 2, scan_vars.options.input_points)
+    for point_idx, (gte_factor, gne_factor) in enumerate(multiscan.get_scan_points(scan_vars.options)):
+        i, j = np.flatnonzero(axes['gte'] == gte_factor)[0], np.flatnonzero(axes['gne'] == gne_factor)[0]
+        assert np.unravel_index(point_idx, values.shape[:2]) == (i, j)
+        gte_vars = adjustments.adjust_scanned_variable(get_scan_vars(input_vars, adjustment_name='gte'), gte_factor)
+        gne_vars = adjustments.adjust_scanned_variable(get_scan_vars(gte_vars, adjustment_name='gne'), gne_factor)
+        assert np.allclose(values[i, j], mmm.run_wrapper(gne_vars, controls).gmaETGM.values, rtol=1e-6)
+    scanstore.close_stores()
+
+
+if __name__ == '__main__':
+    options = Options(runid='TEST', input_points=11, apply_smoothing=True, ignore_exceptions=True)
+    options.scan_num = utils.get_scan_num(options.runid)
+    utils.init_output_dirs(options)
+    input_vars = get_input_vars(options)
+    controls = InputControls(options)
+    controls.cmodel_etgm.values = 0  # Output calculations of ETGM and MTM need outputs that the stub does not write
+    controls.cmodel_mtm.values = 0
+
+    try:
+        for test, args in [
+            (packed_run_test, (input_vars, controls)),
+            (scan_store_test, (options,)),
+            (copy_on_write_test, (input_vars,)),
+            (nuei_secant_test, (input_vars,)),
+            (changed_variables_test, (input_vars,)),
+            (threshold_test, (input_vars, controls)),
+            (multiscan_test, (input_vars, controls)),
+        ]:
+            test(*args)
+            print(f'{test.__name__} passed')
+    finally:
+        utils.remove_directory(utils.get_scan_num_path(options.runid, options.scan_num))
@@ -0,0 +1,193 @@
+"""Stub of the MMM wrapper for testing without MMM
+
+The stub reads input in the same format as the MMM wrapper and writes output
+in the same format, but output values are simple functions of the input
+values and have no physical meaning.  Both run modes of the wrapper are
+supported:
+* Single: reads the file named input and writes output.csv to the working directory,
+  or reads input.bin and writes output.bin when binary_io is enabled
+* Persistent: reads cases from stdin until stdin is closed, and writes the
+  results of each case to stdout between '#begin_output' and '#end_output'
+  ('#end_output' is also written to stderr at the end of each case)
+
+Example Usage:
+    # Use the stub in place of the MMM wrapper
+    settings.MMM_DRIVER_PATH = [sys.executable, 'path/to/wrapper/mmm_stub.py']
+
+    # Run the stub in persistent mode from a terminal
+    python mmm_stub.py persistent < input
+"""
+
+# Standard Packages
+import sys
+
+# 3rd Party Packages
+import numpy as np
+
+
+OUTPUT_NAMES = [
+    'rmin', 'xti', 'xdi', 'xte', 'xdz', 'xvt', 'xvp', 'xtiW20', 'xdiW20', 'xteW20', 'xtiDBM', 'xdiDBM',
+    'xteDBM', 'xteETG', 'xteMTM', 'xteETGM', 'xdiETGM', 'gmaW20ii', 'omgW20ii', 'gmaW20ie', 'omgW20ie',
+    'gmaW20ei', 'omgW20ei', 'gmaW20ee', 'omgW20ee', 'gmaDBM', 'omgDBM', 'gmaMTM', 'omgMTM', 'gmaETGM',
+    'omgETGM', 'dbsqprf',
+]
+
+OUTPUT_UNITS = ['m'] + ['m^2/s'] * 16 + ['s^-1'] * 14 + ['']
+
+# Input variables of the binary input file, in order
+BINARY_INPUT_NAMES = [
+    'rmin', 'rmaj', 'elong', 'ne', 'nh', 'nz', 'nf', 'zeff', 'te', 'ti', 'q', 'btor', 'zimp', 'aimp', 'ahyd',
+    'aimass', 'wexbs', 'gne', 'gni', 'gnh', 'gnz', 'gte', 'gti', 'gq', 'gvtor', 'vtor', 'gvpol', 'vpol', 'gvpar',
+    'vpar',
+]
+
+BINARY_MAGIC = 1296911682
+BINARY_VERSION = 1
+BINARY_HEADER_DTYPE = np.dtype([('magic', '<i4'), ('version', '<i4'), ('npoints', '<i4'), ('nvars', '<i4')])
+
+
+def parse_namelist(lines):
+    '''
+    Parses the values of a single namelist group
+
+    Parameters:
+    * lines (list[str]): Lines of the namelist group, without the closing '/'
+
+    Returns:
+    * values (dict): Maps names in the namelist to lists of float values
+    '''
+
+    values, name = {}, None
+    for line in lines:
+        line = line.split('!')[0].strip()
+        if line.startswith('&'):
+            line = line.split(maxsplit=1)[1] if ' ' in line else ''
+        if '=' in line:
+            name, line = line.split('=', 1)
+            name = name.strip()
+            values[name] = []
+        if name is not None:
+            values[name] += [float(v.replace('D', 'E')) for v in line.split()]
+
+    return values
+
+
+def get_outputs(values):
+    '''
+    Gets stub output values from input values
+
+    Parameters:
+    * values (dict): Maps input variable names to lists of values
+
+    Returns:
+    * (np.ndarray): Output values, with shape (npoints, number of outputs)
+    '''
+
+    npoints = int(values['npoints'][0])
+    get = lambda name: np.array(values[name]) if name in values else np.zeros(npoints)
+
+    te, ti, gte, gti, gne, q = get('te'), get('ti'), get('gte'), get('gti'), get('gne'), get('q')
+    outputs = np.zeros((npoints, len(OUTPUT_NAMES)))
+    outputs[:, 0] = get('rmin')
+    outputs[:, 1:17] = (0.1 * ti * np.abs(gti) + 0.1 * te * np.abs(gte))[:, np.newaxis]
+    outputs[:, 15] = 0.05 * te * np.maximum(gte - 0.5 * gne, 0)  # xteETGM
+    outputs[:, 17:31] = (1e4 * (gti - 0.5 * gne))[:, np.newaxis]
+    outputs[:, 27] = 1e4 * np.maximum(q * gte - 2 - np.abs(gne), 0)  # gmaMTM
+    outputs[:, 29] = 1e5 * (gte - 0.5 * gne - 1)  # gmaETGM
+    outputs[:, 31] = 1e-8 * te
+
+    return outputs
+
+
+def get_output_str(outputs):
+    '''Returns (str): Output values in the format of the MMM output CSV'''
+    lines = [
+        '#' + ', '.join(OUTPUT_NAMES) + '\n',
+        '#' + ', '.join(OUTPUT_UNITS) + '\n',
+    ]
+    for row in outputs:
+        lines.append(f'{row[0]:11.6f},' + ','.join(f'{v:11.3E}' for v in row[1:]) + '\n')
+
+    return ''.join(lines)
+
+
+def read_case(stream):
+    '''
+    Reads both namelist groups of a single case
+
+    Parameters:
+    * stream (file): The stream to read from
+
+    Returns:
+    * (dict | None): Maps names to lists of values, or None if the stream has ended
+    '''
+
+    groups, group = [], []
+    for line in stream:
+        if line.split('!')[0].strip().endswith('/'):
+            group.append(line.split('!')[0].strip()[:-1])
+            groups.append(group)
+            group = []
+            if len(groups) == 2:
+                values = parse_namelist(groups[0])
+                values.update(parse_namelist(groups[1]))
+                return values
+        else:
+            group.append(line)
+
+    return None
+
+
+def read_binary_input(values):
+    '''Adds (dict): Values of input variables read from input.bin to values'''
+    with open('input.bin', 'rb') as f:
+        header = np.fromfile(f, dtype=BINARY_HEADER_DTYPE, count=1)[0]
+        data = np.fromfile(f, dtype='<f8').reshape(int(header['nvars']), int(header['npoints']))
+    values['npoints'] = [int(header['npoints'])]
+    values.update({name: list(row) for name, row in zip(BINARY_INPUT_NAMES, data)})
+
+
+def write_binary_output(outputs):
+    '''Writes (np.ndarray): Output values to output.bin'''
+    header = np.array([(BINARY_MAGIC, BINARY_VERSION, outputs.shape[0], outputs.shape[1])],
+                      dtype=BINARY_HEADER_DTYPE)
+    with open('output.bin', 'wb') as f:
+        header.tofile(f)
+        np.ascontiguousarray(outputs.T, dtype='<f8').tofile(f)
+
+
+def run_single():
+    '''Runs a single case from the input file and writes output.csv (or output.bin)'''
+    with open('input') as f:
+        values = read_case(f)
+    if values.get('binary_io', [0])[0] == 1:
+        read_binary_input(values)
+        write_binary_output(get_outputs(values))
+    else:
+        with open('output.csv', 'w') as f:
+            f.write(get_output_str(get_outputs(values)))
+    print('MMM stub finished successfully!')
+
+
+def run_persistent():
+    '''Runs cases read from stdin until stdin is closed'''
+    while True:
+        values = read_case(sys.stdin)
+        if values is None:
+            break
+        try:
+            output_str = get_output_str(get_outputs(values))
+        except (KeyError, ValueError) as e:
+            sys.stdout.write(f'#error {e}\n#end_output\n')
+        else:
+            sys.stdout.write(f'#begin_output\n{output_str}#end_output\n')
+        sys.stderr.write('#end_output\n')
+        sys.stderr.flush()
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'persistent':
+        run_persistent()
+    else:
+        run_single()
@@ -17,10 +17,29 @@
 ! checks on values read from the input file.  Users who encounter issues
 ! running mmm_wrapper should run their input file in testmmm to receive better
 ! diagnostic feedback.
+!
+! When started with the command line argument 'persistent', mmm_wrapper stays
+! resident and runs many cases over a single pipe.  Each case is read from
+! stdin in the same format as the input file, and the results of each case are
+! written to stdout in the same format as output.csv, between the lines
+! '#begin_output' and '#end_output'.  Errors are reported by a block starting
+! with an '#error' line instead.  The worker shuts down when stdin is closed.
+! The line '#end_output' is also written to stderr at the end of each case, so
+! that messages written to stderr by each case can be told apart.
+!
+! When binary_io = 1 is set in the control namelist of the input file, input
+! variable arrays are read from input.bin instead of the input file, and
+! output variable arrays are written to output.bin instead of output.csv.
+! Both binary files are little-endian streams that start with a header of
+! four 32-bit integers (magic number, format version, number of points,
+! number of variables), followed by each variable as a contiguous array of
+! 64-bit floats, in the order the variables are listed in read_binary_input
+! and write_binary_output.  Binary files are not used in persistent mode.
 
 
 PROGRAM mmm_wrapper
 USE modmmm
+USE, INTRINSIC :: ISO_FORTRAN_ENV, ONLY : INPUT_UNIT, OUTPUT_UNIT, ERROR_UNIT
 
 IMPLICIT NONE
 
@@ -31,7 +50,15 @@ INTEGER, PARAMETER :: R8 = SELECTED_REAL_KIND(12, 100)
 
 INTEGER, PARAMETER :: &
     hfIn = 34, &  ! Input file handle 
-    hfOut = 35    ! Output file handle
+    hfOut = 35, & ! Output file handle
+    hfBin = 37    ! Binary input and output file handle
+
+! Binary file format
+INTEGER(4), PARAMETER :: &
+    BINARY_MAGIC = 1296911682, &  ! Identifies MMM binary files
+    BINARY_VERSION = 1, &         ! Version of the binary file format
+    NBINARY_INPUTS = 30, &        ! Number of variables in input.bin
+    NBINARY_OUTPUTS = 32          ! Number of variables in output.bin
 
 INTEGER(8) :: &
     tic, toc, count_rate, count_max  ! Timing variables
@@ -43,12 +70,19 @@ INTEGER, PARAMETER  :: BADINT = -1000000
 ! Loop iterators
 INTEGER :: i, j
 
+! Run mode, set by the first command line argument
+CHARACTER(LEN=32) :: run_mode
+
+! I/O status
+INTEGER :: ios
+
 !------------------------------------------------------------------------------
 !                               Input Controls
 !------------------------------------------------------------------------------
 INTEGER :: &
     input_kind = BADINT, &  ! Only 1st kind is supported
-    npoints = BADINT        ! Number of radial points
+    npoints = BADINT, &     ! Number of radial points
+    binary_io = 0           ! Read and write variables using binary files when set to 1
 
 !------------------------------------------------------------------------------
 !                               Input Variables
@@ -159,7 +193,7 @@ INTEGER :: &
 !                               Namelists
 !------------------------------------------------------------------------------
 NAMELIST /testmmm_input_control/ &
-    input_kind, npoints
+    input_kind, npoints, binary_io
 
 NAMELIST /testmmm_input_1stkind/               &
     cmodel, cW20, cDBM, cETG, cMTM, cETGM,     &
@@ -174,167 +208,338 @@ NAMELIST /testmmm_input_1stkind/               &
 !------------------------------------------------------------------------------
 CALL SYSTEM_CLOCK(count_rate=count_rate, count_max=count_max)
 
-! Open output.csv first, so that it's empty if errors occur before calling mmm
-OPEN(hfOut, file='output.csv', form='formatted', status='replace', iostat=nerr)
-IF (nerr /= 0) THEN
-    PRINT '(A)', "ERROR: output.csv could not be opened for writing"
-    STOP
-END IF
-
-OPEN(hfIn, file='input',  form='formatted', status='old', iostat=nerr)
-IF (nerr /= 0) THEN
-    PRINT '(A)', "ERROR: input file could not be opened for reading"
-    STOP
+CALL GET_COMMAND_ARGUMENT(1, run_mode)
+IF (TRIM(run_mode) == 'persistent') THEN
+    CALL run_persistent()
+ELSE
+    CALL run_single()
 END IF
 
-READ(hfIn, NML=testmmm_input_control)
-IF (npoints == BADINT) THEN
-    PRINT '(A)', "ERROR: npoints for the number of radial points needs to be set"
-    STOP
-ELSE IF (input_kind /= 1) THEN
-    PRINT '(A)', "ERROR: Unsupported input kind; please use testmmm"
-    STOP
-END IF
-
-CALL initialize_arrays(npoints)
-PRINT '(A)', "Input of the first kind (values) is detected. Processing..."
-READ(hfIn, NML=testmmm_input_1stkind)
-CLOSE(hfIn)
-
-! Fill parameter arrays with default values from modmmm
-CALL set_mmm_switches(cmmm=cswitch, lmmm=lswitch)
-
-! Assign user specified parameters
-DO i = 1, MAXNOPT 
-    If (abs(cW20(i) - BADREAL) > 1E-6_R8) cswitch(i, KW20) = cW20(i)
-    If (abs(cDBM(i) - BADREAL) > 1E-6_R8) cswitch(i, KDBM) = cDBM(i)
-    If (abs(cMTM(i) - BADREAL) > 1E-6_R8) cswitch(i, KMTM) = cMTM(i)
-    If (abs(cETG(i) - BADREAL) > 1E-6_R8) cswitch(i, KETG) = cETG(i)
-    If (abs(cETGM(i) - BADREAL) > 1E-6_R8) cswitch(i, KETGM) = cETGM(i)
-
-    if (lW20(i) /= BADINT) lswitch(i, KW20) = lW20(i)
-    if (lDBM(i) /= BADINT) lswitch(i, KDBM) = lDBM(i)
-    if (lMTM(i) /= BADINT) lswitch(i, KMTM) = lMTM(i)
-    if (lETG(i) /= BADINT) lswitch(i, KETG) = lETG(i)
-    if (lETGM(i) /= BADINT) lswitch(i, KETGM) = lETGM(i)
-ENDDO
-
-! Call and time mmm
-CALL SYSTEM_CLOCK(tic)
-CALL mmm(rmin=rmin, rmaj=rmaj, rmaj0=rmaj(1), elong=elong, ne=ne,       &
-         nh=nh, nz=nz, nf=nf, zeff=zeff, te=te, ti=ti, q=q, btor=btor,  &
-         zimp=zimp, aimp=aimp, ahyd=ahyd, aimass=aimass, wexbs=wexbs,   &
-         gne=gne, gni=gni, gnh=gnh, gnz=gnz, gte=gte, gti=gti, gq=gq,   &
-         gvtor=gvtor, vtor=vtor, gvpar=gvpar, vpol=vpol, gvpol=gvpol,   &       
-         vpar=vpar, xti=xti, xdi=xdi, xte=xte, xdz=xdz, xvt=xvt,        &  
-         xvp=xvp, xtiW20=xtiW20, xdiW20=xdiW20, xteW20=xteW20,          &
-         xtiDBM=xtiDBM, xdiDBM=xdiDBM, xteDBM=xteDBM, xteETG=xteETG,    &   
-         xteMTM=xteMTM, xdiETGM=xdiETGM, xteETGM=xteETGM, nerr=nerr,    &  
-         gammaW20=gammaW20, omegaW20=omegaW20, gammaDBM=gammaDBM,       &
-         omegaDBM=omegaDBM, gammaMTM=gammaMTM, omegaMTM=omegaMTM,       &                              
-         gammaETGM=gammaETGM, omegaETGM=omegaETGM, dbsqprf=dbsqprf,     &
-         nprout=hfDebug, cmodel=cmodel, npoints=npoints, lprint=lprint, &
-         cswitch=cswitch, lswitch=lswitch, vconv=vconv, vflux=vflux)   
-CALL SYSTEM_CLOCK(toc)
-
-IF (nerr /= 0) THEN
-    PRINT '(A, I3)', "ERROR: MMM finished with error code ", nerr
-    STOP
-END IF    
-
-PRINT '(A, F13.6, A)', "MMM 8.2 finished successfully!  Run Time:", (toc - tic) / REAL(count_rate), "s"
-
-! Write output variable names 
-WRITE(hfOut,'("#"A11, 34A12)') &
-    "rmin,", &
-    "xti,", &
-    "xdi,", &
-    "xte,", &
-    "xdz,", &
-    "xvt,", &
-    "xvp,", &
-    "xtiW20,", &
-    "xdiW20,", &
-    "xteW20,", &
-    "xtiDBM,", &
-    "xdiDBM,", &
-    "xteDBM,", &
-    "xteETG,", &
-    "xteMTM,", &
-    "xteETGM,", &
-    "xdiETGM,", &
-    "gmaW20ii,", &
-    "omgW20ii,", &
-    "gmaW20ie,", &
-    "omgW20ie,", &
-    "gmaW20ei,", &
-    "omgW20ei,", &
-    "gmaW20ee,", &
-    "omgW20ee,", &
-    "gmaDBM,", &
-    "omgDBM,", &
-    "gmaMTM,", &
-    "omgMTM,", &
-    "gmaETGM,", &
-    "omgETGM,", &
-    "dbsqprf "
-
-! Write output variable units
-WRITE(hfOut,'("#"A11, 34 A12)') &
-    "m,",                       &  ! rmin
-    (/("m^2/s,", i=1, 16)/),    &  ! all diffusivities
-    (/("s^-1,", i=1, 14)/),     &  ! all growth rates, frequencies
-    ""                             ! dbsqprf
-
-! Write output variable values
-DO j = 1, npoints
-    WRITE(hfOut,'(0P F11.6, A, 31(ES11.3, A))') &
-        rmin(j), ',', &
-        xti(j), ',', &
-        xdi(j), ',', &
-        xte(j), ',', & 
-        xdz(j), ',', &
-        xvt(j), ',', &
-        xvp(j), ',', & 
-        xtiW20(j), ',', &
-        xdiW20(j), ',', &
-        xteW20(j), ',', &
-        xtiDBM(j), ',', &
-        xdiDBM(j), ',', &
-        xteDBM(j), ',', &
-        xteETG(j), ',', &
-        xteMTM(j), ',', &
-        xteETGM(j), ',', &
-        xdiETGM(j), ',', &
-        gammaW20(1,j), ',', &  ! gmaW20ii 
-        omegaW20(1,j), ',', &  ! omgW20ii 
-        gammaW20(2,j), ',', &  ! gmaW20ie 
-        omegaW20(2,j), ',', &  ! omgW20ie 
-        gammaW20(3,j), ',', &  ! gmaW20ei 
-        omegaW20(3,j), ',', &  ! omgW20ei 
-        gammaW20(4,j), ',', &  ! gmaW20ee 
-        omegaW20(4,j), ',', &  ! omgW20ee 
-        gammaDBM(j), ',', &
-        omegaDBM(j), ',', &
-        gammaMTM(j), ',', &
-        omegaMTM(j), ',', &
-        gammaETGM(j), ',', &
-        omegaETGM(j), ',', &
-        dbsqprf(j)
-END DO
-
-CLOSE(hfOut)
-
 !------------------------------------------------------------------------------
 !                               Contains
 !------------------------------------------------------------------------------
 
-CONTAINS 
+CONTAINS
+SUBROUTINE run_single()
+    ! Runs a single case from the input file and writes output.csv
+
+    ! Open output.csv first, so that it's empty if errors occur before calling mmm
+    OPEN(hfOut, file='output.csv', form='formatted', status='replace', iostat=nerr)
+    IF (nerr /= 0) THEN
+        PRINT '(A)', "ERROR: output.csv could not be opened for writing"
+        STOP
+    END IF
+
+    OPEN(hfIn, file='input',  form='formatted', status='old', iostat=nerr)
+    IF (nerr /= 0) THEN
+        PRINT '(A)', "ERROR: input file could not be opened for reading"
+        STOP
+    END IF
+
+    READ(hfIn, NML=testmmm_input_control)
+    IF (npoints == BADINT) THEN
+        PRINT '(A)', "ERROR: npoints for the number of radial points needs to be set"
+        STOP
+    ELSE IF (input_kind /= 1) THEN
+        PRINT '(A)', "ERROR: Unsupported input kind; please use testmmm"
+        STOP
+    END IF
+
+    CALL initialize_arrays(npoints)
+    PRINT '(A)', "Input of the first kind (values) is detected. Processing..."
+    READ(hfIn, NML=testmmm_input_1stkind)
+    CLOSE(hfIn)
+
+    IF (binary_io == 1) CALL read_binary_input()
+
+    CALL run_mmm()
+
+    IF (nerr /= 0) THEN
+        PRINT '(A, I3)', "ERROR: MMM finished with error code ", nerr
+        STOP
+    END IF
+
+    PRINT '(A, F13.6, A)', "MMM 8.2 finished successfully!  Run Time:", (toc - tic) / REAL(count_rate), "s"
+
+    IF (binary_io == 1) THEN
+        CALL write_binary_output()
+        CLOSE(hfOut, status='delete')
+    ELSE
+        CALL write_output(hfOut)
+        CLOSE(hfOut)
+    END IF
+END SUBROUTINE run_single
+
+SUBROUTINE read_binary_input()
+    ! Reads input variable arrays from input.bin
+
+    INTEGER(4) :: header(4)  ! Magic number, version, number of points, number of variables
+
+    OPEN(hfBin, file='input.bin', access='stream', form='unformatted', status='old', &
+         convert='little_endian', iostat=nerr)
+    IF (nerr /= 0) THEN
+        PRINT '(A)', "ERROR: input.bin could not be opened for reading"
+        STOP
+    END IF
+
+    READ(hfBin) header
+    IF (header(1) /= BINARY_MAGIC .OR. header(2) /= BINARY_VERSION) THEN
+        PRINT '(A)', "ERROR: input.bin is not a supported MMM binary file"
+        STOP
+    ELSE IF (header(3) /= npoints .OR. header(4) /= NBINARY_INPUTS) THEN
+        PRINT '(A)', "ERROR: input.bin does not match npoints or the number of input variables"
+        STOP
+    END IF
+
+    READ(hfBin) rmin, rmaj, elong, ne, nh, nz, nf, zeff, te, ti, q, btor,   &
+                zimp, aimp, ahyd, aimass, wexbs, gne, gni, gnh, gnz, gte,   &
+                gti, gq, gvtor, vtor, gvpol, vpol, gvpar, vpar
+    CLOSE(hfBin)
+END SUBROUTINE read_binary_input
+
+SUBROUTINE write_binary_output()
+    ! Writes output variable arrays to output.bin, in the same order as output.csv
+
+    OPEN(hfBin, file='output.bin', access='stream', form='unformatted', status='replace', &
+         convert='little_endian', iostat=nerr)
+    IF (nerr /= 0) THEN
+        PRINT '(A)', "ERROR: output.bin could not be opened for writing"
+        STOP
+    END IF
+
+    WRITE(hfBin) BINARY_MAGIC, BINARY_VERSION, INT(npoints, 4), NBINARY_OUTPUTS
+    WRITE(hfBin) rmin, xti, xdi, xte, xdz, xvt, xvp, xtiW20, xdiW20, xteW20,  &
+                 xtiDBM, xdiDBM, xteDBM, xteETG, xteMTM, xteETGM, xdiETGM,    &
+                 gammaW20(1, :), omegaW20(1, :), gammaW20(2, :),              &
+                 omegaW20(2, :), gammaW20(3, :), omegaW20(3, :),              &
+                 gammaW20(4, :), omegaW20(4, :), gammaDBM, omegaDBM,          &
+                 gammaMTM, omegaMTM, gammaETGM, omegaETGM, dbsqprf
+    CLOSE(hfBin)
+END SUBROUTINE write_binary_output
+
+SUBROUTINE run_persistent()
+    ! Runs cases read from stdin until stdin is closed
+    !
+    ! Errors in the control namelist leave the position of the input stream
+    ! unknown, so the worker reports the error and shuts down.  Errors from
+    ! MMM itself are reported and the worker continues with the next case.
+
+    CHARACTER(LEN=64) :: msg
+
+    DO
+        CALL reset_inputs()
+
+        READ(INPUT_UNIT, NML=testmmm_input_control, IOSTAT=ios)
+        IF (ios < 0) EXIT  ! End of input stream
+        IF (ios /= 0) THEN
+            CALL write_error("testmmm_input_control could not be read")
+            EXIT
+        ELSE IF (npoints == BADINT .OR. npoints < 1) THEN
+            CALL write_error("npoints for the number of radial points needs to be set")
+            EXIT
+        ELSE IF (input_kind /= 1) THEN
+            CALL write_error("Unsupported input kind; please use testmmm")
+            EXIT
+        ELSE IF (binary_io /= 0) THEN
+            CALL write_error("binary_io is not supported in persistent mode")
+            EXIT
+        END IF
+
+        CALL initialize_arrays(npoints)
+        READ(INPUT_UNIT, NML=testmmm_input_1stkind, IOSTAT=ios)
+        IF (ios /= 0) THEN
+            CALL write_error("testmmm_input_1stkind could not be read")
+            EXIT
+        END IF
+
+        CALL run_mmm()
+
+        IF (nerr /= 0) THEN
+            WRITE(msg, '(A, I0)') "MMM finished with error code ", nerr
+            CALL write_error(TRIM(msg))
+            CYCLE
+        END IF
+
+        WRITE(OUTPUT_UNIT, '(A)') "#begin_output"
+        CALL write_output(OUTPUT_UNIT)
+        CALL end_case()
+    END DO
+END SUBROUTINE run_persistent
+
+SUBROUTINE write_error(msg)
+    ! Writes an error block to stdout in persistent mode
+
+    CHARACTER(LEN=*), INTENT(IN) :: msg
+
+    WRITE(OUTPUT_UNIT, '(A)') "#error " // msg
+    CALL end_case()
+END SUBROUTINE write_error
+
+SUBROUTINE end_case()
+    ! Ends the output of a case in persistent mode, on both stdout and stderr
+    !
+    ! stderr is flushed first, so that messages written to stderr during the
+    ! case are complete once the output of the case has been read from stdout
+
+    WRITE(ERROR_UNIT, '(A)') "#end_output"
+    FLUSH(ERROR_UNIT)
+    WRITE(OUTPUT_UNIT, '(A)') "#end_output"
+    FLUSH(OUTPUT_UNIT)
+END SUBROUTINE end_case
+
+SUBROUTINE reset_inputs()
+    ! Resets input controls and options, so that values from a previous case are not reused
+
+    input_kind = BADINT
+    npoints = BADINT
+    binary_io = 0
+    cmodel = BADREAL
+    cW20 = BADREAL
+    cDBM = BADREAL
+    cETG = BADREAL
+    cMTM = BADREAL
+    cETGM = BADREAL
+    lW20 = BADINT
+    lDBM = BADINT
+    lETG = BADINT
+    lMTM = BADINT
+    lETGM = BADINT
+    lprint = 0
+END SUBROUTINE reset_inputs
+
+SUBROUTINE run_mmm()
+    ! Sets model switches, and then calls and times mmm
+
+    ! Fill parameter arrays with default values from modmmm
+    CALL set_mmm_switches(cmmm=cswitch, lmmm=lswitch)
+
+    ! Assign user specified parameters
+    DO i = 1, MAXNOPT
+        If (abs(cW20(i) - BADREAL) > 1E-6_R8) cswitch(i, KW20) = cW20(i)
+        If (abs(cDBM(i) - BADREAL) > 1E-6_R8) cswitch(i, KDBM) = cDBM(i)
+        If (abs(cMTM(i) - BADREAL) > 1E-6_R8) cswitch(i, KMTM) = cMTM(i)
+        If (abs(cETG(i) - BADREAL) > 1E-6_R8) cswitch(i, KETG) = cETG(i)
+        If (abs(cETGM(i) - BADREAL) > 1E-6_R8) cswitch(i, KETGM) = cETGM(i)
+
+        if (lW20(i) /= BADINT) lswitch(i, KW20) = lW20(i)
+        if (lDBM(i) /= BADINT) lswitch(i, KDBM) = lDBM(i)
+        if (lMTM(i) /= BADINT) lswitch(i, KMTM) = lMTM(i)
+        if (lETG(i) /= BADINT) lswitch(i, KETG) = lETG(i)
+        if (lETGM(i) /= BADINT) lswitch(i, KETGM) = lETGM(i)
+    ENDDO
+
+    ! Call and time mmm
+    CALL SYSTEM_CLOCK(tic)
+    CALL mmm(rmin=rmin, rmaj=rmaj, rmaj0=rmaj(1), elong=elong, ne=ne,       &
+             nh=nh, nz=nz, nf=nf, zeff=zeff, te=te, ti=ti, q=q, btor=btor,  &
+             zimp=zimp, aimp=aimp, ahyd=ahyd, aimass=aimass, wexbs=wexbs,   &
+             gne=gne, gni=gni, gnh=gnh, gnz=gnz, gte=gte, gti=gti, gq=gq,   &
+             gvtor=gvtor, vtor=vtor, gvpar=gvpar, vpol=vpol, gvpol=gvpol,   &
+             vpar=vpar, xti=xti, xdi=xdi, xte=xte, xdz=xdz, xvt=xvt,        &
+             xvp=xvp, xtiW20=xtiW20, xdiW20=xdiW20, xteW20=xteW20,          &
+             xtiDBM=xtiDBM, xdiDBM=xdiDBM, xteDBM=xteDBM, xteETG=xteETG,    &
+             xteMTM=xteMTM, xdiETGM=xdiETGM, xteETGM=xteETGM, nerr=nerr,    &
+             gammaW20=gammaW20, omegaW20=omegaW20, gammaDBM=gammaDBM,       &
+             omegaDBM=omegaDBM, gammaMTM=gammaMTM, omegaMTM=omegaMTM,       &
+             gammaETGM=gammaETGM, omegaETGM=omegaETGM, dbsqprf=dbsqprf,     &
+             nprout=hfDebug, cmodel=cmodel, npoints=npoints, lprint=lprint, &
+             cswitch=cswitch, lswitch=lswitch, vconv=vconv, vflux=vflux)
+    CALL SYSTEM_CLOCK(toc)
+END SUBROUTINE run_mmm
+
+SUBROUTINE write_output(hf)
+    ! Writes output variable names, units, and values in CSV format
+
+    INTEGER, INTENT(IN) :: hf  ! File handle to write to
+
+    ! Write output variable names 
+    WRITE(hf,'("#"A11, 34A12)') &
+        "rmin,", &
+        "xti,", &
+        "xdi,", &
+        "xte,", &
+        "xdz,", &
+        "xvt,", &
+        "xvp,", &
+        "xtiW20,", &
+        "xdiW20,", &
+        "xteW20,", &
+        "xtiDBM,", &
+        "xdiDBM,", &
+        "xteDBM,", &
+        "xteETG,", &
+        "xteMTM,", &
+        "xteETGM,", &
+        "xdiETGM,", &
+        "gmaW20ii,", &
+        "omgW20ii,", &
+        "gmaW20ie,", &
+        "omgW20ie,", &
+        "gmaW20ei,", &
+        "omgW20ei,", &
+        "gmaW20ee,", &
+        "omgW20ee,", &
+        "gmaDBM,", &
+        "omgDBM,", &
+        "gmaMTM,", &
+        "omgMTM,", &
+        "gmaETGM,", &
+        "omgETGM,", &
+        "dbsqprf "
+
+    ! Write output variable units
+    WRITE(hf,'("#"A11, 34 A12)') &
+        "m,",                       &  ! rmin
+        (/("m^2/s,", i=1, 16)/),    &  ! all diffusivities
+        (/("s^-1,", i=1, 14)/),     &  ! all growth rates, frequencies
+        ""                             ! dbsqprf
+
+    ! Write output variable values
+    DO j = 1, npoints
+        WRITE(hf,'(0P F11.6, A, 31(ES11.3, A))') &
+            rmin(j), ',', &
+            xti(j), ',', &
+            xdi(j), ',', &
+            xte(j), ',', & 
+            xdz(j), ',', &
+            xvt(j), ',', &
+            xvp(j), ',', & 
+            xtiW20(j), ',', &
+            xdiW20(j), ',', &
+            xteW20(j), ',', &
+            xtiDBM(j), ',', &
+            xdiDBM(j), ',', &
+            xteDBM(j), ',', &
+            xteETG(j), ',', &
+            xteMTM(j), ',', &
+            xteETGM(j), ',', &
+            xdiETGM(j), ',', &
+            gammaW20(1,j), ',', &  ! gmaW20ii 
+            omegaW20(1,j), ',', &  ! omgW20ii 
+            gammaW20(2,j), ',', &  ! gmaW20ie 
+            omegaW20(2,j), ',', &  ! omgW20ie 
+            gammaW20(3,j), ',', &  ! gmaW20ei 
+            omegaW20(3,j), ',', &  ! omgW20ei 
+            gammaW20(4,j), ',', &  ! gmaW20ee 
+            omegaW20(4,j), ',', &  ! omgW20ee 
+            gammaDBM(j), ',', &
+            omegaDBM(j), ',', &
+            gammaMTM(j), ',', &
+            omegaMTM(j), ',', &
+            gammaETGM(j), ',', &
+            omegaETGM(j), ',', &
+            dbsqprf(j)
+    END DO
+END SUBROUTINE write_output
+
 SUBROUTINE initialize_arrays(np)
-    ! Note: Deallocation occurs naturally when the program ends
+    ! Note: Deallocation occurs naturally when the program ends, and arrays
+    ! from a previous case are deallocated in persistent mode
 
     INTEGER, INTENT(IN) :: np  ! Array dimension
 
+    IF (ALLOCATED(rmin)) CALL deallocate_arrays()
+
     ! Input variables
     ALLOCATE(rmin(np)); rmin = BADREAL
     ALLOCATE(rmaj(np)); rmaj = BADREAL
@@ -397,4 +602,14 @@ SUBROUTINE initialize_arrays(np)
     ALLOCATE(vflux(6, np)); vflux = 0_R8
 END SUBROUTINE initialize_arrays
 
+SUBROUTINE deallocate_arrays()
+    DEALLOCATE(rmin, rmaj, elong, ne, nh, nz, nf, zeff, te, ti, q, btor,        &
+               zimp, aimp, ahyd, aimass, wexbs, gne, gni, gnh, gnz, gte, gti,   &
+               gq, gvtor, vtor, gvpol, vpol, gvpar, vpar)
+    DEALLOCATE(xti, xdi, xte, xdz, xvt, xvp, gammaDBM, omegaDBM, xtiW20,        &
+               xdiW20, xteW20, xtiDBM, xdiDBM, xteDBM, xteETG, xteETGM,         &
+               xdiETGM, gammaW20, omegaW20, gammaMTM, omegaMTM, gammaETGM,      &
+               omegaETGM, dbsqprf, xteMTM, vconv, vflux)
+END SUBROUTINE deallocate_arrays
+
 END PROGRAM mmm_wrapper